@@ -0,0 +1,4 @@
+"""Бенчмарки бронирования, доступности и API
+
+Запуск: python manage.py run_benchmarks --output results.json
+"""
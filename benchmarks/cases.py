@@ -0,0 +1,151 @@
+import json
+from datetime import time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import Client
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.utils import find_available_tables
+from reservations.api.fastpath import values_plan
+from reservations.api.renderers import ORJSONRenderer
+from reservations.models import Reservation, Table
+from reservations.serializers import ReservationSerializer
+from reservations.services import ReservationService
+
+User = get_user_model()
+
+CASES = {}
+
+
+def case(name):
+    """Регистрирует бенчмарк
+
+    Функция получает контекст и возвращает вызываемый объект, время
+    выполнения которого замеряется.
+    """
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+class BenchmarkContext:
+    """Общие данные для бенчмарков"""
+
+    def __init__(self):
+        self.date = timezone.now().date() + timedelta(days=1)
+        self.time = time(19, 0)
+        self.user = (
+            User.objects.filter(is_staff=False, reservations__isnull=False).order_by('id').first()
+            or User.objects.filter(is_staff=False).order_by('id').first()
+        )
+        self.table = (
+            Table.objects.available_tables(self.date, time(15, 0), 2, 2).order_by('id').first()
+        )
+
+    def api_client(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client
+
+
+@case('table_get_available_tables')
+def table_get_available_tables(context):
+    return lambda: list(Table.get_available_tables(context.date, context.time, 2, 2))
+
+
+@case('find_available_tables')
+def core_find_available_tables(context):
+    return lambda: find_available_tables(context.date, context.time, 2, 2)
+
+
+@case('create_reservation')
+def create_reservation(context):
+    if context.user is None or context.table is None:
+        return None
+
+    def run():
+        with transaction.atomic():
+            ReservationService.create_reservation(
+                context.user, context.table, context.date, time(15, 0), 2, 2
+            )
+            transaction.set_rollback(True)
+    return run
+
+
+@case('api_check_availability')
+def api_check_availability(context):
+    if context.user is None:
+        return None
+    client = context.api_client()
+    payload = json.dumps({
+        'date': context.date.isoformat(),
+        'time': context.time.strftime('%H:%M'),
+        'duration': 2,
+        'guests': 2,
+    })
+    return lambda: client.post(
+        '/api/v1/tables/check_availability/', payload, content_type='application/json'
+    )
+
+
+@case('api_reservations_list')
+def api_reservations_list(context):
+    if context.user is None:
+        return None
+    client = context.api_client()
+    return lambda: client.get('/api/v1/reservations/')
+
+
+# Сериализация списка бронирований без HTTP: ModelSerializer + JSONRenderer
+# против быстрого пути (.values() + ORJSONRenderer) на одних и тех же строках
+SERIALIZATION_ROWS = 10000
+
+
+def _serialization_queryset():
+    return Reservation.objects.select_related('user', 'table').order_by('-date', '-time', '-id')[:SERIALIZATION_ROWS]
+
+
+@case('serialize_reservations_10k')
+def serialize_reservations_10k(context):
+    queryset = _serialization_queryset()
+    renderer = JSONRenderer()
+    return lambda: renderer.render(ReservationSerializer(queryset.all(), many=True).data)
+
+
+@case('fastpath_reservations_10k')
+def fastpath_reservations_10k(context):
+    queryset = _serialization_queryset()
+    plan = values_plan(ReservationSerializer(), queryset)
+    renderer = ORJSONRenderer()
+    return lambda: renderer.render(plan.build(queryset.values(*plan.columns)))
+
+
+@case('page_home')
+def page_home(context):
+    client = Client()
+    return lambda: client.get('/')
+
+
+@case('page_menu')
+def page_menu(context):
+    client = Client()
+    return lambda: client.get('/menu/')
+
+
+@case('page_reviews')
+def page_reviews(context):
+    client = Client()
+    return lambda: client.get('/reviews/')
+
+
+def dataset_summary():
+    """Объем данных, на которых запускались бенчмарки"""
+    return {
+        'tables': Table.objects.count(),
+        'users': User.objects.count(),
+        'reservations': Reservation.objects.count(),
+    }
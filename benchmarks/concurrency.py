@@ -0,0 +1,103 @@
+"""Нагрузка множеством одновременных клиентов по HTTP
+
+Каждый клиент держит одно keep-alive соединение и последовательно
+выполняет запросы; все клиенты работают одновременно в одном цикле событий.
+Используется для сравнения пропускной способности WSGI (gunicorn) и ASGI
+(uvicorn) развертываний на одних и тех же URL.
+"""
+import asyncio
+import time as timer
+from urllib.parse import urlsplit
+
+from .runner import percentile
+
+
+async def read_response(reader):
+    """Читает ответ HTTP/1.1 и возвращает код статуса"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Соединение закрыто сервером')
+    status = int(status_line.split()[1])
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def run_client(url, requests, headers, latencies, errors):
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path += f'?{parts.query}'
+    request = (
+        f'GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: keep-alive\r\n'
+        + ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+        + '\r\n'
+    ).encode()
+
+    connection = None
+    for _ in range(requests):
+        started = timer.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(parts.hostname, parts.port or 80)
+            reader, writer = connection
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            errors['connection'] += 1
+            connection = None
+            continue
+
+        latencies.append((timer.perf_counter() - started) * 1000)
+        if status >= 400:
+            errors['status'] += 1
+        if not keep_alive:
+            writer.close()
+            connection = None
+
+    if connection is not None:
+        connection[1].close()
+
+
+async def run_load(url, clients, requests, headers=None):
+    latencies = []
+    errors = {'connection': 0, 'status': 0}
+    started = timer.perf_counter()
+    await asyncio.gather(*(
+        run_client(url, requests, headers or {}, latencies, errors) for _ in range(clients)
+    ))
+    elapsed = timer.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'clients': clients,
+        'requests': len(latencies),
+        'errors': errors,
+        'elapsed_s': elapsed,
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50),
+        'p90_ms': percentile(latencies, 90),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+
+def load(url, clients=500, requests=20, headers=None):
+    """Запускает clients одновременных клиентов по requests запросов каждый"""
+    return asyncio.run(run_load(url, clients, requests, headers))
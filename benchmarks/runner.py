@@ -0,0 +1,74 @@
+import statistics
+import time as timer
+
+from django.db import connection
+
+
+def percentile(values, percent):
+    """Перцентиль по отсортированному списку (ближайший ранг)"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+def measure(func, repeat=20, warmup=2):
+    """Замеряет задержку и количество запросов к БД
+
+    Количество запросов считается отдельным прогоном, чтобы перехват
+    запросов не искажал время.
+    """
+    for _ in range(warmup):
+        func()
+
+    queries = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_queries):
+        func()
+
+    durations = []
+    for _ in range(repeat):
+        started = timer.perf_counter()
+        func()
+        durations.append((timer.perf_counter() - started) * 1000)
+    durations.sort()
+
+    return {
+        'repeat': repeat,
+        'queries': queries,
+        'mean_ms': statistics.fmean(durations),
+        'p50_ms': percentile(durations, 50),
+        'p90_ms': percentile(durations, 90),
+        'p99_ms': percentile(durations, 99),
+        'max_ms': durations[-1],
+    }
+
+
+def compare(baseline, current, threshold=0.2):
+    """Сравнивает результаты двух запусков
+
+    Возвращает список строк отчета и список имен бенчмарков с регрессией:
+    рост p50 больше чем на threshold или рост числа запросов.
+    """
+    lines = []
+    regressions = []
+    for name, result in current.items():
+        previous = baseline.get(name)
+        if previous is None:
+            lines.append(f'{name}: новый бенчмарк')
+            continue
+
+        change = (result['p50_ms'] - previous['p50_ms']) / previous['p50_ms'] if previous['p50_ms'] else 0.0
+        regressed = change > threshold or result['queries'] > previous['queries']
+        if regressed:
+            regressions.append(name)
+        lines.append(
+            f'{name}: p50 {previous["p50_ms"]:.2f} -> {result["p50_ms"]:.2f} мс ({change:+.0%}), '
+            f'запросов {previous["queries"]} -> {result["queries"]}' + (' РЕГРЕССИЯ' if regressed else '')
+        )
+    return lines, regressions
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
 
-from reservations.models import Table, Reservation
+from reservations.models import NotificationOutbox, Table, Reservation
+from .cache import bump_version
 from .models import (Restaurant, Review, ContactMessage, MenuCategory,
                      MenuItem, SiteContent, TeamMember, Award)
 
@@ -59,6 +60,7 @@ class ReviewAdmin(admin.ModelAdmin):
     list_filter = ['rating', 'is_approved', 'is_featured', 'created_at']
     list_editable = ['is_approved', 'is_featured']
     search_fields = ['user__username', 'comment']
+    actions = ['approve_reviews']
 
     def get_rating_stars(self, obj):
         return obj.get_rating_stars()
@@ -66,6 +68,13 @@ class ReviewAdmin(admin.ModelAdmin):
     get_rating_stars.short_description = 'Рейтинг'
     get_rating_stars.allow_tags = True
 
+    @admin.action(description='Опубликовать выбранные отзывы')
+    def approve_reviews(self, request, queryset):
+        # update() не вызывает сигналы, поэтому сбрасываем кэш явно
+        updated = queryset.filter(is_approved=False).update(is_approved=True)
+        bump_version(Review)
+        self.message_user(request, f'Опубликовано отзывов: {updated}')
+
 
 @admin.register(TeamMember)
 class TeamMemberAdmin(admin.ModelAdmin):
@@ -115,6 +124,14 @@ class ReservationAdmin(admin.ModelAdmin):
     date_hierarchy = 'date'
 
 
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'reservation', 'notification_type', 'status', 'attempts', 'created_at', 'sent_at']
+    list_filter = ['status', 'notification_type']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+    raw_id_fields = ['reservation']
+
+
 @admin.register(ContactMessage)
 class ContactMessageAdmin(admin.ModelAdmin):
     list_display = ['name', 'email', 'subject', 'created_at', 'is_processed']
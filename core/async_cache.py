@@ -0,0 +1,114 @@
+"""Асинхронный доступ к кэшу по умолчанию
+
+Для RedisCache запросы идут через redis.asyncio, без пула потоков. Ключи,
+сериализатор и параметры подключения (CACHES OPTIONS) берутся у бэкенда
+django.core.cache, поэтому асинхронный и синхронный код читают одни и те же
+записи. Для остальных
+бэкендов (LocMemCache в тестах) используются async-методы Django.
+"""
+import asyncio
+import weakref
+
+import redis.asyncio
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+
+# Опции синхронного клиента Django, неприменимые к redis.asyncio
+_SYNC_ONLY_OPTIONS = ('serializer', 'pool_class', 'parser_class')
+# Клиент redis.asyncio привязан к циклу событий, в котором создан; живет,
+# пока жив цикл (под uvicorn - весь процесс)
+_clients = weakref.WeakKeyDictionary()
+
+
+def _backend():
+    return caches['default']
+
+
+def uses_redis():
+    """Кэш по умолчанию - Redis"""
+    return isinstance(_backend(), RedisCache)
+
+
+def redis_location():
+    """Адрес Redis для записи (первый, если указано несколько)"""
+    return _backend()._servers[0]
+
+
+def connection_options():
+    """Параметры подключения из CACHES OPTIONS для redis.asyncio"""
+    return {
+        name: value
+        for name, value in _backend()._options.items()
+        if name not in _SYNC_ONLY_OPTIONS
+    }
+
+
+def sync_client():
+    """Синхронный клиент redis-py с пулом и параметрами бэкенда Django"""
+    return _backend()._cache.get_client(write=True)
+
+
+async def _close_with_loop(loop, client):
+    """Закрывает клиент цикла при его завершении
+
+    Незавершенный асинхронный генератор цикл закрывает в shutdown_asyncgens
+    (asyncio.run, async_to_sync), поэтому соединения клиента не переживают
+    цикл.
+    """
+    try:
+        yield
+    finally:
+        _clients.pop(loop, None)
+        await client.aclose()
+
+
+def client():
+    """Клиент redis.asyncio текущего цикла событий"""
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(loop)
+    if entry is None:
+        client = redis.asyncio.Redis.from_url(redis_location(), **connection_options())
+        closer = _close_with_loop(loop, client)
+        # Первый шаг регистрирует генератор в цикле
+        try:
+            closer.asend(None).send(None)
+        except StopIteration:
+            pass
+        entry = _clients[loop] = (client, closer)
+    return entry[0]
+
+
+def _serializer():
+    return _backend()._cache._serializer
+
+
+def _make_key(key):
+    return _backend().make_and_validate_key(key)
+
+
+async def get(key, default=None):
+    if not uses_redis():
+        return await _backend().aget(key, default)
+    value = await client().get(_make_key(key))
+    return default if value is None else _serializer().loads(value)
+
+
+async def get_many(keys):
+    if not uses_redis():
+        return await _backend().aget_many(keys)
+    values = await client().mget([_make_key(key) for key in keys])
+    return {key: _serializer().loads(value) for key, value in zip(keys, values) if value is not None}
+
+
+async def set(key, value, timeout):
+    """Сохраняет значение; timeout=None - без срока хранения"""
+    if not uses_redis():
+        return await _backend().aset(key, value, timeout)
+    await client().set(_make_key(key), _serializer().dumps(value), ex=timeout)
+
+
+async def add(key, value, timeout):
+    """Сохраняет значение, только если ключа еще нет"""
+    if not uses_redis():
+        return await _backend().aadd(key, value, timeout)
+    return bool(await client().set(_make_key(key), _serializer().dumps(value), ex=timeout, nx=True))
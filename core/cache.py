@@ -0,0 +1,145 @@
+"""Версионный кэш публичного контента
+
+Каждой модели соответствует ключ версии в кэше. Закэшированные данные
+хранятся под ключом, включающим версии всех моделей, из которых они
+построены, поэтому при изменении любой из них (сигналы post_save и
+post_delete, см. core.signals) старые записи просто перестают читаться.
+
+Для данных, нужных на каждой странице, поверх кэша есть локальный для
+процесса LRU-кэш с TTL: в пределах TTL он не обращается к Redis вовсе.
+"""
+import threading
+import time as timer
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import async_cache
+
+_MISSING = object()
+
+
+class LocalTTLCache:
+    """LRU-кэш в памяти процесса с ограниченным временем жизни записей"""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Возвращает (значение, версия, истекла ли запись) или None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            value, version, expires = entry
+            return value, version, expires <= timer.monotonic()
+
+    def set(self, key, value, version, ttl):
+        with self._lock:
+            self._data[key] = (value, version, timer.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LocalTTLCache()
+
+
+def _version_key(model):
+    return f'content_version:{model._meta.label_lower}'
+
+
+def get_versions(models):
+    """Текущие версии моделей, отсутствующие создаются"""
+    keys = {_version_key(model): model for model in models}
+    versions = cache.get_many(keys)
+    for key in keys.keys() - versions.keys():
+        # Начальная версия по времени, чтобы после вытеснения ключа версии
+        # не совпасть со старыми записями
+        cache.add(key, int(timer.time() * 1000), None)
+        versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(models):
+    """Асинхронный вариант get_versions"""
+    keys = {_version_key(model): model for model in models}
+    versions = await async_cache.get_many(list(keys))
+    for key in keys.keys() - versions.keys():
+        await async_cache.add(key, int(timer.time() * 1000), None)
+        versions[key] = await async_cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(model):
+    """Делает недействительными все записи, построенные по модели"""
+    key = _version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(timer.time() * 1000), None)
+    local_cache.delete(model._meta.label_lower)
+
+
+def cached_content(name, models, builder, timeout=None):
+    """Возвращает данные из кэша или строит их через builder()
+
+    При CACHE_ENABLE = False кэш не используется.
+    """
+    if not settings.CACHE_ENABLE:
+        return builder()
+
+    versions = get_versions(models)
+    return _get_or_build(name, versions, builder, timeout)
+
+
+def _get_or_build(name, versions, builder, timeout=None):
+    key = f'content:{name}:' + ':'.join(str(version) for version in versions)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = builder()
+        if timeout is None:
+            timeout = getattr(settings, 'CONTENT_CACHE_TIMEOUT', 60 * 60)
+        cache.set(key, value, timeout)
+    return value
+
+
+def cached_model_value(model, builder, version=None):
+    """Значение, зависящее от одной модели, с локальным кэшем процесса
+
+    Пока локальная запись не истекла (LOCAL_CACHE_TTL секунд), Redis не
+    опрашивается. После истечения проверяется версия модели: если она не
+    изменилась, запись продлевается, иначе значение берется из общего кэша.
+    Сохранение модели в этом же процессе сбрасывает запись сразу.
+
+    С version (уже прочитанной версией модели) локальная запись
+    используется, только если построена для этой версии, без учета TTL.
+    """
+    if not settings.CACHE_ENABLE:
+        return builder()
+
+    name = model._meta.label_lower
+    ttl = getattr(settings, 'LOCAL_CACHE_TTL', 30)
+    entry = local_cache.get(name)
+    if version is None:
+        if entry is not None and not entry[2]:
+            return entry[0]
+        [version] = get_versions([model])
+    if entry is not None and entry[1] == version:
+        value = entry[0]
+    else:
+        value = _get_or_build(name, [version], builder)
+    local_cache.set(name, value, version, ttl)
+    return value
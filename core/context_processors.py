@@ -1,14 +1,22 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cache import cached_model_value
 from .models import Restaurant
 
 
-def restaurant_info(request):
-    """Добавляет информацию о ресторане в контекст всех шаблонов"""
+def get_restaurant():
+    """Ресторан из двухуровневого кэша (процесс, затем Redis)"""
     try:
-        restaurant = Restaurant.objects.first()
-        return {
-            'restaurant': restaurant
-        }
-    except:
-        return {
-            'restaurant': None
-        }
+        return cached_model_value(Restaurant, Restaurant.objects.first)
+    except Exception:
+        return None
+
+
+def restaurant_info(request):
+    """Добавляет информацию о ресторане в контекст всех шаблонов
+
+    Значение вычисляется лениво: только если шаблон обращается к restaurant.
+    """
+    return {
+        'restaurant': SimpleLazyObject(get_restaurant)
+    }
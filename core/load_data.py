@@ -0,0 +1,228 @@
+"""Генерация больших объемов синтетических данных для нагрузочных тестов
+
+Все данные детерминированы зерном и базовой датой ("сегодня" генерации):
+один и тот же набор параметров дает одну и ту же базу, поэтому результаты
+бенчмарков можно сравнивать между запусками.
+Бронирования генерируются по дням, дни делятся на блоки, которые можно
+обрабатывать в нескольких процессах. Внутри дня бронирования одного столика
+не пересекаются, поэтому данные проходят ограничение-исключение PostgreSQL.
+"""
+import csv
+import io
+import multiprocessing
+import random
+from datetime import time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections, transaction
+
+from core.models import Review, ContactMessage
+from reservations import partitions
+from reservations.models import Table, Reservation
+from reservations.occupancy import interval_mask
+
+User = get_user_model()
+
+USER_PREFIX = 'load_user_'
+TABLE_PREFIX = 'L'
+
+# Распределение времени начала бронирования: обеденный и вечерний пики
+TIME_WEIGHTS = {
+    time(11, 0): 2, time(11, 30): 3, time(12, 0): 6, time(12, 30): 8,
+    time(13, 0): 9, time(13, 30): 8, time(14, 0): 5, time(14, 30): 3,
+    time(15, 0): 2, time(15, 30): 2, time(16, 0): 3, time(16, 30): 4,
+    time(17, 0): 6, time(17, 30): 8, time(18, 0): 12, time(18, 30): 14,
+    time(19, 0): 16, time(19, 30): 15, time(20, 0): 12, time(20, 30): 8,
+    time(21, 0): 5, time(21, 30): 3,
+}
+TIMES = list(TIME_WEIGHTS)
+WEIGHTS = list(TIME_WEIGHTS.values())
+DURATIONS = [1, 2, 2, 2, 2, 3, 3, 4]
+TABLE_TYPES = [table_type for table_type, _ in Table.TABLE_TYPES]
+REQUESTS = ['', '', '', '', 'Столик у окна', 'День рождения', 'Детский стульчик', 'Аллергия на орехи']
+
+RESERVATION_COLUMNS = [
+    'user_id', 'table_id', 'date', 'time', 'duration', 'guests',
+    'special_requests', 'status', 'created_at', 'updated_at',
+]
+
+
+def create_tables(count, rng, batch_size):
+    """Создает столики и возвращает их id и вместимость"""
+    tables = [
+        Table(
+            number=f'{TABLE_PREFIX}{i:05d}',
+            capacity=rng.choice([2, 2, 2, 4, 4, 4, 6, 6, 8, 12]),
+            table_type=rng.choice(TABLE_TYPES),
+        )
+        for i in range(count)
+    ]
+    Table.objects.bulk_create(tables, batch_size=batch_size, ignore_conflicts=True)
+    return list(
+        Table.objects.filter(number__startswith=TABLE_PREFIX).order_by('id').values_list('id', 'capacity')
+    )
+
+
+def create_users(count, batch_size):
+    """Создает пользователей с одинаковым паролем и возвращает их id"""
+    password = make_password('loadtest123')
+    users = [
+        User(
+            username=f'{USER_PREFIX}{i}',
+            email=f'{USER_PREFIX}{i}@example.com',
+            password=password,
+        )
+        for i in range(count)
+    ]
+    User.objects.bulk_create(users, batch_size=batch_size, ignore_conflicts=True)
+    return list(User.objects.filter(username__startswith=USER_PREFIX).order_by('id').values_list('id', flat=True))
+
+
+def generate_day(rng, day, count, tables, user_ids, today):
+    """Генерирует непересекающиеся бронирования на один день"""
+    occupied = {}
+    rows = []
+    for _ in range(count):
+        for _attempt in range(5):
+            table_id, capacity = rng.choice(tables)
+            start = rng.choices(TIMES, WEIGHTS)[0]
+            duration = rng.choice(DURATIONS)
+            mask = interval_mask(start, duration)
+            if not occupied.get(table_id, 0) & mask:
+                occupied[table_id] = occupied.get(table_id, 0) | mask
+                break
+        else:
+            continue
+
+        if day < today:
+            status = 'completed' if rng.random() < 0.85 else 'cancelled'
+        else:
+            status = rng.choices(['confirmed', 'pending', 'cancelled'], [80, 12, 8])[0]
+
+        rows.append((
+            rng.choice(user_ids), table_id, day, start, duration,
+            rng.randint(1, capacity), rng.choice(REQUESTS), status,
+        ))
+    return rows
+
+
+def insert_reservations(rows, created_at, batch_size):
+    """Вставляет бронирования через COPY (PostgreSQL) или bulk_create"""
+    if connection.vendor == 'postgresql':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(row + (created_at.isoformat(), created_at.isoformat()))
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(
+                f'COPY {Reservation._meta.db_table} ({", ".join(RESERVATION_COLUMNS)}) '
+                f'FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (special_requests))',
+                buffer
+            )
+        return
+
+    fields = RESERVATION_COLUMNS[:-2]
+    created = Reservation.objects.bulk_create(
+        [Reservation(**dict(zip(fields, row))) for row in rows],
+        batch_size=batch_size
+    )
+    # auto_now_add подставляет текущее время; как и в COPY, ставится created_at
+    Reservation.objects.filter(pk__in=[reservation.pk for reservation in created]).update(
+        created_at=created_at, updated_at=created_at
+    )
+
+
+def generate_reservation_block(seed, block, days, per_day, tables, user_ids, today, created_at, batch_size):
+    """Генерирует и вставляет бронирования для блока дней
+
+    Зерно блока зависит только от общего зерна и номера блока, поэтому
+    результат не зависит от числа процессов.
+    """
+    rng = random.Random(f'{seed}:{block}')
+    rows = []
+    for day, count in zip(days, per_day):
+        rows.extend(generate_day(rng, day, count, tables, user_ids, today))
+
+    with transaction.atomic():
+        for start in range(0, len(rows), batch_size):
+            insert_reservations(rows[start:start + batch_size], created_at, batch_size)
+    return len(rows)
+
+
+def _run_block(args):
+    return generate_reservation_block(*args)
+
+
+def _close_connections():
+    connections.close_all()
+
+
+def create_reservations(count, years, seed, tables, user_ids, today, created_at,
+                        batch_size, workers, block_days=30, future_days=60):
+    """Распределяет бронирования по дням и генерирует их блоками"""
+    first_day = today - timedelta(days=365 * years)
+    total_days = (today - first_day).days + future_days
+    days = [first_day + timedelta(days=i) for i in range(total_days)]
+    # COPY в секционированную таблицу требует секций на весь диапазон
+    partitions.ensure_date_range(days[0], days[-1])
+
+    # Выходные загружены сильнее будних дней
+    rng = random.Random(f'{seed}:days')
+    weights = [1.6 if day.weekday() >= 4 else 1.0 for day in days]
+    per_day = [0] * total_days
+    for index in rng.choices(range(total_days), weights, k=count):
+        per_day[index] += 1
+
+    blocks = [
+        (seed, block, days[start:start + block_days], per_day[start:start + block_days],
+         tables, user_ids, today, created_at, batch_size)
+        for block, start in enumerate(range(0, total_days, block_days))
+    ]
+
+    if workers > 1:
+        connections.close_all()
+        with multiprocessing.Pool(workers, initializer=_close_connections) as pool:
+            return sum(pool.imap_unordered(_run_block, blocks))
+    return sum(_run_block(block) for block in blocks)
+
+
+def create_reviews(count, rng, user_ids, created_at, batch_size):
+    """Создает отзывы с временем создания created_at"""
+    comments = [
+        'Прекрасный ресторан, обязательно вернемся!',
+        'Вкусная паста и приятная атмосфера.',
+        'Неплохо, но обслуживание могло бы быть быстрее.',
+        'Отличная винная карта и внимательный персонал.',
+        'Пицца выше всяких похвал.',
+    ]
+    reviews = [
+        Review(
+            user_id=rng.choice(user_ids),
+            rating=rng.choices([1, 2, 3, 4, 5], [3, 5, 12, 35, 45])[0],
+            comment=rng.choice(comments),
+            is_approved=rng.random() < 0.9,
+            is_featured=rng.random() < 0.02,
+        )
+        for _ in range(count)
+    ]
+    created = Review.objects.bulk_create(reviews, batch_size=batch_size)
+    # auto_now_add подставляет текущее время, как и в insert_reservations
+    Review.objects.filter(pk__in=[review.pk for review in created]).update(created_at=created_at)
+
+
+def create_contact_messages(count, rng, user_ids, created_at, batch_size):
+    """Создает сообщения обратной связи с временем создания created_at"""
+    messages = [
+        ContactMessage(
+            user_id=rng.choice(user_ids),
+            name=f'Гость {i}',
+            email=f'guest{i}@example.com',
+            message='Хотим забронировать зал для мероприятия.',
+            is_processed=rng.random() < 0.7,
+        )
+        for i in range(count)
+    ]
+    created = ContactMessage.objects.bulk_create(messages, batch_size=batch_size)
+    ContactMessage.objects.filter(pk__in=[message.pk for message in created]).update(created_at=created_at)
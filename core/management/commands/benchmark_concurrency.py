@@ -0,0 +1,58 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from benchmarks.concurrency import load
+
+
+class Command(BaseCommand):
+    help = ('Нагружает запущенные серверы множеством одновременных клиентов '
+            'и сравнивает пропускную способность, например gunicorn (WSGI) '
+            'и uvicorn (ASGI).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True,
+                            help='Сервер в виде имя=http://host:port, можно указать несколько')
+        parser.add_argument('--path', action='append',
+                            help='Путь с параметрами запроса (по умолчанию проверка доступности на завтра)')
+        parser.add_argument('--clients', type=int, default=500, help='Одновременных клиентов')
+        parser.add_argument('--requests', type=int, default=20, help='Запросов на клиента')
+        parser.add_argument('--header', action='append', default=[],
+                            help='Дополнительный заголовок "Имя: значение", например Cookie с sessionid')
+        parser.add_argument('--output', help='Путь к JSON-файлу для сохранения результатов')
+
+    def handle(self, *args, **options):
+        targets = {}
+        for target in options['target']:
+            name, _, url = target.partition('=')
+            if not url:
+                raise CommandError(f'Неверный формат --target: {target}')
+            targets[name] = url.rstrip('/')
+
+        headers = {'X-Requested-With': 'XMLHttpRequest'}
+        for header in options['header']:
+            name, _, value = header.partition(':')
+            headers[name.strip()] = value.strip()
+
+        paths = options['path'] or [self.default_path()]
+        results = {}
+        for path in paths:
+            for name, base_url in targets.items():
+                result = load(base_url + path, options['clients'], options['requests'], headers)
+                results.setdefault(path, {})[name] = result
+                self.stdout.write(
+                    f'{name} {path}: {result["rps"]:.0f} запр/с, p50 {result["p50_ms"]:.1f} мс, '
+                    f'p99 {result["p99_ms"]:.1f} мс, ошибок соединения {result["errors"]["connection"]}, '
+                    f'ответов 4xx/5xx {result["errors"]["status"]}'
+                )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+    def default_path(self):
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        return f'/api/check-availability/?date={tomorrow.isoformat()}&time=19:00&duration=2&guests=2'
@@ -0,0 +1,115 @@
+import json
+import statistics
+import time as timer
+from datetime import time, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from reservations.models import Reservation, Table
+
+User = get_user_model()
+
+
+class RollbackBenchmark(Exception):
+    """Откатывает транзакцию с удаленными индексами"""
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает планы и время горячих запросов к бронированиям '
+            'с составными индексами и без них.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Сколько раз выполнять каждый запрос',
+        )
+        parser.add_argument(
+            '--output',
+            help='Путь к JSON-файлу с результатами',
+        )
+
+    def handle(self, *args, **options):
+        queries = self.get_queries()
+        if not queries:
+            self.stdout.write(self.style.WARNING('Нет данных: сначала заполните базу командой seed_data'))
+            return
+
+        results = {}
+        try:
+            with transaction.atomic():
+                self.drop_indexes()
+                results['without_indexes'] = self.measure(queries, options['repeat'])
+                raise RollbackBenchmark
+        except RollbackBenchmark:
+            pass
+
+        # Новое соединение, чтобы не использовать подготовленные без индексов планы
+        connection.close()
+        results['with_indexes'] = self.measure(queries, options['repeat'])
+
+        for name in queries:
+            with_indexes = results['with_indexes'][name]
+            without_indexes = results['without_indexes'][name]
+            self.stdout.write('=' * 50)
+            self.stdout.write(self.style.SUCCESS(name))
+            self.stdout.write(
+                f'median: {without_indexes["median_ms"]:.2f} мс -> {with_indexes["median_ms"]:.2f} мс, '
+                f'p95: {without_indexes["p95_ms"]:.2f} мс -> {with_indexes["p95_ms"]:.2f} мс'
+            )
+            self.stdout.write('План без индексов:')
+            self.stdout.write(without_indexes['plan'])
+            self.stdout.write('План с индексами:')
+            self.stdout.write(with_indexes['plan'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+    def get_queries(self):
+        """Горячие запросы, для которых рассчитаны индексы"""
+        user = User.objects.filter(reservations__isnull=False).first()
+        if user is None:
+            return {}
+
+        today = timezone.now().date()
+        tomorrow = today + timedelta(days=1)
+        cutoff_date = today - timedelta(days=getattr(settings, 'CLEANUP_AFTER_DAYS', 365))
+
+        return {
+            'available_tables': lambda: Table.objects.available_tables(tomorrow, time(19, 0), 2, 2),
+            'user_reservations': lambda: Reservation.objects.filter(user=user).order_by('-date', '-time')[:50],
+            'reminders': lambda: Reservation.objects.filter(date=tomorrow, status='confirmed'),
+            'auto_confirm': lambda: Reservation.objects.filter(status='pending', date__gte=today),
+            'cleanup': lambda: Reservation.objects.filter(
+                date__lt=cutoff_date, status__in=['completed', 'cancelled']
+            ).only('id'),
+        }
+
+    def measure(self, queries, repeat):
+        results = {}
+        for name, build in queries.items():
+            durations = []
+            for _ in range(repeat):
+                started = timer.perf_counter()
+                list(build())
+                durations.append((timer.perf_counter() - started) * 1000)
+            durations.sort()
+            results[name] = {
+                'median_ms': statistics.median(durations),
+                'p95_ms': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+                'plan': build().explain(),
+            }
+        return results
+
+    def drop_indexes(self):
+        """Удаляет индексы из Reservation.Meta внутри текущей транзакции"""
+        with connection.cursor() as cursor:
+            for index in Reservation._meta.indexes:
+                cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
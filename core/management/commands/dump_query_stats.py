@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.query_stats import collect_stats
+
+
+class Command(BaseCommand):
+    help = 'Выводит статистику SQL-запросов по представлениям, собранную QueryInstrumentationMiddleware.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Вывести статистику в JSON')
+        parser.add_argument('--limit', type=int, default=20, help='Количество представлений в отчете')
+
+    def handle(self, *args, **options):
+        stats = collect_stats()
+
+        if options['json']:
+            self.stdout.write(json.dumps(stats, ensure_ascii=False, indent=2))
+            return
+
+        if not stats:
+            self.stdout.write('Статистика пуста: включите QUERY_INSTRUMENTATION')
+            return
+
+        views = sorted(stats.items(), key=lambda item: item[1]['queries_avg'], reverse=True)
+        for view, data in views[:options['limit']]:
+            self.stdout.write('=' * 50)
+            self.stdout.write(self.style.SUCCESS(view))
+            self.stdout.write(
+                f'запросов: {data["requests"]}, SQL в среднем: {data["queries_avg"]:.1f} '
+                f'(макс. {data["queries_max"]}), время БД в среднем: {data["db_ms_avg"]:.2f} мс'
+            )
+            self.stdout.write(f'самый медленный ({data["slowest_ms"]:.2f} мс): {data["slowest_sql"]}')
+            for sql, count in data['duplicates'].items():
+                self.stdout.write(f'  повтор x{count}: {sql}')
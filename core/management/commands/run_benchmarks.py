@@ -0,0 +1,98 @@
+import json
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from benchmarks.cases import CASES, BenchmarkContext, dataset_summary
+from benchmarks.runner import compare, measure
+from restaurant_booking.celery import app as celery_app
+
+
+class Command(BaseCommand):
+    help = ('Запускает бенчмарки бронирования, доступности, API и страниц '
+            'и сохраняет результаты в JSON для сравнения между коммитами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Количество замеров для каждого бенчмарка')
+        parser.add_argument('--warmup', type=int, default=2, help='Количество прогревочных запусков')
+        parser.add_argument('--only', nargs='+', choices=sorted(CASES), help='Запустить только указанные бенчмарки')
+        parser.add_argument('--output', help='Путь к JSON-файлу для сохранения результатов')
+        parser.add_argument('--compare', help='JSON-файл предыдущего запуска для сравнения')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Допустимый рост p50 при сравнении (доля, по умолчанию 0.2)')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Завершиться с ошибкой, если найдена регрессия')
+
+    def handle(self, *args, **options):
+        # Тестовое окружение: testserver в ALLOWED_HOSTS и письма в памяти
+        setup_test_environment()
+        celery_app.conf.task_always_eager = True
+        try:
+            results = self.run_cases(options)
+        finally:
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'commit': self.get_commit(),
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'dataset': dataset_summary(),
+                'repeat': options['repeat'],
+            },
+            'results': results,
+        }
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+            lines, regressions = compare(baseline['results'], results, options['threshold'])
+            self.stdout.write('=' * 50)
+            self.stdout.write(f'Сравнение с {baseline["meta"].get("commit") or options["compare"]}:')
+            for line in lines:
+                self.stdout.write(line)
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'Регрессии: {", ".join(regressions)}')
+
+    def run_cases(self, options):
+        context = BenchmarkContext()
+        names = options['only'] or list(CASES)
+        results = {}
+
+        for name in names:
+            func = CASES[name](context)
+            if func is None:
+                self.stdout.write(self.style.WARNING(f'{name}: пропущен, нет данных'))
+                continue
+
+            response = func()
+            status_code = getattr(response, 'status_code', None)
+            if status_code is not None and status_code >= 400:
+                self.stdout.write(self.style.ERROR(f'{name}: ответ {status_code}, пропущен'))
+                continue
+
+            result = measure(func, repeat=options['repeat'], warmup=options['warmup'])
+            results[name] = result
+            self.stdout.write(
+                f'{name}: p50 {result["p50_ms"]:.2f} мс, p90 {result["p90_ms"]:.2f} мс, '
+                f'p99 {result["p99_ms"]:.2f} мс, запросов {result["queries"]}'
+            )
+        return results
+
+    def get_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
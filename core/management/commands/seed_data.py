@@ -1,10 +1,16 @@
-from datetime import datetime, timedelta
+import random
+import time as timer
+from datetime import date, datetime, time, timedelta
 
 from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import load_data
 
 from core.models import (Restaurant, Review, ContactMessage, MenuCategory,
                          MenuItem, SiteContent, TeamMember, Award)
+from reservations import partitions
 from reservations.models import Table, Reservation
 
 User = get_user_model()
@@ -19,6 +25,25 @@ class Command(BaseCommand):
             action='store_true',
             help='Очистить базу данных перед заполнением',
         )
+        parser.add_argument(
+            '--scale',
+            action='store_true',
+            help='Сгенерировать большой синтетический набор данных для нагрузочных тестов',
+        )
+        parser.add_argument('--tables', type=int, default=1000, help='Количество столиков (--scale)')
+        parser.add_argument('--users', type=int, default=10000, help='Количество пользователей (--scale)')
+        parser.add_argument('--reservations', type=int, default=1000000,
+                            help='Количество бронирований (--scale)')
+        parser.add_argument('--reviews', type=int, default=10000, help='Количество отзывов (--scale)')
+        parser.add_argument('--messages', type=int, default=5000,
+                            help='Количество сообщений обратной связи (--scale)')
+        parser.add_argument('--years', type=int, default=3, help='Глубина истории бронирований в годах (--scale)')
+        parser.add_argument('--seed', type=int, default=42, help='Зерно генератора (--scale)')
+        parser.add_argument('--base-date', type=date.fromisoformat, default=None,
+                            help='Дата "сегодня" для генерации, ГГГГ-ММ-ДД; по умолчанию текущая (--scale)')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Размер пакета вставки (--scale)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Количество процессов для генерации бронирований (--scale)')
 
     def handle(self, *args, **options):
 
@@ -27,6 +52,10 @@ class Command(BaseCommand):
             from django.core.management import call_command
             call_command('flush', interactive=False)
 
+        if options['scale']:
+            self.create_scale_data(options)
+            return
+
         self.stdout.write('Начало заполнения базы данных...')
 
         # Создание пользователей
@@ -413,6 +442,9 @@ class Command(BaseCommand):
             },
         ]
 
+        dates = [reservation_data['date'] for reservation_data in reservations_data]
+        partitions.ensure_date_range(min(dates), max(dates))
+
         for i, reservation_data in enumerate(reservations_data, 1):
             reservation, created = Reservation.objects.get_or_create(
                 user=user,
@@ -502,3 +534,39 @@ class Command(BaseCommand):
             )
             if created:
                 self.stdout.write(f'Создано сообщение: {msg_data["subject"]}')
+
+    def create_scale_data(self, options):
+        """Создание большого синтетического набора данных"""
+        started = timer.perf_counter()
+        seed = options['seed']
+        batch_size = options['batch_size']
+        rng = random.Random(seed)
+        # От базовой даты отсчитываются история, будущие бронирования и
+        # время создания: с одной датой и зерном данные совпадают в любой день
+        base_date = options['base_date'] or timezone.now().date()
+        created_at = timezone.make_aware(datetime.combine(base_date, time()))
+
+        self.stdout.write(f'Генерация данных для нагрузочных тестов (seed={seed}, base-date={base_date})...')
+
+        tables = load_data.create_tables(options['tables'], rng, batch_size)
+        self.stdout.write(f'Столиков: {len(tables)}')
+
+        user_ids = load_data.create_users(options['users'], batch_size)
+        self.stdout.write(f'Пользователей: {len(user_ids)}')
+
+        reservations_count = load_data.create_reservations(
+            options['reservations'], options['years'], seed, tables, user_ids,
+            today=base_date, created_at=created_at,
+            batch_size=batch_size, workers=options['workers']
+        )
+        self.stdout.write(f'Бронирований: {reservations_count}')
+
+        load_data.create_reviews(options['reviews'], rng, user_ids, created_at, batch_size)
+        self.stdout.write(f'Отзывов: {options["reviews"]}')
+
+        load_data.create_contact_messages(options['messages'], rng, user_ids, created_at, batch_size)
+        self.stdout.write(f'Сообщений: {options["messages"]}')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Данные сгенерированы за {timer.perf_counter() - started:.1f} с')
+        )
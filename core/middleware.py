@@ -0,0 +1,41 @@
+import time as timer
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .query_stats import QueryCollector, query_stats
+
+
+class QueryInstrumentationMiddleware:
+    """Считает SQL-запросы каждого HTTP-запроса
+
+    Включается настройкой QUERY_INSTRUMENTATION. Добавляет заголовок
+    Server-Timing с количеством и временем запросов и копит статистику по
+    представлениям в query_stats.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        started = timer.perf_counter()
+        with connection.execute_wrapper(collector):
+            response = self.get_response(request)
+        total_duration = (timer.perf_counter() - started) * 1000
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={collector.duration:.2f};desc="{collector.count} queries"',
+            f'db-dup;desc="{sum(collector.duplicates.values())} duplicate queries"',
+            f'db-slowest;dur={collector.slowest_duration:.2f}',
+            f'app;dur={total_duration:.2f}',
+        ])
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        query_stats.record(view, collector, total_duration)
+
+        return response
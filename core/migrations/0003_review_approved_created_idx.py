@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 01:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['is_approved', '-created_at', '-id'], name='review_approved_created_idx'),
+        ),
+    ]
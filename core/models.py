@@ -66,6 +66,31 @@ class MenuItem(models.Model):
         return self.name
 
 
+class ReviewQuerySet(models.QuerySet):
+    """QuerySet отзывов"""
+
+    def approved(self):
+        """Опубликованные отзывы"""
+        return self.filter(is_approved=True)
+
+    def stats(self):
+        """Количество, средняя оценка и распределение оценок одним запросом"""
+        aggregates = {
+            f'rating_{rating}': models.Count('id', filter=models.Q(rating=rating))
+            for rating in range(1, 6)
+        }
+        result = self.aggregate(
+            total=models.Count('id'),
+            average=models.Avg('rating'),
+            **aggregates
+        )
+        return {
+            'total': result['total'],
+            'average': round(result['average'] or 0, 1),
+            'distribution': {rating: result[f'rating_{rating}'] for rating in range(1, 6)},
+        }
+
+
 class Review(models.Model):
     """Модель отзыва"""
     user = models.ForeignKey('users.CustomUser', on_delete=models.CASCADE, verbose_name="Пользователь")
@@ -79,10 +104,16 @@ class Review(models.Model):
     is_approved = models.BooleanField(default=False, verbose_name="Одобрен")
     is_featured = models.BooleanField(default=False, verbose_name="Показывать на главной")
 
+    objects = ReviewQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Отзыв"
         verbose_name_plural = "Отзывы"
         ordering = ['-created_at']
+        indexes = [
+            # Постраничный вывод опубликованных отзывов по курсору (created_at, id)
+            models.Index(fields=['is_approved', '-created_at', '-id'], name='review_approved_created_idx'),
+        ]
 
     def __str__(self):
         return f"Отзыв от {self.user.username} - {self.rating} звезд"
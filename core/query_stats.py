@@ -0,0 +1,165 @@
+"""Сбор статистики SQL-запросов по представлениям
+
+QueryCollector подключается через connection.execute_wrapper и считает
+запросы одного HTTP-запроса. QueryStatsRegistry хранит скользящее окно
+последних измерений для каждого представления в памяти процесса и
+периодически сбрасывает снимок в кэш, откуда его читают staff-эндпоинт и
+команда dump_query_stats, объединяя данные всех воркеров.
+"""
+import os
+import re
+import socket
+import threading
+import time as timer
+from collections import Counter, defaultdict, deque
+
+from django.conf import settings
+from django.core.cache import cache
+
+CACHE_PREFIX = 'query_stats'
+WORKERS_KEY = f'{CACHE_PREFIX}:workers'
+
+_PLACEHOLDER_LIST = re.compile(r'%s(?:\s*,\s*%s)+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Нормализованный текст запроса: списки параметров IN сворачиваются"""
+    return _WHITESPACE.sub(' ', _PLACEHOLDER_LIST.sub('%s, ...', sql)).strip()
+
+
+class QueryCollector:
+    """Считает запросы, суммарное время и повторы в рамках одного запроса"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.slowest_sql = None
+        self.slowest_duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = timer.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (timer.perf_counter() - started) * 1000
+            self.count += 1
+            self.duration += duration
+            self.fingerprints[fingerprint(sql)] += 1
+            if duration >= self.slowest_duration:
+                self.slowest_duration = duration
+                self.slowest_sql = sql
+
+    @property
+    def duplicates(self):
+        """Запросы, выполненные больше одного раза (признак N+1)"""
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+
+class QueryStatsRegistry:
+    """Скользящая статистика запросов по представлениям"""
+
+    def __init__(self):
+        self._samples = defaultdict(self._new_window)
+        self._lock = threading.Lock()
+        self._last_flush = timer.monotonic()
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+
+    @staticmethod
+    def _new_window():
+        return deque(maxlen=getattr(settings, 'QUERY_INSTRUMENTATION_WINDOW', 500))
+
+    def record(self, view, collector, total_duration):
+        sample = {
+            'queries': collector.count,
+            'db_ms': collector.duration,
+            'total_ms': total_duration,
+            'duplicates': collector.duplicates,
+            'slowest_sql': collector.slowest_sql,
+            'slowest_ms': collector.slowest_duration,
+        }
+        with self._lock:
+            self._samples[view].append(sample)
+        self.maybe_flush()
+
+    def snapshot(self):
+        """Агрегаты по представлениям для текущего процесса"""
+        with self._lock:
+            samples = {view: list(window) for view, window in self._samples.items()}
+
+        result = {}
+        for view, window in samples.items():
+            duplicates = Counter()
+            for sample in window:
+                duplicates.update(sample['duplicates'])
+            slowest = max(window, key=lambda sample: sample['slowest_ms'])
+            result[view] = {
+                'requests': len(window),
+                'queries_total': sum(sample['queries'] for sample in window),
+                'queries_max': max(sample['queries'] for sample in window),
+                'db_ms_total': sum(sample['db_ms'] for sample in window),
+                'total_ms_total': sum(sample['total_ms'] for sample in window),
+                'duplicates': dict(duplicates.most_common(10)),
+                'slowest_sql': slowest['slowest_sql'],
+                'slowest_ms': slowest['slowest_ms'],
+            }
+        return result
+
+    def maybe_flush(self):
+        interval = getattr(settings, 'QUERY_INSTRUMENTATION_FLUSH_INTERVAL', 10)
+        if timer.monotonic() - self._last_flush >= interval:
+            self.flush()
+
+    def flush(self):
+        """Сохраняет снимок процесса в кэш"""
+        self._last_flush = timer.monotonic()
+        timeout = getattr(settings, 'QUERY_INSTRUMENTATION_CACHE_TIMEOUT', 60 * 60)
+        try:
+            cache.set(f'{CACHE_PREFIX}:{self.worker}', self.snapshot(), timeout)
+            workers = set(cache.get(WORKERS_KEY, []))
+            if self.worker not in workers:
+                workers.add(self.worker)
+                cache.set(WORKERS_KEY, sorted(workers), timeout)
+        except Exception:
+            # Статистика не должна ломать обработку запросов
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+def merge_snapshots(snapshots):
+    """Объединяет снимки нескольких воркеров"""
+    result = {}
+    for snapshot in snapshots:
+        for view, stats in snapshot.items():
+            merged = result.get(view)
+            if merged is None:
+                result[view] = dict(stats, duplicates=dict(stats['duplicates']))
+                continue
+            for key in ('requests', 'queries_total', 'db_ms_total', 'total_ms_total'):
+                merged[key] += stats[key]
+            merged['queries_max'] = max(merged['queries_max'], stats['queries_max'])
+            duplicates = Counter(merged['duplicates'])
+            duplicates.update(stats['duplicates'])
+            merged['duplicates'] = dict(duplicates.most_common(10))
+            if stats['slowest_ms'] > merged['slowest_ms']:
+                merged['slowest_sql'] = stats['slowest_sql']
+                merged['slowest_ms'] = stats['slowest_ms']
+
+    for stats in result.values():
+        stats['queries_avg'] = stats['queries_total'] / stats['requests']
+        stats['db_ms_avg'] = stats['db_ms_total'] / stats['requests']
+    return result
+
+
+def collect_stats():
+    """Статистика всех воркеров из кэша"""
+    workers = cache.get(WORKERS_KEY, [])
+    snapshots = cache.get_many([f'{CACHE_PREFIX}:{worker}' for worker in workers]).values()
+    return merge_snapshots(snapshots)
+
+
+query_stats = QueryStatsRegistry()
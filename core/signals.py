@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+
+from .cache import bump_version
+from .models import Restaurant, Review, MenuCategory, MenuItem, SiteContent, TeamMember, Award
+
+CACHED_MODELS = [Restaurant, Review, MenuCategory, MenuItem, SiteContent, TeamMember, Award]
+
+
+def invalidate_content_cache(sender, **kwargs):
+    """Сбрасывает кэш контента при изменении модели"""
+    bump_version(sender)
+
+
+for model in CACHED_MODELS:
+    post_save.connect(invalidate_content_cache, sender=model, dispatch_uid=f'content_cache_save_{model.__name__}')
+    post_delete.connect(invalidate_content_cache, sender=model, dispatch_uid=f'content_cache_delete_{model.__name__}')
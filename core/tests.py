@@ -1,7 +1,11 @@
-from datetime import timedelta, date, time
+from datetime import datetime, timedelta, date, time
+from unittest import mock
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from reservations.forms import ReservationForm
 from reservations.models import Table, Reservation
@@ -164,6 +168,14 @@ class UtilityTests(TestCase):
         )
         self.assertFalse(is_available)
 
+    def test_find_tables_off_slot_single_query(self):
+        """Время не с начала слота проверяется одним запросом для всех столиков"""
+        from core.utils import find_available_tables
+        Table.objects.create(number='T3', capacity=4)
+        with self.assertNumQueries(1):
+            tables = find_available_tables(self.reservation.date, time(19, 15), 2, 2)
+        self.assertEqual([item['table'].number for item in tables], ['T2', 'T3'])
+
 
 class BasicAPITests(TestCase):
     def setUp(self):
@@ -187,3 +199,396 @@ class BasicAPITests(TestCase):
         """Тест API аутентификации"""
         response = self.client.get('/api-auth/login/')
         self.assertEqual(response.status_code, 200)
+
+
+class AvailabilityGridTests(TestCase):
+    def setUp(self):
+        from core.cache import local_cache
+        cache.clear()
+        local_cache.clear()
+
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.date = date.today() + timedelta(days=1)
+        self.table1 = Table.objects.create(number='T1', capacity=2)
+        self.table2 = Table.objects.create(number='T2', capacity=4)
+
+        Reservation.objects.create(
+            user=self.user,
+            table=self.table1,
+            date=self.date,
+            time=time(19, 0),
+            duration=2,
+            guests=2,
+            status='confirmed'
+        )
+
+    def test_grid_for_all_tables(self):
+        """Сетка доступности всех столиков возвращается одним ответом"""
+        # Столики, подходящие столики и бронирования дня; повторно - из кэша доступности
+        for queries in (3, 0):
+            with self.assertNumQueries(queries):
+                response = self.client.get(
+                    '/api/availability-grid/',
+                    {'date': self.date.isoformat(), 'duration': 2},
+                    headers={'x-requested-with': 'XMLHttpRequest'}
+                )
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(len(data['slots']), 24)
+
+        rows = {row['number']: row['available'] for row in data['tables']}
+        slot = data['slots'].index('18:00')
+        self.assertFalse(rows['T1'][slot])
+        self.assertTrue(rows['T2'][slot])
+        self.assertTrue(rows['T1'][data['slots'].index('21:00')])
+
+    def test_grid_skips_own_hold(self):
+        """Удержание закрывает время для других, но не для своего владельца"""
+        from reservations import holds
+        self.client.login(username='testuser', password='testpass123')
+        params = {'date': self.date.isoformat(), 'time': '12:00', 'duration': 2, 'table': self.table2.id}
+        self.assertTrue(self.client.post('/reservation/hold/', params).json()['success'])
+
+        def t2_at_noon(client):
+            data = client.get('/api/availability-grid/', {'date': self.date.isoformat(), 'duration': 2},
+                              headers={'x-requested-with': 'XMLHttpRequest'}).json()
+            rows = {row['number']: row['available'] for row in data['tables']}
+            return rows['T2'][data['slots'].index('12:00')]
+
+        self.assertTrue(t2_at_noon(self.client))
+        self.assertFalse(t2_at_noon(Client()))
+        holds.release_hold(self.client.session['reservation_hold'])
+
+    def test_invalid_duration(self):
+        """Неверная продолжительность отклоняется"""
+        response = self.client.get(
+            '/api/availability-grid/',
+            {'date': self.date.isoformat(), 'duration': 9},
+            headers={'x-requested-with': 'XMLHttpRequest'}
+        )
+        self.assertFalse(response.json()['success'])
+
+
+@override_settings(QUERY_INSTRUMENTATION=True, QUERY_INSTRUMENTATION_FLUSH_INTERVAL=0)
+class QueryInstrumentationTests(TestCase):
+    def setUp(self):
+        from core.query_stats import query_stats
+        query_stats.clear()
+        cache.clear()
+
+        self.staff = User.objects.create_user(
+            username='staff',
+            password='testpass123',
+            is_staff=True
+        )
+
+    def test_server_timing_header(self):
+        """Ответ содержит заголовок Server-Timing с числом запросов"""
+        response = self.client.get('/menu/')
+        self.assertIn('Server-Timing', response)
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"')
+
+    def test_staff_endpoint_aggregates_views(self):
+        """Статистика по представлениям доступна сотрудникам"""
+        self.client.get('/menu/')
+        self.client.get('/menu/')
+
+        response = self.client.get('/api/query-stats/')
+        self.assertEqual(response.status_code, 302)
+
+        self.client.login(username='staff', password='testpass123')
+        stats = self.client.get('/api/query-stats/').json()['views']
+        self.assertEqual(stats['core:menu']['requests'], 2)
+        self.assertGreater(stats['core:menu']['queries_total'], 0)
+
+    def test_fingerprint_collapses_in_lists(self):
+        """Списки параметров IN сворачиваются в один отпечаток"""
+        from core.query_stats import fingerprint
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s,  %s)')
+        )
+
+
+class ContentCacheTests(TestCase):
+    def setUp(self):
+        from core.cache import local_cache
+        cache.clear()
+        local_cache.clear()
+        from core.models import Restaurant
+        self.restaurant = Restaurant.objects.create(
+            name='Test Restaurant',
+            description='Описание',
+            address='Адрес',
+            phone='+7 (999) 999-99-99',
+            email='info@example.com',
+            opening_hours='11:00 - 23:00'
+        )
+
+    def test_home_served_from_cache(self):
+        """Повторный запрос главной не обращается к контенту в БД"""
+        self.client.get('/')
+        with CaptureQueriesContext(connection) as first:
+            self.client.get('/')
+        cache.clear()
+        with CaptureQueriesContext(connection) as uncached:
+            self.client.get('/')
+        self.assertLess(len(first), len(uncached))
+
+    def test_invalidated_on_save(self):
+        """Изменение контента сразу видно на странице"""
+        from core.models import Review
+        user = User.objects.create_user(username='reviewer', password='testpass123')
+        review = Review.objects.create(
+            user=user,
+            rating=5,
+            comment='Первый отзыв',
+            is_approved=True,
+            is_featured=True
+        )
+        self.assertContains(self.client.get('/'), 'Первый отзыв')
+
+        review.comment = 'Второй отзыв'
+        review.save()
+        self.assertContains(self.client.get('/'), 'Второй отзыв')
+
+    @override_settings(CACHE_ENABLE=False)
+    def test_cache_disabled(self):
+        """При CACHE_ENABLE = False кэш не используется"""
+        self.client.get('/about/')
+        self.assertFalse(any(key.startswith(':1:content:') for key in cache._cache))
+
+    def test_restaurant_context_is_lazy(self):
+        """Контекстный процессор не обращается к БД, пока шаблон не использует ресторан"""
+        from core.context_processors import restaurant_info
+        with self.assertNumQueries(0):
+            context = restaurant_info(None)
+        self.assertEqual(context['restaurant'].name, 'Test Restaurant')
+
+    def test_restaurant_local_cache(self):
+        """Ресторан берется из локального кэша процесса и обновляется при сохранении"""
+        from core.context_processors import get_restaurant
+        self.assertEqual(get_restaurant(), self.restaurant)
+        with self.assertNumQueries(0), mock.patch.object(cache, 'get_many') as get_many:
+            self.assertEqual(get_restaurant().name, 'Test Restaurant')
+        get_many.assert_not_called()
+
+        self.restaurant.name = 'Renamed'
+        self.restaurant.save()
+        self.assertEqual(get_restaurant().name, 'Renamed')
+
+
+class ReviewListTests(TestCase):
+    def setUp(self):
+        from core.cache import local_cache
+        from core.models import Review
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create_user(username='reviewer', password='testpass123')
+        for i in range(25):
+            Review.objects.create(user=self.user, rating=i % 5 + 1, comment=f'Отзыв {i}', is_approved=True)
+        Review.objects.create(user=self.user, rating=1, comment='Скрытый', is_approved=False)
+
+    def test_stats_single_query(self):
+        """Статистика отзывов считается одним запросом"""
+        from core.models import Review
+        with CaptureQueriesContext(connection) as queries:
+            stats = Review.objects.approved().stats()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(stats['total'], 25)
+        self.assertEqual(stats['average'], 3.0)
+        self.assertEqual(stats['distribution'], {1: 5, 2: 5, 3: 5, 4: 5, 5: 5})
+
+    def test_keyset_pagination(self):
+        """Страницы по курсору не пересекаются и покрывают все отзывы"""
+        response = self.client.get('/reviews/')
+        first_page = response.context['reviews']
+        self.assertEqual(len(first_page), 20)
+        self.assertEqual(response.context['total_reviews'], 25)
+
+        response = self.client.get('/reviews/', {'after': response.context['next_cursor']})
+        second_page = response.context['reviews']
+        self.assertEqual(len(second_page), 5)
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertFalse({r.id for r in first_page} & {r.id for r in second_page})
+
+    def test_invalid_cursor(self):
+        """Некорректный курсор открывает первую страницу"""
+        response = self.client.get('/reviews/', {'after': 'broken'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['is_first_page'])
+
+    def test_admin_approve_invalidates_stats(self):
+        """Публикация из админки сразу видна в статистике"""
+        from core.admin import ReviewAdmin
+        from core.models import Review
+        from django.contrib.admin.sites import site
+        self.client.get('/reviews/')
+        request = mock.Mock()
+        ReviewAdmin(Review, site).approve_reviews(request, Review.objects.filter(is_approved=False))
+        response = self.client.get('/reviews/')
+        self.assertEqual(response.context['total_reviews'], 26)
+
+
+class AsyncAvailabilityViewTests(TestCase):
+    def setUp(self):
+        from core.cache import local_cache
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.date = date.today() + timedelta(days=1)
+        self.table1 = Table.objects.create(number='T1', capacity=2)
+        self.table2 = Table.objects.create(number='T2', capacity=4)
+        Reservation.objects.create(
+            user=self.user, table=self.table1, date=self.date, time=time(18, 0),
+            duration=2, guests=2, status='confirmed'
+        )
+        self.headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+    def async_get(self, view, path, params):
+        """Ответ асинхронного варианта представления (как под web-asgi)"""
+        import json
+        from asgiref.sync import async_to_sync
+        from django.test import RequestFactory
+        request = RequestFactory().get(path, params, **self.headers)
+        return json.loads(async_to_sync(view)(request).content)
+
+    def test_check_availability(self):
+        """Асинхронная проверка доступности совпадает с синхронной"""
+        from core.utils import find_available_tables
+        from core.views import acheck_availability
+        for time_str in ['19:00', '19:15']:
+            params = {'date': self.date.isoformat(), 'time': time_str, 'duration': 2, 'guests': 2}
+            data = self.client.get('/api/check-availability/', params, **self.headers).json()
+            self.assertTrue(data['success'])
+            expected = find_available_tables(self.date, datetime.strptime(time_str, '%H:%M').time(), 2, 2)
+            self.assertEqual([table['number'] for table in data['available_tables']],
+                             [item['table'].number for item in expected])
+            self.assertEqual(self.async_get(acheck_availability, '/api/check-availability/', params), data)
+        self.assertEqual(data['count'], 1)
+
+    def test_available_times(self):
+        """Асинхронный список слотов совпадает с get_available_time_slots"""
+        from core.utils import get_available_time_slots
+        from core.views import aget_available_times
+        params = {'date': self.date.isoformat(), 'table_id': self.table1.id}
+        data = self.client.get('/api/get-available-times/', params, **self.headers).json()
+        expected = [slot['display'] for slot in get_available_time_slots(self.table1, self.date)]
+        self.assertEqual([slot['display'] for slot in data['available_times']], expected)
+        self.assertNotIn('17:00', expected)
+        self.assertEqual(self.async_get(aget_available_times, '/api/get-available-times/', params), data)
+
+        params['table_id'] = 999
+        self.assertFalse(self.client.get('/api/get-available-times/', params, **self.headers).json()['success'])
+        self.assertFalse(self.async_get(aget_available_times, '/api/get-available-times/', params)['success'])
+
+    def test_reservation_list_variants(self):
+        """Синхронный и асинхронный списки бронирований совпадают"""
+        from asgiref.sync import async_to_sync
+        from django.test import RequestFactory
+        from reservations.views import areservation_list
+        self.client.force_login(self.user)
+        response = self.client.get('/reservation/list/')
+        self.assertEqual(response.status_code, 200)
+
+        request = RequestFactory().get('/reservation/list/')
+        request.user = self.user
+        request.session = self.client.session
+        request._messages = mock.MagicMock()
+
+        async def auser():
+            return self.user
+        request.auser = auser
+        async_response = async_to_sync(areservation_list)(request)
+        self.assertEqual(async_response.status_code, 200)
+        self.assertIn(b'T1', async_response.content)
+        self.assertIn(b'T1', response.content)
+
+    def test_time_slots_follow_new_reservation(self):
+        """Синхронный и асинхронный списки слотов сразу видят новое бронирование"""
+        from core.utils import get_available_time_slots
+        from core.views import aget_available_times
+        params = {'date': self.date.isoformat(), 'table_id': self.table1.id}
+        self.async_get(aget_available_times, '/api/get-available-times/', params)
+        with self.captureOnCommitCallbacks(execute=True):
+            Reservation.objects.create(
+                user=self.user, table=self.table1, date=self.date, time=time(13, 0),
+                duration=2, guests=2, status='confirmed'
+            )
+        expected = [slot['display'] for slot in get_available_time_slots(self.table1, self.date)]
+        self.assertNotIn('13:00', expected)
+        data = self.async_get(aget_available_times, '/api/get-available-times/', params)
+        self.assertEqual([slot['display'] for slot in data['available_times']], expected)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://first:6379/1,redis://second:6379/1',
+        'OPTIONS': {'socket_timeout': 2, 'serializer': 'django.core.cache.backends.redis.RedisSerializer'},
+    }})
+    def test_redis_clients_use_cache_options(self):
+        """Клиенты Redis берут адрес и OPTIONS из CACHES"""
+        from core import async_cache
+        self.assertEqual(async_cache.redis_location(), 'redis://first:6379/1')
+        self.assertEqual(async_cache.connection_options(), {'socket_timeout': 2})
+        pool = async_cache.sync_client().connection_pool
+        self.assertEqual(pool.connection_kwargs['host'], 'first')
+        self.assertEqual(pool.connection_kwargs['socket_timeout'], 2)
+
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379/1',
+    }})
+    def test_async_client_closed_with_loop(self):
+        """Клиент redis.asyncio закрывается вместе с циклом async_to_sync"""
+        import redis.asyncio
+        from asgiref.sync import async_to_sync
+        from core import async_cache
+
+        async def use_client():
+            self.assertIs(async_cache.client(), async_cache.client())
+
+        with mock.patch.object(redis.asyncio.Redis, 'aclose') as aclose:
+            async_to_sync(use_client)()
+            async_to_sync(use_client)()
+        self.assertEqual(aclose.await_count, 2)
+        self.assertEqual(len(async_cache._clients), 0)
+
+
+class ScaleSeedTests(TestCase):
+    options = ['--scale', '--tables', '4', '--users', '5', '--reservations', '60', '--reviews', '3',
+               '--messages', '2', '--years', '1', '--base-date', '2024-06-15']
+
+    def seed(self):
+        from io import StringIO
+        from django.core.management import call_command
+        call_command('seed_data', *self.options, stdout=StringIO())
+        return list(Reservation.objects.order_by('date', 'time', 'table_id', 'user_id').values_list(
+            'user__username', 'table__number', 'date', 'time', 'duration', 'guests', 'status', 'created_at'
+        ))
+
+    def test_same_base_date_same_data(self):
+        """С одной базовой датой и зерном набор данных повторяется"""
+        first = self.seed()
+        self.assertTrue(50 <= len(first) <= 60)
+        base_date = date(2024, 6, 15)
+        for _, _, day, start, duration, _, status, _ in first:
+            self.assertTrue(base_date - timedelta(days=365) <= day < base_date + timedelta(days=60))
+            if day < base_date:
+                self.assertIn(status, ['completed', 'cancelled'])
+
+        Reservation.objects.all().delete()
+        self.assertEqual(self.seed(), first)
+
+    def test_created_at_from_base_date(self):
+        """Время создания отзывов и сообщений отсчитывается от базовой даты"""
+        from django.utils import timezone
+        from core.models import ContactMessage, Review
+        self.seed()
+        created_at = timezone.make_aware(datetime(2024, 6, 15))
+        self.assertEqual(set(Review.objects.values_list('created_at', flat=True)), {created_at})
+        self.assertEqual(set(ContactMessage.objects.values_list('created_at', flat=True)), {created_at})
+
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib.auth import views as auth_views
 from django.urls import path
 
@@ -13,7 +14,12 @@ urlpatterns = [
     path('reviews/add/', views.add_review, name='add_review'),
     path('reviews/delete/<int:review_id>/', views.delete_review, name='delete_review'),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
-    path('api/check-availability/', views.check_availability, name='check_availability'),
-    path('api/get-available-times/', views.get_available_times, name='get_available_times'),
+    path('api/check-availability/', views.acheck_availability if settings.ASYNC_VIEWS else views.check_availability,
+         name='check_availability'),
+    path('api/availability-stream/', views.availability_stream, name='availability_stream'),
+    path('api/get-available-times/', views.aget_available_times if settings.ASYNC_VIEWS else views.get_available_times,
+         name='get_available_times'),
+    path('api/availability-grid/', views.get_availability_grid, name='availability_grid'),
     path('feedback/', views.feedback, name='feedback'),
+    path('api/query-stats/', views.query_stats_view, name='query_stats'),
 ]
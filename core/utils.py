@@ -1,69 +1,41 @@
-from datetime import datetime, timedelta
-
-from reservations.models import Table, Reservation
+from reservations import availability_cache
+from reservations.occupancy import BOOKABLE_SLOTS, slot_time
 
 
 def find_available_tables(date, time, duration, guests, table_type=None):
     """Находит доступные столики по заданным параметрам"""
+    tables = availability_cache.free_tables(date, time, duration, guests, table_type)
+    return [{'table': table, 'message': "Столик доступен"} for table in tables]
 
-    tables = Table.objects.filter(
-        capacity__gte=guests,
-        is_available=True
-    )
-
-    if table_type:
-        tables = tables.filter(table_type=table_type)
-
-    available_tables = []
-
-    for table in tables:
-        is_available, message = table.is_available_for_reservation(date, time, duration)
-        if is_available:
-            available_tables.append({
-                'table': table,
-                'message': message
-            })
-
-    return available_tables
-
-
-def get_available_time_slots(table, date, opening_time="11:00", closing_time="23:00"):
-    """Возвращает список доступных временных слотов для столика на указанную дату"""
-    available_slots = []
 
-    # Преобразуем время открытия и закрытия
-    open_time = datetime.strptime(opening_time, "%H:%").time()
-    close_time = datetime.strptime(closing_time, "%H:%").time()
+async def afind_available_tables(date, time, duration, guests, table_type=None):
+    """Асинхронный вариант find_available_tables"""
+    tables = await availability_cache.afree_tables(date, time, duration, guests, table_type)
+    return [{'table': table, 'message': "Столик доступен"} for table in tables]
 
-    # Получаем все бронирования для этого столика на указанную дату
-    reservations = Reservation.objects.filter(
-        table=table,
-        date=date,
-        status__in=['pending', 'confirmed']
-    ).order_by('time')
 
-    # Начинаем с времени открытия
-    current_time = open_time
+def _time_slots(table, free_slots):
+    mask = free_slots.get(table.id, 0)
+    return [
+        {'time': slot_time(index), 'display': slot_time(index).strftime('%H:%M')}
+        for index in range(BOOKABLE_SLOTS)
+        if mask >> index & 1
+    ]
 
-    while current_time < close_time:
-        # Проверяем доступность для стандартной продолжительности (2 часа)
-        is_available, message = table.is_available_for_reservation(
-            date, current_time, 2
-        )
 
-        if is_available:
-            available_slots.append({
-                'time': current_time,
-                'display': current_time.strftime('%H:%M')
-            })
+def get_available_time_slots(table, date):
+    """Возвращает список доступных временных слотов для столика на указанную дату
 
-        # Переходим к следующему временному слоту (каждые 30 минут)
-        current_time_dt = datetime.combine(date, current_time)
-        current_time_dt += timedelta(minutes=30)
-        current_time = current_time_dt.time()
+    Слоты каждые 30 минут с открытия, бронирование на 2 часа. Синхронный и
+    асинхронный варианты читают один кэш доступности.
+    """
+    if not table.is_available:
+        return []
+    return _time_slots(table, availability_cache.get_free_slots(date, duration=2, guests=1))
 
-        # Если вышли за время закрытия, выходим из цикла
-        if current_time >= close_time:
-            break
 
-    return available_slots
+async def aget_available_time_slots(table, date):
+    """Асинхронный вариант get_available_time_slots"""
+    if not table.is_available:
+        return []
+    return _time_slots(table, await availability_cache.aget_free_slots(date, duration=2, guests=1))
@@ -2,24 +2,43 @@ from datetime import datetime
 
 from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.core.mail import send_mail
 from django.db import models
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 
+from reservations import live
 from reservations.models import Table
+from reservations.services import ReservationService
+from reservations.views import HOLD_SESSION_KEY
 from .forms import ReviewForm
-from .models import Restaurant, Review, ContactMessage, MenuItem, SiteContent, TeamMember, Award, MenuCategory
-from .utils import find_available_tables, get_available_time_slots
+from .cache import cached_content
+from .models import Review, ContactMessage, MenuItem, SiteContent, TeamMember, Award, MenuCategory
+from .query_stats import collect_stats, query_stats
+from .utils import (
+    afind_available_tables, aget_available_time_slots, find_available_tables, get_available_time_slots,
+)
+
+REVIEWS_PAGE_SIZE = 20
 
 
-# @cache_page(60 * 15)
 def home(request):
     """Главная страница"""
-    restaurant = Restaurant.objects.first()
-    reviews = Review.objects.filter(is_approved=True, is_featured=True)[:3]
+    context = cached_content(
+        'home',
+        [Review, MenuItem, SiteContent],
+        _build_home_context
+    )
+    return render(request, 'core/home.html', context)
+
+
+def _build_home_context():
+    # restaurant добавляется контекстным процессором restaurant_info
+    reviews = Review.objects.filter(is_approved=True, is_featured=True).select_related('user')[:3]
 
     popular_items = MenuItem.objects.filter(
         is_available=True,
@@ -31,19 +50,25 @@ def home(request):
         is_active=True
     ).first()
 
-    context = {
-        'restaurant': restaurant,
-        'reviews': reviews,
-        'popular_items': popular_items,
+    return {
+        'reviews': list(reviews),
+        'popular_items': list(popular_items),
         'features_content': features_content,
     }
-    return render(request, 'core/home.html', context)
 
 
-# @cache_page(60 * 30)
 def about(request):
     """Страница о ресторане"""
-    restaurant = Restaurant.objects.first()
+    context = cached_content(
+        'about',
+        [TeamMember, Award, SiteContent],
+        _build_about_context
+    )
+    return render(request, 'core/about.html', context)
+
+
+def _build_about_context():
+    # restaurant добавляется контекстным процессором restaurant_info
     team_members = TeamMember.objects.filter(is_active=True).order_by('order')
     awards = Award.objects.filter(is_active=True).order_by('-year', 'order')
 
@@ -57,14 +82,12 @@ def about(request):
         is_active=True
     ).first()
 
-    context = {
-        'restaurant': restaurant,
-        'team_members': team_members,
-        'awards': awards,
+    return {
+        'team_members': list(team_members),
+        'awards': list(awards),
         'mission_content': mission_content,
         'history_content': history_content,
     }
-    return render(request, 'core/about.html', context)
 
 
 def menu(request):
@@ -85,77 +108,172 @@ def menu(request):
     return render(request, 'core/menu.html', context)
 
 
+def _availability_params(request):
+    """Параметры проверки доступности из GET-запроса
+
+    ValueError/TypeError - неверные параметры.
+    """
+    reservation_date = datetime.strptime(request.GET.get('date'), '%Y-%m-%d').date()
+    reservation_time = datetime.strptime(request.GET.get('time'), '%H:%M').time()
+    duration = int(request.GET.get('duration', 2))
+    guests = int(request.GET.get('guests', 2))
+    return reservation_date, reservation_time, duration, guests, request.GET.get('table_type')
+
+
+def _available_tables_response(available_tables_data):
+    available_tables = []
+    for table_data in available_tables_data:
+        table = table_data['table']
+        available_tables.append({
+            'id': table.id,
+            'number': table.number,
+            'capacity': table.capacity,
+            'table_type': table.get_table_type_display(),
+            'description': table.description,
+            'message': table_data['message']
+        })
+
+    return JsonResponse({
+        'success': True,
+        'available_tables': available_tables,
+        'count': len(available_tables)
+    })
+
+
+def _is_ajax_get(request):
+    return request.method == 'GET' and request.headers.get('x-requested-with') == 'XMLHttpRequest'
+
+
 def check_availability(request):
     """API endpoint для проверки доступности столиков (AJAX)"""
-    if request.method == 'GET' and request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        date_str = request.GET.get('date')
-        time_str = request.GET.get('time')
-        duration = request.GET.get('duration', 2)
-        guests = request.GET.get('guests', 2)
-        table_type = request.GET.get('table_type')
+    if not _is_ajax_get(request):
+        return JsonResponse({'success': False, 'message': 'Invalid request'})
 
-        try:
-            reservation_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            reservation_time = datetime.strptime(time_str, '%H:%M').time()
-            duration = int(duration)
-            guests = int(guests)
+    try:
+        reservation_date, reservation_time, duration, guests, table_type = _availability_params(request)
+    except (ValueError, TypeError):
+        return JsonResponse({'success': False, 'message': 'Неверные параметры запроса'})
 
-            # Проверяем, что дата не в прошлом
-            if reservation_date < timezone.now().date():
-                return JsonResponse({
-                    'success': False,
-                    'message': 'Нельзя выбрать прошедшую дату'
-                })
+    # Проверяем, что дата не в прошлом
+    if reservation_date < timezone.now().date():
+        return JsonResponse({'success': False, 'message': 'Нельзя выбрать прошедшую дату'})
 
-            available_tables_data = find_available_tables(
-                reservation_date, reservation_time, duration, guests, table_type
-            )
+    return _available_tables_response(
+        find_available_tables(reservation_date, reservation_time, duration, guests, table_type)
+    )
 
-            available_tables = []
-            for table_data in available_tables_data:
-                table = table_data['table']
-                available_tables.append({
-                    'id': table.id,
-                    'number': table.number,
-                    'capacity': table.capacity,
-                    'table_type': table.get_table_type_display(),
-                    'description': table.description,
-                    'message': table_data['message']
-                })
 
-            return JsonResponse({
-                'success': True,
-                'available_tables': available_tables,
-                'count': len(available_tables)
-            })
+async def acheck_availability(request):
+    """Асинхронный вариант check_availability для ASGI (web-asgi)
 
-        except (ValueError, TypeError) as e:
-            return JsonResponse({
-                'success': False,
-                'message': 'Неверные параметры запроса'
-            })
+    Доступность берется из кэша через redis.asyncio, при промахе - через
+    async ORM.
+    """
+    if not _is_ajax_get(request):
+        return JsonResponse({'success': False, 'message': 'Invalid request'})
 
-    return JsonResponse({'success': False, 'message': 'Invalid request'})
+    try:
+        reservation_date, reservation_time, duration, guests, table_type = _availability_params(request)
+    except (ValueError, TypeError):
+        return JsonResponse({'success': False, 'message': 'Неверные параметры запроса'})
+
+    if reservation_date < timezone.now().date():
+        return JsonResponse({'success': False, 'message': 'Нельзя выбрать прошедшую дату'})
+
+    return _available_tables_response(
+        await afind_available_tables(reservation_date, reservation_time, duration, guests, table_type)
+    )
+
+
+async def availability_stream(request):
+    """Поток изменений доступности на дату (text/event-stream)
+
+    Заменяет периодические запросы к check_availability: клиент держит одно
+    соединение EventSource и получает события occupied/released.
+    """
+    try:
+        stream_date = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Неверный формат даты'}, status=400)
+
+    response = StreamingHttpResponse(live.stream(stream_date), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx не должен буферизовать поток
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 def get_available_times(request):
     """API endpoint для получения доступных временных слотов (AJAX)"""
+    if not _is_ajax_get(request):
+        return JsonResponse({'success': False, 'message': 'Invalid request'})
+
+    try:
+        reservation_date = datetime.strptime(request.GET.get('date'), '%Y-%m-%d').date()
+        table = Table.objects.get(id=request.GET.get('table_id'))
+    except (ValueError, TypeError, Table.DoesNotExist):
+        return JsonResponse({'success': False, 'message': 'Неверные параметры запроса'})
+
+    return JsonResponse({
+        'success': True,
+        'available_times': get_available_time_slots(table, reservation_date)
+    })
+
+
+async def aget_available_times(request):
+    """Асинхронный вариант get_available_times для ASGI (web-asgi)"""
+    if not _is_ajax_get(request):
+        return JsonResponse({'success': False, 'message': 'Invalid request'})
+
+    try:
+        reservation_date = datetime.strptime(request.GET.get('date'), '%Y-%m-%d').date()
+        table = await Table.objects.aget(id=request.GET.get('table_id'))
+    except (ValueError, TypeError, Table.DoesNotExist):
+        return JsonResponse({'success': False, 'message': 'Неверные параметры запроса'})
+
+    return JsonResponse({
+        'success': True,
+        'available_times': await aget_available_time_slots(table, reservation_date)
+    })
+
+
+def get_availability_grid(request):
+    """API endpoint для сетки доступности всех столиков на день (AJAX)"""
     if request.method == 'GET' and request.headers.get('x-requested-with') == 'XMLHttpRequest':
         date_str = request.GET.get('date')
-        table_id = request.GET.get('table_id')
+        duration = request.GET.get('duration', 2)
+        guests = request.GET.get('guests')
 
         try:
             reservation_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            table = Table.objects.get(id=table_id)
+            duration = int(duration)
+            guests = int(guests) if guests else None
 
-            available_slots = get_available_time_slots(table, reservation_date)
+            if not 1 <= duration <= 6:
+                raise ValueError(duration)
+
+            # Свое удержание столика (reservations.holds) не закрывает время
+            hold_token = request.session.get(HOLD_SESSION_KEY)
+            grid = ReservationService.get_availability_grid(reservation_date, duration, guests, hold_token)
 
             return JsonResponse({
                 'success': True,
-                'available_times': available_slots
+                'date': reservation_date,
+                'duration': duration,
+                'slots': [slot.strftime('%H:%M') for slot in grid['slots']],
+                'tables': [
+                    {
+                        'id': row['table'].id,
+                        'number': row['table'].number,
+                        'capacity': row['table'].capacity,
+                        'table_type': row['table'].get_table_type_display(),
+                        'available': row['available'],
+                    }
+                    for row in grid['tables']
+                ]
             })
 
-        except (ValueError, TypeError, Table.DoesNotExist) as e:
+        except (ValueError, TypeError) as e:
             return JsonResponse({
                 'success': False,
                 'message': 'Неверные параметры запроса'
@@ -164,6 +282,16 @@ def get_available_times(request):
     return JsonResponse({'success': False, 'message': 'Invalid request'})
 
 
+@staff_member_required
+def query_stats_view(request):
+    """Статистика SQL-запросов по представлениям (для сотрудников)"""
+    query_stats.flush()
+    return JsonResponse({
+        'enabled': settings.QUERY_INSTRUMENTATION,
+        'views': collect_stats(),
+    })
+
+
 @login_required
 def feedback(request):
     """Обработка формы обратной связи из футера (только для авторизованных пользователей)"""
@@ -254,21 +382,59 @@ def add_review(request):
     return render(request, 'core/add_review.html', context)
 
 
+def _build_review_stats():
+    return Review.objects.approved().stats()
+
+
+def _encode_review_cursor(review):
+    value = f'{review.created_at.isoformat()}|{review.id}'
+    return urlsafe_base64_encode(value.encode())
+
+
+def _decode_review_cursor(cursor):
+    """Позиция (created_at, id) последнего показанного отзыва или None"""
+    try:
+        created_at, review_id = urlsafe_base64_decode(cursor).decode().split('|')
+        return datetime.fromisoformat(created_at), int(review_id)
+    except (TypeError, ValueError):
+        return None
+
+
 def reviews_list(request):
-    """Страница со всеми отзывами"""
-    reviews = Review.objects.filter(is_approved=True).order_by('-created_at')
-    total_reviews = reviews.count()
-    average_rating = reviews.aggregate(avg_rating=models.Avg('rating'))['avg_rating'] or 0
+    """Страница со всеми отзывами
+
+    Статистика считается одним запросом и кэшируется до изменения отзывов,
+    список выводится постранично по курсору (created_at, id), поэтому
+    стоимость страницы не зависит от ее номера.
+    """
+    stats = cached_content('review_stats', [Review], _build_review_stats)
+
+    reviews = (
+        Review.objects.approved()
+        .select_related('user')
+        .order_by('-created_at', '-id')
+    )
+    position = _decode_review_cursor(request.GET.get('after', ''))
+    if position:
+        created_at, review_id = position
+        reviews = reviews.filter(
+            models.Q(created_at__lt=created_at) |
+            models.Q(created_at=created_at, id__lt=review_id)
+        )
 
-    rating_distribution = {}
-    for i in range(1, 6):
-        rating_distribution[i] = reviews.filter(rating=i).count()
+    page = list(reviews[:REVIEWS_PAGE_SIZE + 1])
+    next_cursor = None
+    if len(page) > REVIEWS_PAGE_SIZE:
+        page = page[:REVIEWS_PAGE_SIZE]
+        next_cursor = _encode_review_cursor(page[-1])
 
     context = {
-        'reviews': reviews,
-        'total_reviews': total_reviews,
-        'average_rating': round(average_rating, 1),
-        'rating_distribution': rating_distribution,
+        'reviews': page,
+        'total_reviews': stats['total'],
+        'average_rating': stats['average'],
+        'rating_distribution': stats['distribution'],
+        'next_cursor': next_cursor,
+        'is_first_page': position is None,
     }
     return render(request, 'core/reviews.html', context)
 
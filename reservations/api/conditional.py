@@ -0,0 +1,77 @@
+import hashlib
+from functools import wraps
+
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+
+from .. import versions
+
+# Ответ зависит от пользователя: JWT в Authorization или сессия в Cookie
+VARY_HEADERS = ('Authorization', 'Cookie')
+
+
+def table_scopes(view):
+    return [versions.TABLES]
+
+
+def reservation_scopes(view):
+    """Бронирования выводятся вместе со столиком и пользователем
+
+    Изменение пользователя сдвигает версию его бронирований (и общую для
+    персонала), см. reservations.signals.
+    """
+    user = view.request.user
+    owner = versions.RESERVATIONS if user.is_staff else versions.user_reservations(user.pk)
+    return [owner, versions.TABLES]
+
+
+def _etag(view, request, scope_versions, extra):
+    user = request.user
+    parts = [
+        view.action,
+        request.build_absolute_uri(),
+        request.accepted_media_type,
+        user.pk,
+        user.is_staff,
+        *extra,
+        *scope_versions,
+    ]
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    return quote_etag(digest)
+
+
+def conditional_get(scopes, daily=False):
+    """Условный GET для действия ViewSet по версиям коллекций
+
+    ETag строится из версий коллекций scopes(view) (reservations.versions),
+    пользователя, полного URL с параметрами и формата ответа. Если клиент
+    прислал совпадающий If-None-Match, возвращается 304 до запроса к БД и
+    сериализации. daily=True добавляет в ETag текущую дату - для выборок от
+    "сегодня".
+
+    Last-Modified не отдается: с точностью до секунды он не отличает запись,
+    сделанную в ту же секунду после ответа, и If-Modified-Since вернул бы
+    устаревший 304.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            # Версии читаются до данных: запись, попавшая между ними,
+            # сменит версию, и следующий запрос получит новый ответ
+            scope_versions = versions.get_versions(scopes(self))
+            extra = [timezone.now().date().isoformat()] if daily else []
+            etag = _etag(self, request, scope_versions, extra)
+
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            response['ETag'] = etag
+            patch_vary_headers(response, VARY_HEADERS)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
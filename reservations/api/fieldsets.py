@@ -0,0 +1,79 @@
+from django.core.exceptions import FieldDoesNotExist
+
+
+class SparseFieldsetViewMixin:
+    """Параметры ?fields= и ?expand= для чтения через ViewSet
+
+    ?fields=id,status,table - выводить только эти поля верхнего уровня;
+    ?expand=table - выводить вложенными объектами только эти связи, остальные
+    идентификаторами. Без параметров ответ не меняется.
+
+    Под набор полей подстраивается и queryset: select_related остается только
+    для раскрываемых связей, а only() ограничивает выбираемые столбцы.
+    Сериализатор должен поддерживать SparseFieldsetSerializerMixin.
+    """
+    sparse_fieldset_actions = ('list', 'retrieve')
+    # Столбцы, нужные помимо выводимых полей (сортировка, курсор пагинации)
+    sparse_fieldset_required = ()
+
+    def _query_param_set(self, name):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        return {item.strip() for item in value.split(',') if item.strip()}
+
+    def get_sparse_fieldset(self):
+        """(fields, expand) запроса; None - параметр не задан"""
+        if getattr(self, 'action', None) not in self.sparse_fieldset_actions:
+            return None, None
+        return self._query_param_set('fields'), self._query_param_set('expand')
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_sparse_fieldset()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        if expand is not None:
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def sparse_queryset(self, queryset):
+        """Подстраивает select_related и only() под запрошенные поля"""
+        fields, expand = self.get_sparse_fieldset()
+        if fields is None and expand is None:
+            return queryset
+
+        serializer = self.get_serializer_class()()
+        names = set(serializer.fields) if fields is None else fields & set(serializer.fields)
+        expanded = [
+            name for name in getattr(serializer.Meta, 'expandable_fields', ())
+            if name in names and (expand is None or name in expand)
+        ]
+        queryset = queryset.select_related(None)
+        if expanded:
+            queryset = queryset.select_related(*expanded)
+        if fields is None:
+            return queryset
+
+        model = queryset.model
+        columns = {model._meta.pk.name, *self.sparse_fieldset_required}
+        for name in names:
+            source = serializer.fields[name].source
+            if not _is_column(model, source):
+                continue
+            columns.add(source)
+            if name in expanded:
+                nested = serializer.fields[name]
+                related_model = model._meta.get_field(source).related_model
+                columns.update(
+                    f'{source}__{field.source}' for field in nested.fields.values()
+                    if _is_column(related_model, field.source)
+                )
+        return queryset.only(*columns)
+
+
+def _is_column(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return field.concrete
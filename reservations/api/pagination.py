@@ -0,0 +1,118 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class ReservationCursorPagination(CursorPagination):
+    """Постраничный вывод бронирований по ключу (date, time, id)
+
+    Позиция курсора - значения всех полей сортировки последней записи, а
+    следующая страница выбирается условием "строго после позиции" по
+    составному ключу. Так любая страница стоит столько же, сколько первая,
+    без OFFSET, а последнее поле id делает позицию уникальной.
+    """
+    ordering = ('-date', '-time', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    position_separator = '|'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        # Уникальность позиции: сортировка из ?ordering= дополняется по id
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering += ('-id' if ordering[-1].startswith('-') else 'id',)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        current_position = self.cursor.position if self.cursor is not None else None
+
+        if reverse:
+            queryset = queryset.order_by(*[self._reverse(order) for order in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self._after_position(queryset.model, current_position, reverse))
+
+        # Лишняя запись показывает, есть ли следующая страница; ссылки
+        # get_next_link/get_previous_link ставят позицию на край страницы
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            following_position = None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    @staticmethod
+    def _reverse(order):
+        return order[1:] if order.startswith('-') else f'-{order}'
+
+    def _after_position(self, model, position, reverse):
+        """Условие "после позиции" по составному ключу сортировки
+
+        (a, b, c) после (x, y, z) при убывании: a < x, или a = x и b < y,
+        или a = x, b = y и c < z. Отдельное условие на первое поле
+        позволяет СУБД начать просмотр индекса сразу с позиции.
+        """
+        values = position.split(self.position_separator)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        fields = []
+        for order, value in zip(self.ordering, values):
+            name = order.lstrip('-')
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            try:
+                value = field.to_python(value)
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+            lookup = 'lt' if order.startswith('-') != reverse else 'gt'
+            fields.append((field.name, lookup, value))
+
+        condition = Q()
+        equal = {}
+        for name, lookup, value in fields:
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+
+        first_name, first_lookup, first_value = fields[0]
+        return Q(**{f'{first_name}__{first_lookup}e': first_value}) & condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            name = order.lstrip('-')
+            if name == 'pk':
+                value = instance['pk'] if isinstance(instance, dict) else instance.pk
+            elif isinstance(instance, dict):
+                value = instance[name]
+            else:
+                value = getattr(instance, name)
+            values.append(str(value))
+        return self.position_separator.join(values)
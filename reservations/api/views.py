@@ -1,23 +1,29 @@
+from django.conf import settings
 from django.core.cache import cache
 from django.utils import timezone
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.utils.dateparse import parse_date
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, generics, status, filters
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 
+from .. import availability_cache
+from ..archive import ReservationArchive
 from ..filters import ReservationFilter
 from ..models import Reservation, Table
 from ..serializers import (
-    ReservationSerializer, ReservationCreateSerializer,
+    ReservationSerializer, ReservationCreateSerializer, ReservationBulkItemSerializer,
     TableSerializer, TableAvailabilitySerializer
 )
-from ..services import ReservationService
+from ..services import BulkReservationError, ReservationService, TableUnavailableError
+from .conditional import conditional_get, reservation_scopes, table_scopes
+from .fastpath import FastListMixin
+from .fieldsets import SparseFieldsetViewMixin
+from .pagination import ReservationCursorPagination
 
 
-class TableViewSet(viewsets.ModelViewSet):
+class TableViewSet(FastListMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """ViewSet для управления столиками"""
     queryset = Table.objects.all()
     serializer_class = TableSerializer
@@ -26,6 +32,10 @@ class TableViewSet(viewsets.ModelViewSet):
     search_fields = ['number', 'description']
     ordering_fields = ['number', 'capacity']
     ordering = ['number']
+    sparse_fieldset_actions = ('list', 'retrieve', 'available')
+
+    def get_queryset(self):
+        return self.sparse_queryset(super().get_queryset())
 
     def get_permissions(self):
         """Разрешения в зависимости от действия"""
@@ -35,11 +45,16 @@ class TableViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
 
-    @method_decorator(cache_page(60 * 15))  # Кэшируем на 15 минут
+    @conditional_get(table_scopes)
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @conditional_get(table_scopes)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=False, methods=['get'])
+    @conditional_get(table_scopes)
     def available(self, request):
         """Доступные столики"""
         queryset = self.get_queryset().available()
@@ -53,6 +68,10 @@ class TableViewSet(viewsets.ModelViewSet):
         if table_type:
             queryset = queryset.by_type(table_type)
 
+        response = self.fast_list_response(queryset)
+        if response is not None:
+            return response
+
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -67,36 +86,40 @@ class TableViewSet(viewsets.ModelViewSet):
         serializer = TableAvailabilitySerializer(data=request.data)
         if serializer.is_valid():
             data = serializer.validated_data
-            available_tables = Table.objects.available_tables(
-                data['date'], data['time'], data['duration'], data['guests']
+            available_tables = availability_cache.free_tables(
+                data['date'], data['time'], data['duration'], data['guests'], data.get('table_type')
             )
 
-            if data.get('table_type'):
-                available_tables = available_tables.by_type(data['table_type'])
-
             table_serializer = TableSerializer(available_tables, many=True)
             return Response({
                 'available_tables': table_serializer.data,
-                'count': available_tables.count()
+                'count': len(available_tables)
             })
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ReservationViewSet(viewsets.ModelViewSet):
+class ReservationViewSet(FastListMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """ViewSet для управления бронированиями"""
     serializer_class = ReservationSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_class = ReservationFilter
+    pagination_class = ReservationCursorPagination
     search_fields = ['table__number', 'special_requests']
     ordering_fields = ['date', 'time', 'created_at']
-    ordering = ['-date', '-time']
+    ordering = ['-date', '-time', '-id']
+    sparse_fieldset_actions = ('list', 'retrieve', 'upcoming')
+    # Ключ курсора и поля ?ordering=
+    sparse_fieldset_required = ('date', 'time', 'created_at')
+    fast_list_extra_columns = ('id', 'date', 'time', 'created_at')
 
     def get_queryset(self):
         """Возвращает queryset в зависимости от прав пользователя"""
         if self.request.user.is_staff:
-            return Reservation.objects.all().select_related('user', 'table')
-        return Reservation.objects.filter(user=self.request.user).select_related('table')
+            queryset = Reservation.objects.all().select_related('user', 'table')
+        else:
+            queryset = Reservation.objects.filter(user=self.request.user).select_related('user', 'table')
+        return self.sparse_queryset(queryset)
 
     def get_serializer_class(self):
         """Выбор сериализатора в зависимости от действия"""
@@ -104,6 +127,14 @@ class ReservationViewSet(viewsets.ModelViewSet):
             return ReservationCreateSerializer
         return ReservationSerializer
 
+    @conditional_get(reservation_scopes)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get(reservation_scopes)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """Создание бронирования с использованием сервиса"""
         try:
@@ -122,6 +153,29 @@ class ReservationViewSet(viewsets.ModelViewSet):
             from rest_framework.exceptions import ValidationError
             raise ValidationError({'non_field_errors': [str(e)]})
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Пакетное создание бронирований (корпоративные заказы, мероприятия)
+
+        Принимает список бронирований. Либо создаются все, либо ни одного:
+        при ошибках возвращается список ошибок по позициям в порядке запроса.
+        """
+        serializer = ReservationBulkItemSerializer(
+            data=request.data, many=True, allow_empty=False,
+            max_length=getattr(settings, 'RESERVATION_BULK_MAX_SIZE', 100)
+        )
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            reservations = ReservationService.create_reservations(request.user, serializer.validated_data)
+        except BulkReservationError as e:
+            return Response(e.errors, status=status.HTTP_400_BAD_REQUEST)
+        except TableUnavailableError as e:
+            return Response({'non_field_errors': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(ReservationSerializer(reservations, many=True).data, status=status.HTTP_201_CREATED)
+
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         """Отмена бронирования"""
@@ -140,7 +194,19 @@ class ReservationViewSet(viewsets.ModelViewSet):
 
         return Response({'status': 'Бронирование отменено'})
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def archive(self, request):
+        """Отчет по архиву бронирований за период (для персонала)"""
+        try:
+            date_from = parse_date(request.query_params.get('date_from', '')) or None
+            date_to = parse_date(request.query_params.get('date_to', '')) or None
+        except ValueError:
+            return Response({'error': 'Неверный формат даты'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'months': ReservationArchive().monthly_summary(date_from, date_to)})
+
     @action(detail=False, methods=['get'])
+    @conditional_get(reservation_scopes, daily=True)
     def upcoming(self, request):
         """Предстоящие бронирования"""
         queryset = self.get_queryset().filter(
@@ -148,6 +214,10 @@ class ReservationViewSet(viewsets.ModelViewSet):
             status__in=['pending', 'confirmed']
         )
 
+        response = self.fast_list_response(queryset)
+        if response is not None:
+            return response
+
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -0,0 +1,150 @@
+"""Холодный архив старых бронирований
+
+Завершенные и отмененные бронирования старше даты отсечения выгружаются в
+сжатые CSV-файлы по месяцам (<каталог>/YYYY/YYYY-MM.csv.gz) и удаляются из
+таблицы Reservation, чтобы рабочая таблица и ее индексы оставались
+небольшими. Строки читаются потоком через iterator() (серверный курсор в
+PostgreSQL). ReservationArchive читает архив для отчетов персонала.
+"""
+import csv
+import gzip
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from .cleanup import delete_reservations, export_columns
+from .models import Reservation
+
+ARCHIVE_STATUSES = ['completed', 'cancelled']
+# Номер столика и имя пользователя сохраняются, чтобы отчеты не зависели
+# от последующих изменений этих записей
+EXTRA_COLUMNS = ['table__number', 'user__username']
+
+
+def get_archive_dir():
+    return Path(settings.RESERVATION_ARCHIVE_DIR) / 'reservations'
+
+
+def month_path(directory, year, month):
+    return Path(directory) / f'{year:04d}' / f'{year:04d}-{month:02d}.csv.gz'
+
+
+def next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def archive_reservations(cutoff_date, directory=None, chunk_size=2000):
+    """Выгружает бронирования до cutoff_date в архив и удаляет их
+
+    Месяцы обрабатываются по очереди: строки месяца выгружаются в файл и
+    удаляются пачками только после его закрытия. Повторная выгрузка месяца
+    дописывает строки в конец файла. Возвращает количество архивированных
+    строк по месяцам.
+    """
+    directory = Path(directory or get_archive_dir())
+    columns = export_columns(Reservation) + EXTRA_COLUMNS
+    queryset = Reservation.objects.filter(date__lt=cutoff_date, status__in=ARCHIVE_STATUSES)
+
+    archived = {}
+    for month_start in queryset.dates('date', 'month'):
+        rows = (
+            queryset
+            .filter(date__gte=month_start, date__lt=next_month(month_start))
+            .order_by('date', 'id')
+            .values_list(*columns)
+            .iterator(chunk_size=chunk_size)
+        )
+        path = month_path(directory, month_start.year, month_start.month)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        is_new = not path.exists()
+
+        ids = []
+        with gzip.open(path, 'at', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            if is_new:
+                writer.writerow(columns)
+            for row in rows:
+                writer.writerow(row)
+                ids.append(row[0])
+
+        delete_archived(ids, chunk_size)
+        archived[month_start.strftime('%Y-%m')] = len(ids)
+    return archived
+
+
+def delete_archived(ids, batch_size):
+    """Удаляет выгруженные строки короткими транзакциями"""
+    for start in range(0, len(ids), batch_size):
+        with transaction.atomic():
+            delete_reservations(Reservation.objects.filter(id__in=ids[start:start + batch_size]))
+
+
+class ReservationArchive:
+    """Чтение архива бронирований"""
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory or get_archive_dir())
+
+    def months(self):
+        """Месяцы, для которых есть архив, в виде (год, месяц)"""
+        result = []
+        for path in self.directory.glob('*/*.csv.gz'):
+            year, month = path.name[:7].split('-')
+            result.append((int(year), int(month)))
+        return sorted(result)
+
+    def read(self, date_from=None, date_to=None):
+        """Строки архива за период (границы включительно) в виде словарей
+
+        Читаются только файлы нужных месяцев. Строки, выгруженные повторно
+        после прерванного архивирования, пропускаются.
+        """
+        for year, month in self.months():
+            if date_from and (year, month) < (date_from.year, date_from.month):
+                continue
+            if date_to and (year, month) > (date_to.year, date_to.month):
+                continue
+            # Повторы возможны только внутри файла одного месяца
+            seen = set()
+            with gzip.open(month_path(self.directory, year, month), 'rt', encoding='utf-8', newline='') as f:
+                for row in csv.DictReader(f):
+                    if row['id'] in seen:
+                        continue
+                    seen.add(row['id'])
+                    row_date = date.fromisoformat(row['date'])
+                    if (date_from and row_date < date_from) or (date_to and row_date > date_to):
+                        continue
+                    yield self.parse_row(row, row_date)
+
+    @staticmethod
+    def parse_row(row, row_date):
+        return {
+            'id': int(row['id']),
+            'user_id': int(row['user_id']),
+            'username': row['user__username'],
+            'table_id': int(row['table_id']),
+            'table_number': row['table__number'],
+            'date': row_date,
+            'time': row['time'],
+            'duration': int(row['duration']),
+            'guests': int(row['guests']),
+            'status': row['status'],
+            'special_requests': row['special_requests'],
+        }
+
+    def monthly_summary(self, date_from=None, date_to=None):
+        """Бронирования и гости по месяцам и статусам"""
+        summary = defaultdict(lambda: {'reservations': 0, 'guests': 0, 'by_status': defaultdict(int)})
+        for row in self.read(date_from, date_to):
+            month = summary[row['date'].strftime('%Y-%m')]
+            month['reservations'] += 1
+            month['guests'] += row['guests']
+            month['by_status'][row['status']] += 1
+        return [
+            {'month': key, 'reservations': value['reservations'], 'guests': value['guests'],
+             'by_status': dict(value['by_status'])}
+            for key, value in sorted(summary.items())
+        ]
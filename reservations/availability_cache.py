@@ -0,0 +1,259 @@
+"""Общий кэш доступности столиков
+
+Для (дата, продолжительность, гости, тип столика) в кэше хранятся маски
+свободных стартовых слотов всех подходящих столиков, так что проверка
+доступности на время, совпадающее с началом слота, не обращается к БД.
+
+Ключ записи включает версию даты и версию столиков. Версия даты
+увеличивается после фиксации любого изменения бронирования на эту дату,
+версия столиков - при изменении любого столика (см. reservations.signals).
+Сами столики берутся из двухуровневого кэша core.cache.cached_model_value.
+
+Временные удержания столиков (reservations.holds) в запись не попадают:
+они накладываются на маски при каждом чтении. Время не с начала слота
+проверяется по БД (free_tables) - с теми же удержаниями.
+"""
+import time as timer
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from core import async_cache
+from core.cache import aget_versions, bump_version, cached_model_value, get_versions, local_cache
+from . import holds
+from .models import Reservation, Table
+from .occupancy import BOOKABLE_SLOTS, free_starts_mask, interval_mask, slot_index
+
+
+def _date_version_key(date):
+    return f'availability_version:{date.isoformat()}'
+
+
+async def aget_date_version(date):
+    key = _date_version_key(date)
+    version = await async_cache.get(key)
+    if version is None:
+        await async_cache.add(key, int(timer.time() * 1000), None)
+        version = await async_cache.get(key)
+    return version
+
+
+def get_date_version(date):
+    key = _date_version_key(date)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(timer.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_date(date):
+    """Делает недействительными записи доступности на дату"""
+    key = _date_version_key(date)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(timer.time() * 1000), None)
+
+
+def bump_tables():
+    """Делает недействительными все записи (изменился столик)"""
+    bump_version(Table)
+
+
+def get_tables(version=None):
+    """Все столики {id: Table} в порядке номеров
+
+    version - версия столиков, под которой прочитаны маски свободных слотов:
+    локальная запись процесса другой версии не используется.
+    """
+    return cached_model_value(
+        Table, lambda: {table.id: table for table in Table.objects.order_by('number')}, version
+    )
+
+
+async def aget_tables(version=None):
+    entry = local_cache.get(Table._meta.label_lower)
+    if entry is not None and version is not None and entry[1] == version:
+        return entry[0]
+    return await sync_to_async(get_tables)(version)
+
+
+def get_tables_version():
+    """Текущая версия столиков или None без кэша (CACHE_ENABLE = False)"""
+    if not settings.CACHE_ENABLE:
+        return None
+    [version] = get_versions([Table])
+    return version
+
+
+async def aget_tables_version():
+    if not settings.CACHE_ENABLE:
+        return None
+    [version] = await aget_versions([Table])
+    return version
+
+
+def _candidate_tables(guests, table_type):
+    tables = Table.objects.available().by_capacity(guests).order_by('number')
+    if table_type:
+        tables = tables.by_type(table_type)
+    return tables.values_list('id', flat=True)
+
+
+def _day_reservations(date, table_ids):
+    return Reservation.objects.active().filter(date=date, table_id__in=table_ids).order_by().values_list(
+        'table_id', 'time', 'duration'
+    )
+
+
+def _free_slot_masks(table_ids, rows, duration):
+    occupied = {}
+    for table_id, start, reservation_duration in rows:
+        occupied[table_id] = occupied.get(table_id, 0) | interval_mask(start, reservation_duration)
+    return {table_id: free_starts_mask(occupied.get(table_id, 0), duration) for table_id in table_ids}
+
+
+def build_free_slots(date, duration, guests, table_type=None):
+    """Маски свободных стартовых слотов {table_id: mask} по данным БД"""
+    table_ids = list(_candidate_tables(guests, table_type))
+    return _free_slot_masks(table_ids, _day_reservations(date, table_ids), duration)
+
+
+async def abuild_free_slots(date, duration, guests, table_type=None):
+    table_ids = [table_id async for table_id in _candidate_tables(guests, table_type)]
+    rows = [row async for row in _day_reservations(date, table_ids)]
+    return _free_slot_masks(table_ids, rows, duration)
+
+
+def _cache_key(date, date_version, tables_version, duration, guests, table_type):
+    return (
+        f'availability:{date.isoformat()}:{date_version}:{tables_version}:'
+        f'{duration}:{guests}:{table_type or "*"}'
+    )
+
+
+def _without_holds(free_slots, held, duration):
+    """Убирает из масок начала, при которых интервал задевает удержанные слоты"""
+    if not held:
+        return free_slots
+    return {
+        table_id: mask & free_starts_mask(held[table_id], duration) if table_id in held else mask
+        for table_id, mask in free_slots.items()
+    }
+
+
+def get_free_slots(date, duration, guests, table_type=None, hold_token=None, version=None):
+    """Маски свободных слотов с учетом удержаний, кроме удержания hold_token
+
+    version - уже прочитанная версия столиков (get_tables_version).
+    """
+    free_slots = _get_free_slots(date, duration, guests, table_type, version)
+    return _without_holds(free_slots, holds.held_masks(date, list(free_slots), hold_token), duration)
+
+
+async def aget_free_slots(date, duration, guests, table_type=None, hold_token=None, version=None):
+    """Асинхронный вариант get_free_slots (redis.asyncio и async ORM)"""
+    free_slots = await _aget_free_slots(date, duration, guests, table_type, version)
+    held = await holds.aheld_masks(date, list(free_slots), hold_token)
+    return _without_holds(free_slots, held, duration)
+
+
+def _get_free_slots(date, duration, guests, table_type, tables_version=None):
+    """Маски свободных слотов из кэша или из БД"""
+    if not settings.CACHE_ENABLE:
+        return build_free_slots(date, duration, guests, table_type)
+
+    # Версии читаются до выборки из БД: если бронирование зафиксируют во
+    # время построения, запись сохранится под уже устаревшей версией
+    if tables_version is None:
+        tables_version = get_tables_version()
+    key = _cache_key(date, get_date_version(date), tables_version, duration, guests, table_type)
+    free_slots = cache.get(key)
+    if free_slots is None:
+        free_slots = build_free_slots(date, duration, guests, table_type)
+        cache.set(key, free_slots, getattr(settings, 'AVAILABILITY_CACHE_TIMEOUT', 10 * 60))
+    return free_slots
+
+
+async def _aget_free_slots(date, duration, guests, table_type, tables_version=None):
+    if not settings.CACHE_ENABLE:
+        return await abuild_free_slots(date, duration, guests, table_type)
+
+    if tables_version is None:
+        tables_version = await aget_tables_version()
+    key = _cache_key(date, await aget_date_version(date), tables_version, duration, guests, table_type)
+    free_slots = await async_cache.get(key)
+    if free_slots is None:
+        free_slots = await abuild_free_slots(date, duration, guests, table_type)
+        await async_cache.set(key, free_slots, getattr(settings, 'AVAILABILITY_CACHE_TIMEOUT', 10 * 60))
+    return free_slots
+
+
+def _select_tables(free_slots, tables, index):
+    return [
+        tables[table_id]
+        for table_id, mask in free_slots.items()
+        if mask >> index & 1 and table_id in tables
+    ]
+
+
+def available_tables(date, time, duration, guests, table_type=None, hold_token=None):
+    """Свободные столики на время или None, если время не совпадает с началом слота
+
+    Для None вызывающий код проверяет доступность по БД.
+    """
+    index = slot_index(time)
+    if index is None or index >= BOOKABLE_SLOTS:
+        return None
+    # Маски и столики берутся под одной версией столиков
+    version = get_tables_version()
+    free_slots = get_free_slots(date, duration, guests, table_type, hold_token, version)
+    return _select_tables(free_slots, get_tables(version), index)
+
+
+async def aavailable_tables(date, time, duration, guests, table_type=None, hold_token=None):
+    """Асинхронный вариант available_tables"""
+    index = slot_index(time)
+    if index is None or index >= BOOKABLE_SLOTS:
+        return None
+    version = await aget_tables_version()
+    free_slots = await aget_free_slots(date, duration, guests, table_type, hold_token, version)
+    return _select_tables(free_slots, await aget_tables(version), index)
+
+
+def _db_free_tables(date, time, duration, guests, table_type):
+    tables = Table.objects.available_tables(date, time, duration, guests).order_by('number')
+    if table_type:
+        tables = tables.by_type(table_type)
+    return tables
+
+
+def _unheld(tables, held, time, duration):
+    mask = interval_mask(time, duration)
+    return [table for table in tables if not held.get(table.id, 0) & mask]
+
+
+def free_tables(date, time, duration, guests, table_type=None, hold_token=None):
+    """Свободные и не удержанные другими столики на любое время
+
+    Время с начала слота проверяется по кэшу, остальное - одним запросом к
+    БД; удержания, кроме hold_token, в обоих случаях считаются занятостью.
+    """
+    tables = available_tables(date, time, duration, guests, table_type, hold_token)
+    if tables is not None:
+        return tables
+    tables = list(_db_free_tables(date, time, duration, guests, table_type))
+    held = holds.held_masks(date, [table.id for table in tables], hold_token)
+    return _unheld(tables, held, time, duration)
+
+
+async def afree_tables(date, time, duration, guests, table_type=None, hold_token=None):
+    """Асинхронный вариант free_tables"""
+    tables = await aavailable_tables(date, time, duration, guests, table_type, hold_token)
+    if tables is not None:
+        return tables
+    tables = [table async for table in _db_free_tables(date, time, duration, guests, table_type)]
+    held = await holds.aheld_masks(date, [table.id for table in tables], hold_token)
+    return _unheld(tables, held, time, duration)
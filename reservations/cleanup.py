@@ -0,0 +1,148 @@
+"""Пакетное удаление старых бронирований
+
+BatchDeleter удаляет строки диапазонами первичного ключа: каждая пачка
+удаляется в своей короткой транзакции, между пачками выдерживается
+ограничение по скорости. Последний удаленный id сохраняется в кэше, поэтому
+прерванная очистка продолжается с того же места. Перед удалением строки
+пачки можно дописать в сжатый CSV-файл.
+
+delete_reservations удаляет пачку бронирований одним DELETE, без загрузки
+объектов и обработчиков post_delete на каждую строку.
+"""
+import csv
+import gzip
+import time as timer
+
+from django.core.cache import cache
+from django.db import transaction
+
+from . import availability_cache, versions
+from .models import NotificationOutbox, Reservation
+
+CHECKPOINT_PREFIX = 'cleanup:checkpoint'
+
+
+def export_columns(model):
+    """Колонки модели для выгрузки в CSV"""
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def append_csv(path, columns, rows):
+    """Дописывает строки в сжатый CSV, заголовок пишется в новый файл"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    is_new = not path.exists()
+    with gzip.open(path, 'at', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        if is_new:
+            writer.writerow(columns)
+        writer.writerows(rows)
+
+
+class BatchDeleter:
+    """Удаление строк queryset пачками по диапазонам первичного ключа"""
+
+    def __init__(self, queryset, name, batch_size=1000, rows_per_second=None,
+                 archive_path=None, on_progress=None, delete=None):
+        """delete(batch) удаляет строки пачки и возвращает их число;
+        по умолчанию - QuerySet.delete() с сигналами и каскадом"""
+        self.queryset = queryset.order_by()
+        self.model = queryset.model
+        self.name = name
+        self.batch_size = batch_size
+        self.rows_per_second = rows_per_second
+        self.archive_path = archive_path
+        self.on_progress = on_progress
+        self.delete = delete or self.default_delete
+        self.columns = export_columns(self.model)
+
+    @property
+    def checkpoint_key(self):
+        return f'{CHECKPOINT_PREFIX}:{self.name}'
+
+    def get_checkpoint(self, criteria):
+        """id, с которого продолжать, если критерии отбора не изменились"""
+        checkpoint = cache.get(self.checkpoint_key)
+        if checkpoint and checkpoint['criteria'] == criteria:
+            return checkpoint['last_id']
+        return 0
+
+    def save_checkpoint(self, criteria, last_id):
+        cache.set(self.checkpoint_key, {'criteria': criteria, 'last_id': last_id}, None)
+
+    def clear_checkpoint(self):
+        cache.delete(self.checkpoint_key)
+
+    def run(self, criteria=''):
+        """Удаляет все строки и возвращает итог
+
+        criteria описывает условия отбора (например, дату отсечения): при их
+        изменении сохраненная позиция не используется.
+        """
+        last_id = self.get_checkpoint(criteria)
+        progress = {'deleted': 0, 'batches': 0, 'last_id': last_id, 'resumed_from': last_id}
+        started = timer.monotonic()
+
+        while True:
+            with transaction.atomic():
+                ids = list(
+                    self.queryset.filter(pk__gt=last_id)
+                    .order_by('pk')
+                    .values_list('pk', flat=True)[:self.batch_size]
+                )
+                if not ids:
+                    break
+
+                batch = self.queryset.filter(pk__gte=ids[0], pk__lte=ids[-1])
+                if self.archive_path:
+                    append_csv(self.archive_path, self.columns, batch.order_by('pk').values_list(*self.columns))
+                deleted = self.delete(batch)
+
+            last_id = ids[-1]
+            self.save_checkpoint(criteria, last_id)
+            progress['deleted'] += deleted
+            progress['batches'] += 1
+            progress['last_id'] = last_id
+            if self.on_progress:
+                self.on_progress(dict(progress))
+
+            self.throttle(progress['deleted'], started)
+
+        self.clear_checkpoint()
+        return progress
+
+    def default_delete(self, batch):
+        return batch.delete()[1].get(self.model._meta.label, 0)
+
+    def throttle(self, deleted, started):
+        """Пауза, чтобы средняя скорость не превышала rows_per_second"""
+        if not self.rows_per_second:
+            return
+        delay = deleted / self.rows_per_second - (timer.monotonic() - started)
+        if delay > 0:
+            timer.sleep(delay)
+
+
+def delete_reservations(queryset):
+    """Удаляет бронирования queryset и их уведомления, возвращает число строк
+
+    Вместо обработчиков post_delete на каждую строку (кэш доступности,
+    версии API, поток доступности) после фиксации один раз сбрасываются
+    затронутые даты и списки пользователей. Событий в поток нет: удалять
+    этой функцией следует только неактивные бронирования.
+    """
+    rows = list(queryset.order_by().values_list('pk', 'date', 'user_id'))
+    if not rows:
+        return 0
+    ids = [pk for pk, _, _ in rows]
+    NotificationOutbox.objects.filter(reservation_id__in=ids)._raw_delete(queryset.db)
+    deleted = Reservation.objects.filter(pk__in=ids)._raw_delete(queryset.db)
+
+    dates = {row_date for _, row_date, _ in rows}
+    user_ids = {user_id for _, _, user_id in rows}
+
+    def after_commit():
+        for row_date in dates:
+            availability_cache.bump_date(row_date)
+        versions.bump_reservations(user_ids)
+    transaction.on_commit(after_commit)
+    return deleted
@@ -2,6 +2,7 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 
+from . import rules
 from .models import Table
 
 
@@ -13,7 +14,6 @@ class ReservationForm(forms.Form):
         widget=forms.DateInput(attrs={
             'type': 'date',
             'class': 'form-control',
-            'min': timezone.now().date().isoformat()
         })
     )
 
@@ -57,10 +57,17 @@ class ReservationForm(forms.Form):
         if time_slots:
             self.fields['time'].choices = [('', 'Выберите время')] + [(t, t) for t in time_slots]
 
+        # Границы даты считаются при каждом создании формы, а не при импорте
+        self.fields['date'].widget.attrs.update({
+            'min': timezone.now().date().isoformat(),
+            'max': rules.max_booking_date().isoformat(),
+        })
+
     def clean_date(self):
         date = self.cleaned_data['date']
-        if date < timezone.now().date():
-            raise ValidationError('Нельзя выбрать прошедшую дату')
+        error = rules.date_error(date)
+        if error:
+            raise ValidationError(error)
         return date
 
 
@@ -77,5 +84,5 @@ class TableSelectionForm(forms.Form):
         available_tables = kwargs.pop('available_tables', None)
         super().__init__(*args, **kwargs)
 
-        if available_tables:
+        if available_tables is not None:
             self.fields['table'].queryset = available_tables
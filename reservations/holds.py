@@ -0,0 +1,289 @@
+"""Временные удержания столиков на время оформления бронирования
+
+Выбор столика на странице бронирования ставит аренду с TTL на получасовые
+слоты интервала. Все удержания даты хранятся в одном ключе
+hold_slots:<дата>: в Redis - хэш "<столик>:<слот>" ->
+"<токен>:<владелец>:<истечение, мс>",
+который меняют Lua-скрипты (проверка и запись всех слотов атомарны); с другими
+бэкендами (тесты, локальный запуск) - словарь в кэше под блокировкой
+процесса. Поэтому чтение удержаний на дату стоит одного запроса. Пока слоты
+удержаны, расчет доступности считает их занятыми для всех, кроме владельца
+удержания (см. availability_cache).
+
+Удержание превращается в Reservation в ReservationService.create_reservation:
+интервал бронирования закрепляется за токеном до вставки, а удержание
+снимается после фиксации транзакции; иначе оно истекает само через
+RESERVATION_HOLD_TTL секунд. Постановка и снятие удержания публикуются в
+поток доступности (reservations.live).
+"""
+import math
+import threading
+import time as timer
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import async_cache
+from . import live
+from .occupancy import SLOT_COUNT, interval_mask
+
+# Закрепляет слоты ARGV[7..] за токеном ARGV[1] владельца ARGV[5], если
+# каждый свободен, истек или уже принадлежит этому токену. При ARGV[6] = '1'
+# действующие удержания того же владельца тоже не мешают и остаются за ним
+_LEASE_SCRIPT = """
+local now = tonumber(ARGV[2])
+local keep = {}
+for i = 7, #ARGV do
+    local value = redis.call('HGET', KEYS[1], ARGV[i])
+    if value then
+        local token, owner, expires = string.match(value, '^(%w+):(%d+):(%d+)$')
+        if token ~= ARGV[1] and tonumber(expires) > now then
+            if ARGV[6] == '1' and owner == ARGV[5] then
+                keep[ARGV[i]] = true
+            else
+                return 0
+            end
+        end
+    end
+end
+local value = ARGV[1] .. ':' .. ARGV[5] .. ':' .. ARGV[3]
+for i = 7, #ARGV do
+    if not keep[ARGV[i]] then
+        redis.call('HSET', KEYS[1], ARGV[i], value)
+    end
+end
+if redis.call('PTTL', KEYS[1]) < tonumber(ARGV[4]) then
+    redis.call('PEXPIRE', KEYS[1], ARGV[4])
+end
+return 1
+"""
+
+# Удаляет слоты токена ARGV[1]
+_RELEASE_SCRIPT = """
+local prefix = ARGV[1] .. ':'
+local fields = redis.call('HGETALL', KEYS[1])
+for i = 1, #fields, 2 do
+    if string.sub(fields[i + 1], 1, #prefix) == prefix then
+        redis.call('HDEL', KEYS[1], fields[i])
+    end
+end
+return 1
+"""
+
+_local_lock = threading.Lock()
+
+
+def _get_ttl():
+    return getattr(settings, 'RESERVATION_HOLD_TTL', 5 * 60)
+
+
+def _slots_key(date):
+    return f'hold_slots:{date.isoformat()}'
+
+
+def _redis_key(date):
+    return cache.make_and_validate_key(_slots_key(date))
+
+
+def _record_key(token):
+    return f'hold:{token}'
+
+
+def _now_ms():
+    return int(timer.time() * 1000)
+
+
+def _fields(table_id, time, duration):
+    mask = interval_mask(time, duration)
+    return [f'{table_id}:{index}' for index in range(SLOT_COUNT) if mask >> index & 1]
+
+
+def _store_local(date, slots, now):
+    """Сохраняет словарь удержаний даты до истечения самого долгого"""
+    if slots:
+        timeout = math.ceil((max(expires for token, owner_id, expires in slots.values()) - now) / 1000)
+        cache.set(_slots_key(date), slots, timeout)
+    else:
+        cache.delete(_slots_key(date))
+
+
+def _lease_slots(date, fields, token, owner_id, ttl, share_owner=False):
+    """Атомарно закрепляет слоты за токеном; False, если часть удержана другим
+
+    share_owner - слоты, удержанные тем же владельцем под другим токеном, не
+    мешают и остаются за своим удержанием.
+    """
+    now = _now_ms()
+    expires = now + ttl * 1000
+    owner_id = owner_id or 0
+    if async_cache.uses_redis():
+        script = async_cache.sync_client().register_script(_LEASE_SCRIPT)
+        return bool(script(
+            keys=[_redis_key(date)],
+            args=[token, now, expires, ttl * 1000, owner_id, int(share_owner), *fields],
+        ))
+
+    with _local_lock:
+        slots = cache.get(_slots_key(date), {})
+        taken = {
+            field for field in fields
+            if field in slots and slots[field][0] != token and slots[field][2] > now
+        }
+        if any(not share_owner or slots[field][1] != owner_id for field in taken):
+            return False
+        slots.update({field: (token, owner_id, expires) for field in fields if field not in taken})
+        _store_local(date, slots, now)
+        return True
+
+
+def _release_slots(date, token):
+    if async_cache.uses_redis():
+        script = async_cache.sync_client().register_script(_RELEASE_SCRIPT)
+        script(keys=[_redis_key(date)], args=[token])
+        return
+
+    with _local_lock:
+        slots = cache.get(_slots_key(date), {})
+        remaining = {field: value for field, value in slots.items() if value[0] != token}
+        if remaining != slots:
+            _store_local(date, remaining, _now_ms())
+
+
+def get_hold(token):
+    """Данные удержания или None, если оно истекло или снято"""
+    if not token:
+        return None
+    return cache.get(_record_key(token))
+
+
+def lease(table_id, date, time, duration, owner_id, token=None, ttl=None):
+    """Удерживает интервал столика без события в потоке доступности
+
+    С token удержание этого токена продлевается и переносится на интервал
+    (слоты, уже принадлежащие токену, не считаются занятыми). Возвращает
+    словарь удержания или None, если часть слотов удержана другим гостем.
+    """
+    ttl = ttl or _get_ttl()
+    token = token or uuid.uuid4().hex
+    if not _lease_slots(date, _fields(table_id, time, duration), token, owner_id, ttl):
+        return None
+
+    hold = {
+        'token': token,
+        'table_id': table_id,
+        'date': date,
+        'time': time,
+        'duration': duration,
+        'owner_id': owner_id,
+        'expires_at': timer.time() + ttl,
+    }
+    cache.set(_record_key(token), hold, ttl)
+    return hold
+
+
+def lease_intervals(intervals, owner_id, ttl=None):
+    """Закрепляет интервалы пакета [(table_id, date, time, duration)] за одним токеном
+
+    Для ReservationService.create_reservations: собственные удержания
+    owner_id не мешают. Все даты закрепляются или ни одна; возвращает
+    токен или None, если часть слотов удержана другим гостем. Снимается
+    release_intervals.
+    """
+    ttl = ttl or _get_ttl()
+    token = uuid.uuid4().hex
+    fields = {}
+    for table_id, date, time, duration in intervals:
+        fields.setdefault(date, []).extend(_fields(table_id, time, duration))
+    leased = []
+    for date, date_fields in fields.items():
+        if not _lease_slots(date, date_fields, token, owner_id, ttl, share_owner=True):
+            release_intervals(token, leased)
+            return None
+        leased.append(date)
+    return token
+
+
+def release_intervals(token, dates):
+    """Снимает слоты токена lease_intervals на датах пакета"""
+    for date in set(dates):
+        _release_slots(date, token)
+
+
+def place_hold(table_id, date, time, duration, owner_id, ttl=None):
+    """Удерживает интервал столика; None, если часть слотов уже удержана
+
+    Возвращает словарь удержания с токеном и временем истечения.
+    """
+    hold = lease(table_id, date, time, duration, owner_id, ttl=ttl)
+    if hold is not None:
+        event = live.reservation_event('held', date, table_id, time, duration)
+        live.publish({**event, 'expires_in': ttl or _get_ttl()})
+    return hold
+
+
+def release_hold(token, publish=True):
+    """Снимает удержание (после создания бронирования или смены столика)
+
+    publish=False - без события unheld: при создании бронирования вместо
+    него приходит occupied.
+    """
+    hold = get_hold(token)
+    if hold is None:
+        return
+    _release_slots(hold['date'], token)
+    cache.delete(_record_key(token))
+    if publish:
+        live.publish(live.reservation_event(
+            'unheld', hold['date'], hold['table_id'], hold['time'], hold['duration']
+        ))
+
+
+def _decode(raw):
+    slots = {}
+    for field, value in raw.items():
+        token, owner_id, expires = value.decode().split(':')
+        slots[field.decode()] = (token, int(owner_id), int(expires))
+    return slots
+
+
+def _masks(slots, table_ids, exclude, owner_id):
+    now = _now_ms()
+    table_ids = set(table_ids)
+    masks = {}
+    for field, (token, owner, expires) in slots.items():
+        table_id, index = map(int, field.split(':'))
+        if token == exclude or (owner_id is not None and owner == owner_id):
+            continue
+        if expires > now and table_id in table_ids:
+            masks[table_id] = masks.get(table_id, 0) | 1 << index
+    return masks
+
+
+def held_masks(date, table_ids, exclude=None, owner_id=None):
+    """Маски удержанных слотов {table_id: mask}
+
+    Не учитываются удержание с токеном exclude и все удержания owner_id.
+    """
+    if not table_ids:
+        return {}
+    if async_cache.uses_redis():
+        slots = _decode(async_cache.sync_client().hgetall(_redis_key(date)))
+    else:
+        slots = cache.get(_slots_key(date), {})
+    return _masks(slots, table_ids, exclude, owner_id)
+
+
+async def aheld_masks(date, table_ids, exclude=None, owner_id=None):
+    if not table_ids:
+        return {}
+    if async_cache.uses_redis():
+        slots = _decode(await async_cache.client().hgetall(_redis_key(date)))
+    else:
+        slots = await cache.aget(_slots_key(date), {})
+    return _masks(slots, table_ids, exclude, owner_id)
+
+
+def is_held(table_id, date, time, duration, exclude=None):
+    """Удержан ли какой-либо слот интервала другим гостем"""
+    return bool(held_masks(date, [table_id], exclude).get(table_id, 0) & interval_mask(time, duration))
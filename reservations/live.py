@@ -0,0 +1,218 @@
+"""Поток изменений доступности столиков (Server-Sent Events)
+
+После фиксации изменения бронирования (см. reservations.signals) в канал
+availability:<дата> публикуется событие:
+
+    {"type": "occupied" | "released", "date": "2025-01-31",
+     "table_id": 3, "start": "19:00", "duration": 2}
+
+occupied - интервал столика занят, released - освобожден (отмена, перенос,
+удаление); held и unheld - интервал временно удержан гостем на время
+оформления и удержание снято (reservations.holds). В held есть expires_in -
+через сколько секунд удержание истечет само, без события unheld.
+
+Подписчики регистрируются в процессе, и событие раздается их очередям. С
+RedisCache события расходятся через Redis pub/sub по всем процессам
+uvicorn: процесс держит одно подключение pub/sub на все потоки и
+подписан на канал даты, пока у нее есть слушатели. С другими бэкендами
+(тесты, локальный запуск) события раздаются только внутри процесса.
+Клиент держит одно соединение EventSource вместо периодических запросов к
+/api/check-availability/.
+"""
+import asyncio
+import json
+import threading
+import weakref
+from contextlib import asynccontextmanager
+
+import redis
+from django.conf import settings
+
+from core import async_cache
+
+# Через сколько миллисекунд EventSource переподключается после обрыва
+RETRY_MS = 3000
+
+# Подписчики внутри процесса: канал -> {(цикл событий, очередь)}
+_subscribers = {}
+_subscribers_lock = threading.Lock()
+# Общее подключение pub/sub цикла событий (под uvicorn - процесса)
+_relays = weakref.WeakKeyDictionary()
+_relay_locks = weakref.WeakKeyDictionary()
+# Помещается в очереди подписчиков при обрыве подключения к Redis
+_RELAY_LOST = object()
+
+
+def channel(date):
+    return f'availability:{date.isoformat()}'
+
+
+def reservation_event(event_type, date, table_id, start, duration):
+    return {
+        'type': event_type,
+        'date': date.isoformat(),
+        'table_id': table_id,
+        'start': start.strftime('%H:%M'),
+        'duration': duration,
+    }
+
+
+def publish(event):
+    """Рассылает событие подписчикам даты события"""
+    name = f'availability:{event["date"]}'
+    data = json.dumps(event)
+    if async_cache.uses_redis():
+        try:
+            async_cache.sync_client().publish(name, data)
+        except redis.RedisError:
+            # Бронирование уже зафиксировано; клиент без события увидит
+            # занятый столик при отправке формы
+            pass
+        return
+
+    _deliver(name, data)
+
+
+def _deliver(name, data, loop=None):
+    """Кладет событие в очереди подписчиков канала (только цикла loop, если указан)"""
+    with _subscribers_lock:
+        subscribers = list(_subscribers.get(name, ()))
+    for subscriber_loop, queue in subscribers:
+        if loop is not None and subscriber_loop is not loop:
+            continue
+        try:
+            subscriber_loop.call_soon_threadsafe(queue.put_nowait, data)
+        except RuntimeError:
+            # Цикл событий подписчика уже закрыт
+            pass
+
+
+class _RedisRelay:
+    """Одно подключение pub/sub цикла событий на все потоки доступности
+
+    Канал даты подписан, пока у него есть слушатели в этом цикле; сообщения
+    читает одна задача и раздает очередям подписчиков. Подписка и отписка
+    идут под общей блокировкой цикла, поэтому закрытое подключение не
+    достанется новому слушателю.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.pubsub = async_cache.client().pubsub()
+        self.listeners = {}
+        self.task = None
+        self.lost = False
+
+    async def add(self, name):
+        if name not in self.listeners:
+            await self.pubsub.subscribe(name)
+        self.listeners[name] = self.listeners.get(name, 0) + 1
+        if self.task is None:
+            self.task = asyncio.create_task(self._listen())
+
+    async def remove(self, name):
+        """Снимает слушателя; True, если подключение закрыто"""
+        self.listeners[name] -= 1
+        if self.listeners[name]:
+            return False
+        del self.listeners[name]
+        if not self.listeners:
+            # Чтение останавливается до отписки от последнего канала
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        if not self.lost:
+            await self.pubsub.unsubscribe(name)
+        if self.listeners:
+            return False
+        await self.pubsub.aclose()
+        return True
+
+    async def _listen(self):
+        try:
+            while True:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+                if message and message['type'] == 'message':
+                    _deliver(message['channel'].decode(), message['data'].decode(), self.loop)
+        except redis.RedisError:
+            # Потоки завершаются, EventSource переподключится через RETRY_MS
+            self.lost = True
+            if _relays.get(self.loop) is self:
+                del _relays[self.loop]
+            for name in self.listeners:
+                _deliver(name, _RELAY_LOST, self.loop)
+
+
+def _relay_lock(loop):
+    lock = _relay_locks.get(loop)
+    if lock is None:
+        lock = _relay_locks[loop] = asyncio.Lock()
+    return lock
+
+
+async def _listen(name):
+    """Подписывает канал в общем подключении цикла; возвращает подключение"""
+    loop = asyncio.get_running_loop()
+    async with _relay_lock(loop):
+        relay = _relays.get(loop)
+        if relay is None:
+            relay = _RedisRelay(loop)
+        await relay.add(name)
+        _relays[loop] = relay
+        return relay
+
+
+async def _unlisten(relay, name):
+    async with _relay_lock(relay.loop):
+        if await relay.remove(name) and _relays.get(relay.loop) is relay:
+            del _relays[relay.loop]
+
+
+@asynccontextmanager
+async def subscribe(date):
+    """Контекст подписки на дату; дает receive(timeout) -> JSON-строка или None"""
+    name = channel(date)
+    subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+    with _subscribers_lock:
+        _subscribers.setdefault(name, set()).add(subscriber)
+
+    async def receive(timeout):
+        try:
+            data = await asyncio.wait_for(subscriber[1].get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if data is _RELAY_LOST:
+            raise redis.ConnectionError('Подключение pub/sub к Redis потеряно')
+        return data
+
+    relay = None
+    try:
+        if async_cache.uses_redis():
+            relay = await _listen(name)
+        yield receive
+    finally:
+        with _subscribers_lock:
+            subscribers = _subscribers.get(name, set())
+            subscribers.discard(subscriber)
+            if not subscribers:
+                _subscribers.pop(name, None)
+        if relay is not None:
+            await _unlisten(relay, name)
+
+
+async def stream(date, heartbeat=None):
+    """Асинхронный генератор текста text/event-stream для даты
+
+    Подписка оформляется до первой отправленной строки, поэтому события,
+    опубликованные после ее получения клиентом, не теряются. Пока событий нет,
+    раз в heartbeat секунд отправляется комментарий, чтобы прокси не
+    закрывали соединение.
+    """
+    heartbeat = heartbeat or getattr(settings, 'AVAILABILITY_STREAM_HEARTBEAT', 15)
+    async with subscribe(date) as receive:
+        yield f'retry: {RETRY_MS}\n\n'
+        while True:
+            data = await receive(heartbeat)
+            if data is None:
+                yield ': ping\n\n'
+            else:
+                yield f'event: availability\ndata: {data}\n\n'
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+from django.db import migrations
+
+# Генерируемый столбец с интервалом бронирования и ограничение-исключение,
+# запрещающее пересечение активных бронирований одного столика. Работают
+# только в PostgreSQL; в остальных СУБД (SQLite в тестах) миграция ничего
+# не делает. Столбец period не объявлен в модели: Django его не читает и не
+# пишет, он нужен только ограничению.
+
+FORWARD_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS btree_gist',
+    """
+    ALTER TABLE reservations_reservation
+    ADD COLUMN period tsrange GENERATED ALWAYS AS (
+        tsrange(date + time, date + time + make_interval(hours => duration), '[)')
+    ) STORED
+    """,
+    """
+    ALTER TABLE reservations_reservation
+    ADD CONSTRAINT reservation_no_overlap
+    EXCLUDE USING gist (table_id WITH =, period WITH &&)
+    WHERE (status IN ('pending', 'confirmed'))
+    """,
+]
+
+REVERSE_SQL = [
+    'ALTER TABLE reservations_reservation DROP CONSTRAINT IF EXISTS reservation_no_overlap',
+    'ALTER TABLE reservations_reservation DROP COLUMN IF EXISTS period',
+]
+
+
+def find_overlaps(Reservation):
+    """Пары id пересекающихся активных бронирований одного столика
+
+    Один проход по бронированиям в порядке (столик, начало): бронирование
+    пересекается с предыдущими, если начинается раньше, чем заканчивается
+    самое позднее из них.
+    """
+    overlaps = []
+    current_table, latest_id, latest_end = None, None, None
+    rows = Reservation.objects.filter(status__in=['pending', 'confirmed']).order_by(
+        'table_id', 'date', 'time', 'id'
+    ).values_list('id', 'table_id', 'date', 'time', 'duration')
+    for reservation_id, table_id, date, time, duration in rows.iterator():
+        start = datetime.combine(date, time)
+        end = start + timedelta(hours=duration)
+        if table_id == current_table and start < latest_end:
+            overlaps.append((latest_id, reservation_id))
+        if table_id != current_table or end > latest_end:
+            current_table, latest_id, latest_end = table_id, reservation_id, end
+    return overlaps
+
+
+def check_overlaps(apps, schema_editor):
+    """Останавливает миграцию, если ограничение не встанет на текущие данные
+
+    Иначе ADD CONSTRAINT падает с IntegrityError без указания бронирований.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    overlaps = find_overlaps(apps.get_model('reservations', 'Reservation'))
+    if overlaps:
+        pairs = ', '.join(f'{first}/{second}' for first, second in overlaps)
+        raise ValueError(
+            f'Пересекающиеся активные бронирования одного столика (id): {pairs}. '
+            f'Отмените или перенесите одно из бронирований каждой пары и повторите миграцию.'
+        )
+
+
+def run_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_overlaps, migrations.RunPython.noop),
+        migrations.RunPython(run_postgresql(FORWARD_SQL), run_postgresql(REVERSE_SQL)),
+    ]
@@ -0,0 +1,130 @@
+from datetime import date
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Помесячное секционирование reservations_reservation по date. Только для
+# PostgreSQL (15+); в остальных СУБД выполняется лишь снятие внешнего ключа
+# у очереди уведомлений.
+#
+# Первичный ключ секционированной таблицы обязан включать ключ секционирования,
+# поэтому он становится (id, date), а id получает значение из обычной
+# последовательности вместо identity. Ограничение-исключение из миграции 0003
+# создается в каждой секции. Дальнейшие секции создает задача
+# maintain_reservation_partitions.
+
+TABLE = 'reservations_reservation'
+OLD_TABLE = f'{TABLE}_unpartitioned'
+SEQUENCE = 'reservation_id_seq'
+MONTHS_AHEAD = 3
+COLUMNS = (
+    'id, date, time, duration, guests, special_requests, status, '
+    'created_at, updated_at, table_id, user_id'
+)
+OVERLAP_SQL = (
+    "EXCLUDE USING gist (table_id WITH =, period WITH &&) "
+    "WHERE (status IN ('pending', 'confirmed'))"
+)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_indexes_and_keys(apps, schema_editor):
+    """Индексы из Meta, индексы и внешние ключи столбцов table_id и user_id"""
+    Reservation = apps.get_model('reservations', 'Reservation')
+    Table = apps.get_model('reservations', 'Table')
+    User = Reservation._meta.get_field('user').related_model
+
+    for index in Reservation._meta.indexes:
+        schema_editor.execute(index.create_sql(Reservation, schema_editor))
+    for column, target in (('table_id', Table._meta.db_table), ('user_id', User._meta.db_table)):
+        schema_editor.execute(f'CREATE INDEX {TABLE}_{column}_idx ON {TABLE} ({column})')
+        schema_editor.execute(
+            f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_{column}_fk FOREIGN KEY ({column}) '
+            f'REFERENCES {target} (id) DEFERRABLE INITIALLY DEFERRED'
+        )
+
+
+def partition_reservations(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    execute = schema_editor.execute
+    execute(f'ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}')
+    execute(
+        f'CREATE TABLE {TABLE} (LIKE {OLD_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED) '
+        f'PARTITION BY RANGE (date)'
+    )
+    execute(f'CREATE SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id')
+    execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT min(date), max(date) FROM {OLD_TABLE}')
+        first, last = cursor.fetchone()
+    today = date.today()
+    month = date((first or today).year, (first or today).month, 1)
+    last_month = max(add_months(today, MONTHS_AHEAD), date((last or today).year, (last or today).month, 1))
+
+    partitions = []
+    while month <= last_month:
+        name = f'{TABLE}_p{month.year:04d}_{month.month:02d}'
+        execute(
+            f"CREATE TABLE {name} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        )
+        partitions.append((name, month))
+        month = add_months(month, 1)
+
+    execute(f'INSERT INTO {TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {OLD_TABLE}')
+    execute(f"SELECT setval('{SEQUENCE}', COALESCE((SELECT max(id) FROM {TABLE}), 0) + 1, false)")
+    execute(f'DROP TABLE {OLD_TABLE}')
+
+    # Индексы и ограничения создаются после загрузки данных
+    execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, date)')
+    for name, month in partitions:
+        execute(
+            f'ALTER TABLE {name} ADD CONSTRAINT '
+            f'reservation_no_overlap_{month.year:04d}_{month.month:02d} {OVERLAP_SQL}'
+        )
+    create_indexes_and_keys(apps, schema_editor)
+
+
+def unpartition_reservations(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    execute = schema_editor.execute
+    execute(f'ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}')
+    execute(
+        f'CREATE TABLE {TABLE} (LIKE {OLD_TABLE} INCLUDING CONSTRAINTS INCLUDING GENERATED)'
+    )
+    execute(f'ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+    execute(f'INSERT INTO {TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {OLD_TABLE}')
+    execute(
+        f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), "
+        f"COALESCE((SELECT max(id) FROM {TABLE}), 0) + 1, false)"
+    )
+    execute(f'DROP TABLE {OLD_TABLE} CASCADE')
+
+    execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id)')
+    execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT reservation_no_overlap {OVERLAP_SQL}')
+    create_indexes_and_keys(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0005_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notificationoutbox',
+            name='reservation',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='reservations.reservation', verbose_name='Бронирование'),
+        ),
+        migrations.RunPython(partition_reservations, unpartition_reservations),
+    ]
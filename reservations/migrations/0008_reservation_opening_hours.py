@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:36
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+
+
+def check_opening_hours(apps, schema_editor):
+    """Останавливает миграцию, если ограничение не встанет на текущие данные
+
+    Иначе AddConstraint падает с IntegrityError без указания бронирований.
+    """
+    Reservation = apps.get_model('reservations', 'Reservation')
+    invalid = Reservation.objects.exclude(
+        duration__gte=1, duration__lte=6, time__gte=datetime.time(11, 0), time__lt=datetime.time(23, 0)
+    ).order_by('id').values_list('id', flat=True)
+    count = invalid.count()
+    if count:
+        ids = ', '.join(str(reservation_id) for reservation_id in invalid[:50])
+        raise ValueError(
+            f'Бронирований вне часов работы (11:00-23:00) или продолжительности 1-6 часов: {count} '
+            f'(id: {ids}{", ..." if count > 50 else ""}). '
+            f'Исправьте или удалите их и повторите миграцию.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0007_reservation_cursor_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(check_opening_hours, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.CheckConstraint(condition=models.Q(('duration__gte', 1), ('duration__lte', 6), ('time__gte', datetime.time(11, 0)), ('time__lt', datetime.time(23, 0))), name='reservation_within_opening_hours'),
+        ),
+    ]
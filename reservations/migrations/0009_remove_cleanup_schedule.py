@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def remove_cleanup_schedule(apps, schema_editor):
+    """Очистка больше не запускается по расписанию (см. archive_old_reservations)
+
+    DatabaseScheduler не удаляет записи, исчезнувшие из CELERY_BEAT_SCHEDULE.
+    """
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTask.objects.filter(task='reservations.tasks.cleanup_old_reservations').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0008_reservation_opening_hours'),
+        ('django_celery_beat', '0019_alter_periodictasks_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_cleanup_schedule, migrations.RunPython.noop),
+    ]
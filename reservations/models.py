@@ -1,12 +1,68 @@
 from datetime import datetime, timedelta
 
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.db.models import ExpressionWrapper, F
+from django.db.models.functions import ExtractHour, ExtractMinute, ExtractSecond
+
+from . import rules
+from .occupancy import CLOSING_TIME, MAX_DURATION, OPENING_TIME
 
 User = get_user_model()
 
 
+class TableQuerySet(models.QuerySet):
+    """QuerySet столиков"""
+
+    def available(self):
+        """Столики, открытые для бронирования"""
+        return self.filter(is_available=True)
+
+    def by_capacity(self, guests):
+        """Столики, вмещающие указанное количество гостей"""
+        return self.filter(capacity__gte=guests)
+
+    def by_type(self, table_type):
+        """Столики указанного типа"""
+        return self.filter(table_type=table_type)
+
+    def available_tables(self, date, time, duration, guests):
+        """Свободные столики на указанное время - один запрос к БД"""
+        conflicting_table_ids = Reservation.objects.overlapping(date, time, duration).values('table_id')
+        return self.available().by_capacity(guests).exclude(id__in=conflicting_table_ids)
+
+
+class ReservationQuerySet(models.QuerySet):
+    """QuerySet бронирований"""
+
+    def active(self):
+        """Бронирования, занимающие столик"""
+        return self.filter(status__in=Reservation.ACTIVE_STATUSES)
+
+    def overlapping(self, date, time, duration):
+        """Активные бронирования, пересекающиеся с интервалом [time, time + duration)
+
+        Интервалы сравниваются в секундах от начала дня, поэтому бронирования,
+        заканчивающиеся после полуночи, обрабатываются так же, как раньше.
+        """
+        start = time.hour * 3600 + time.minute * 60 + time.second
+        end = start + duration * 3600
+        reservation_start = ExpressionWrapper(
+            ExtractHour('time') * 3600 + ExtractMinute('time') * 60 + ExtractSecond('time'),
+            output_field=models.IntegerField()
+        )
+        reservation_end = ExpressionWrapper(
+            reservation_start + F('duration') * 3600,
+            output_field=models.IntegerField()
+        )
+        return self.active().filter(date=date).alias(
+            start_second=reservation_start,
+            end_second=reservation_end,
+        ).filter(start_second__lt=end, end_second__gt=start)
+
+
 class Table(models.Model):
     """Модель столика"""
     TABLE_TYPES = [
@@ -30,6 +86,8 @@ class Table(models.Model):
     is_available = models.BooleanField(default=True, verbose_name="Доступен")
     description = models.TextField(blank=True, verbose_name="Описание")
 
+    objects = TableQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Столик"
         verbose_name_plural = "Столики"
@@ -43,49 +101,16 @@ class Table(models.Model):
     @classmethod
     def get_available_tables(cls, date, time, duration, guests):
         """Находит доступные столики - возвращает QuerySet"""
-        start_time = datetime.combine(date, time)
-        end_time = start_time + timedelta(hours=duration)
-
-        potential_tables = cls.objects.filter(
-            is_available=True,
-            capacity__gte=guests)
-
-        conflicting_table_ids = []
-        for table in potential_tables:
-            conflicting_reservations = table.reservations.filter(
-                date=date,
-                status__in=['pending', 'confirmed']
-            )
-
-            for reservation in conflicting_reservations:
-                reservation_start = datetime.combine(date, reservation.time)
-                reservation_end = reservation_start + timedelta(hours=reservation.duration)
-
-                if (start_time < reservation_end and end_time > reservation_start):
-                    conflicting_table_ids.append(table.id)
-                    break
-
-        return potential_tables.exclude(id__in=conflicting_table_ids)
+        return cls.objects.available_tables(date, time, duration, guests)
 
     def is_available_for_reservation(self, date, time, duration):
         """Проверяет доступность столика для бронирования"""
         if not self.is_available:
             return False, "Столик недоступен"
 
-        start_time = datetime.combine(date, time)
-        end_time = start_time + timedelta(hours=duration)
-
-        conflicting_reservations = self.reservations.filter(
-            date=date,
-            status__in=['pending', 'confirmed']
-        )
-
-        for reservation in conflicting_reservations:
-            reservation_start = datetime.combine(date, reservation.time)
-            reservation_end = reservation_start + timedelta(hours=reservation.duration)
-
-            if (start_time < reservation_end and end_time > reservation_start):
-                return False, f"Столик занят с {reservation.time} до {reservation_end.time()}"
+        reservation = self.reservations.overlapping(date, time, duration).first()
+        if reservation is not None:
+            return False, f"Столик занят с {reservation.time} до {reservation.end_time}"
 
         return True, "Столик доступен"
 
@@ -98,6 +123,7 @@ class Reservation(models.Model):
         ('cancelled', 'Отменено'),
         ('completed', 'Завершено'),
     ]
+    ACTIVE_STATUSES = ['pending', 'confirmed']
 
     user = models.ForeignKey(
         User,
@@ -132,10 +158,39 @@ class Reservation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
 
+    objects = ReservationQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Бронирование"
         verbose_name_plural = "Бронирования"
         ordering = ['-date', '-time']
+        indexes = [
+            # Проверка доступности: активные бронирования столика на дату
+            models.Index(
+                fields=['table', 'date'],
+                condition=models.Q(status__in=['pending', 'confirmed']),
+                name='reservation_active_table_idx',
+            ),
+            # Список бронирований пользователя и постраничный вывод API
+            # (ключ курсора date, time, id)
+            models.Index(fields=['user', '-date', '-time', '-id'], name='reservation_user_date_idx'),
+            models.Index(fields=['-date', '-time', '-id'], name='reservation_date_time_id_idx'),
+            # Напоминания на завтра
+            models.Index(fields=['date', 'status'], name='reservation_date_status_idx'),
+            # Автоподтверждение и очистка старых бронирований
+            models.Index(fields=['status', 'date'], name='reservation_status_date_idx'),
+        ]
+        constraints = [
+            # Бронирование не доходит до часов работы следующего дня, поэтому
+            # пересечения проверяются в пределах одной даты (см. reservations.rules)
+            models.CheckConstraint(
+                condition=models.Q(
+                    time__gte=OPENING_TIME, time__lt=CLOSING_TIME,
+                    duration__gte=1, duration__lte=MAX_DURATION,
+                ),
+                name='reservation_within_opening_hours',
+            ),
+        ]
         permissions = [
             ("can_manage_all_reservations", "Может управлять всеми бронированиями"),
             ("can_change_reservation_status", "Может изменять статус бронирования"),
@@ -144,6 +199,28 @@ class Reservation(models.Model):
     def __str__(self):
         return f"Бронирование #{self.id} - {self.user.username} - {self.date} {self.time}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминает загруженные значения: сигналам нужен прежний интервал без запроса"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
+    def clean(self):
+        """Проверка даты для админки и других ModelForm"""
+        if self.date:
+            error = rules.date_error(self.date, allow_past=True)
+            if error:
+                raise ValidationError({'date': error})
+        if self.time:
+            error = rules.time_error(self.time, self.duration)
+            if error:
+                raise ValidationError({'time': error})
+
     @property
     def end_time(self):
         """Вычисляемое время окончания бронирования"""
@@ -169,3 +246,58 @@ class Reservation(models.Model):
         return (not self.is_past_due() and
                 self.status in ['pending', 'confirmed'] and
                 (reservation_datetime - timezone.now()).total_seconds() > 3600)
+
+
+class NotificationOutbox(models.Model):
+    """Исходящее уведомление по бронированию
+
+    Строка создается в той же транзакции, что и изменение бронирования, и
+    отправляется воркером. Уникальность пары (бронирование, тип) не дает
+    отправить одно уведомление дважды.
+    """
+    CONFIRMATION = 'confirmation'
+    TYPE_CHOICES = [
+        (CONFIRMATION, 'Подтверждение бронирования'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает отправки'),
+        ('sent', 'Отправлено'),
+        ('failed', 'Ошибка'),
+    ]
+
+    # Без внешнего ключа в БД: секционированная таблица бронирований имеет
+    # первичный ключ (id, date), и ссылаться только на id нельзя
+    reservation = models.ForeignKey(
+        Reservation,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        verbose_name="Бронирование",
+        related_name='notifications'
+    )
+    notification_type = models.CharField(max_length=30, choices=TYPE_CHOICES, verbose_name="Тип")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="Статус")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Отправлено")
+
+    class Meta:
+        verbose_name = "Уведомление"
+        verbose_name_plural = "Очередь уведомлений"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['reservation', 'notification_type'],
+                name='notification_outbox_unique',
+            ),
+        ]
+        indexes = [
+            # Выборка очередной пачки для отправки
+            models.Index(
+                fields=['id'],
+                condition=models.Q(status='pending'),
+                name='outbox_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_notification_type_display()} #{self.reservation_id}"
@@ -0,0 +1,59 @@
+"""Занятость столиков в виде битовых масок
+
+Занятость столика на дату - целое число, в котором бит i означает, что
+получасовой слот OPENING_TIME + i * 30 минут занят активным бронированием.
+Сетка покрывает часы работы (11:00-23:00) и еще MAX_DURATION часов после
+закрытия, чтобы бронирования, начатые перед закрытием, не обрезались.
+Проверка пересечения сводится к побитовому И. Маски по дням хранит кэш
+доступности (availability_cache).
+"""
+from datetime import datetime, time, timedelta
+
+OPENING_TIME = time(11, 0)
+CLOSING_TIME = time(23, 0)
+SLOT_MINUTES = 30
+MAX_DURATION = 6
+
+BOOKABLE_SLOTS = (CLOSING_TIME.hour - OPENING_TIME.hour) * 60 // SLOT_MINUTES
+SLOT_COUNT = BOOKABLE_SLOTS + MAX_DURATION * 60 // SLOT_MINUTES
+
+
+def _minutes_from_opening(value):
+    return (value.hour - OPENING_TIME.hour) * 60 + value.minute - OPENING_TIME.minute + value.second / 60
+
+
+def slot_time(index):
+    """Время начала слота с указанным номером"""
+    start = datetime.combine(datetime.min.date(), OPENING_TIME)
+    return (start + timedelta(minutes=index * SLOT_MINUTES)).time()
+
+
+def slot_index(value):
+    """Номер слота для времени, совпадающего с началом слота, иначе None"""
+    minutes = _minutes_from_opening(value)
+    if minutes < 0 or minutes % SLOT_MINUTES or minutes >= BOOKABLE_SLOTS * SLOT_MINUTES:
+        return None
+    return int(minutes // SLOT_MINUTES)
+
+
+def interval_mask(start, duration):
+    """Маска слотов, которые затрагивает интервал [start, start + duration)"""
+    begin = _minutes_from_opening(start)
+    end = begin + duration * 60
+    first = max(int(begin // SLOT_MINUTES), 0)
+    last = min(-int(-end // SLOT_MINUTES), SLOT_COUNT)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def free_starts_mask(occupied, duration):
+    """Маска слотов, с которых можно начать бронирование на duration часов
+
+    Слот i свободен, если свободны все слоты i..i+k-1, то есть бит i равен
+    нулю в объединении occupied, сдвинутой на 0..k-1 позиций.
+    """
+    blocked = 0
+    for shift in range(duration * 60 // SLOT_MINUTES):
+        blocked |= occupied >> shift
+    return ~blocked & ((1 << BOOKABLE_SLOTS) - 1)
@@ -0,0 +1,107 @@
+"""Транзакционная очередь уведомлений (outbox)
+
+Уведомления записываются в таблицу NotificationOutbox в той же транзакции,
+что и изменение бронирования, и после фиксации отправляются воркером
+пачками через одно соединение с почтовым сервером. Уникальный ключ
+(бронирование, тип) исключает повторную отправку.
+"""
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import NotificationOutbox
+
+
+def build_confirmation_message(reservation):
+    """Письмо с подтверждением бронирования"""
+    subject = f'Подтверждение бронирования #{reservation.id}'
+    message = f'''
+        Уважаемый(ая) {reservation.user.get_full_name() or reservation.user.username},
+
+        Ваше бронирование подтверждено:
+        Дата: {reservation.date}
+        Время: {reservation.time}
+        Столик: {reservation.table.number}
+        Гостей: {reservation.guests}
+        Статус: {reservation.get_status_display()}
+
+        Спасибо за выбор нашего ресторана!
+        '''
+    return EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [reservation.user.email])
+
+
+MESSAGE_BUILDERS = {
+    NotificationOutbox.CONFIRMATION: build_confirmation_message,
+}
+
+
+def enqueue_notifications(reservation_ids, notification_type=NotificationOutbox.CONFIRMATION):
+    """Ставит уведомления в очередь в текущей транзакции
+
+    Уже поставленные уведомления того же типа пропускаются.
+    """
+    rows = [
+        NotificationOutbox(reservation_id=reservation_id, notification_type=notification_type)
+        for reservation_id in reservation_ids
+    ]
+    if not rows:
+        return
+    NotificationOutbox.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+    transaction.on_commit(_schedule_drain)
+
+
+def _schedule_drain():
+    from .tasks import drain_notification_outbox
+    drain_notification_outbox.delay()
+
+
+def drain_outbox(batch_size):
+    """Отправляет одну пачку ожидающих уведомлений
+
+    Строки блокируются с SKIP LOCKED, поэтому несколько воркеров разбирают
+    очередь параллельно, не получая одни и те же уведомления.
+    """
+    max_attempts = getattr(settings, 'NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 5)
+    sent = failed = 0
+
+    with transaction.atomic():
+        batch = list(
+            NotificationOutbox.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .filter(status='pending')
+            .select_related('reservation__user', 'reservation__table')
+            .order_by('id')[:batch_size]
+        )
+        if not batch:
+            return {'sent': 0, 'failed': 0, 'batch': 0}
+
+        now = timezone.now()
+        connection = get_connection()
+        try:
+            connection.open()
+            for notification in batch:
+                # Ошибка в данных одной строки не должна останавливать пачку
+                try:
+                    message = MESSAGE_BUILDERS[notification.notification_type](notification.reservation)
+                    connection.send_messages([message])
+                except Exception as e:
+                    failed += 1
+                    notification.attempts += 1
+                    notification.last_error = str(e)
+                    if notification.attempts >= max_attempts:
+                        notification.status = 'failed'
+                else:
+                    sent += 1
+                    notification.attempts += 1
+                    notification.status = 'sent'
+                    notification.sent_at = now
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+        NotificationOutbox.objects.bulk_update(batch, ['status', 'attempts', 'last_error', 'sent_at'])
+
+    return {'sent': sent, 'failed': failed, 'batch': len(batch)}
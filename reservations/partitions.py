@@ -0,0 +1,147 @@
+"""Помесячные секции таблицы бронирований (PostgreSQL)
+
+После миграции 0006_reservation_partitioning таблица reservations_reservation
+секционирована по диапазонам date: одна секция на месяц с именем
+reservations_reservation_pYYYY_MM. Запросы с условием на дату читают только
+нужные секции, а удаление старых данных сводится к отсоединению секции.
+
+Секции по умолчанию нет: с ней нельзя отсоединять секции CONCURRENTLY.
+Поэтому вставка с датой вне созданных секций - ошибка, и секции должны
+покрывать все допустимые даты: задача maintain_reservation_partitions
+держит PARTITION_MONTHS_AHEAD месяцев вперед, дата бронирования ограничена
+RESERVATION_MAX_DAYS_AHEAD днями (см. reservations.rules), а загрузка
+истории (seed_data --scale) создает секции под свой диапазон заранее.
+
+Ограничение-исключение на пересечение бронирований создается в каждой
+секции. Бронирования с началом в часы работы и не длиннее MAX_DURATION
+часов (ограничение reservation_within_opening_hours, см. reservations.rules)
+заканчиваются до открытия следующего дня, поэтому пересекаются только
+бронирования одной даты, а они всегда в одной секции.
+"""
+from datetime import date
+
+from django.db import connection, transaction
+
+TABLE = 'reservations_reservation'
+PARTITION_PREFIX = f'{TABLE}_p'
+OVERLAP_CONSTRAINT_PREFIX = 'reservation_no_overlap'
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{PARTITION_PREFIX}{month.year:04d}_{month.month:02d}'
+
+
+def partition_month(name):
+    """Месяц секции по ее имени или None для чужих таблиц"""
+    if not name.startswith(PARTITION_PREFIX):
+        return None
+    try:
+        year, month = name[len(PARTITION_PREFIX):].split('_')
+        return date(int(year), int(month), 1)
+    except ValueError:
+        return None
+
+
+def partition_sql(month):
+    """Создание секции месяца и ее ограничения-исключения"""
+    name = partition_name(month)
+    suffix = f'{month.year:04d}_{month.month:02d}'
+    return [
+        f"CREATE TABLE {name} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')",
+        f"ALTER TABLE {name} ADD CONSTRAINT {OVERLAP_CONSTRAINT_PREFIX}_{suffix} "
+        f"EXCLUDE USING gist (table_id WITH =, period WITH &&) "
+        f"WHERE (status IN ('pending', 'confirmed'))",
+    ]
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass)',
+            [TABLE]
+        )
+        return cursor.fetchone()[0]
+
+
+def existing_partitions():
+    """Месяцы подключенных секций"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = %s::regclass',
+            [TABLE]
+        )
+        months = (partition_month(name) for (name,) in cursor.fetchall())
+        return sorted(month for month in months if month)
+
+
+def ensure_partitions(months_ahead, today=None, since=None):
+    """Создает секции с месяца since (по умолчанию текущего) на months_ahead месяцев вперед"""
+    current = month_start(today or date.today())
+    return create_partitions(month_start(since or current), add_months(current, months_ahead))
+
+
+def create_partitions(first, last):
+    """Создает недостающие секции месяцев с first по last включительно"""
+    existing = set(existing_partitions())
+    created = []
+    month = month_start(first)
+    while month <= last:
+        if month not in existing:
+            with transaction.atomic(), connection.cursor() as cursor:
+                for statement in partition_sql(month):
+                    cursor.execute(statement)
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def ensure_date_range(first, last):
+    """Секции под диапазон дат перед загрузкой данных; без секционирования ничего не делает"""
+    if not is_partitioned():
+        return []
+    return create_partitions(first, last)
+
+
+def detach_old_partitions(retention_months, drop=False, today=None):
+    """Отсоединяет секции старше retention_months месяцев
+
+    Отсоединяются только пустые секции: архив (archive_old_reservations)
+    выгружает и удаляет завершенные и отмененные бронирования, а строки,
+    оставшиеся в секции, в архив не попали и потерялись бы вместе с ней.
+    Возвращает имена отсоединенных секций и секций, оставленных из-за строк.
+
+    DETACH ... CONCURRENTLY не блокирует запросы к остальным секциям, но не
+    выполняется внутри транзакции, поэтому функция вызывается в режиме
+    autocommit. Отсоединенная секция остается обычной таблицей, если не
+    указан drop.
+    """
+    oldest = add_months(month_start(today or date.today()), -retention_months)
+    detached = []
+    kept = []
+    for month in existing_partitions():
+        if month >= oldest:
+            continue
+        name = partition_name(month)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {name})')
+            if cursor.fetchone()[0]:
+                kept.append(name)
+                continue
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name} CONCURRENTLY')
+            if drop:
+                cursor.execute(f'DROP TABLE {name}')
+        detached.append(name)
+    return detached, kept
@@ -0,0 +1,47 @@
+"""Допустимые дата и время бронирования
+
+Общие проверки для формы, сериализаторов API, модели и представлений.
+Дата ограничена RESERVATION_MAX_DAYS_AHEAD днями вперед: секции таблицы
+бронирований (reservations.partitions) создаются только на этот горизонт
+с запасом.
+
+Начало бронирования - в часы работы (OPENING_TIME - CLOSING_TIME), не
+дольше MAX_DURATION часов. Поэтому бронирование заканчивается не позже
+05:00 следующего дня и не пересекается с бронированиями других дат:
+ограничение-исключение в каждой месячной секции достаточно. То же
+проверяет ограничение reservation_within_opening_hours в базе.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .occupancy import CLOSING_TIME, MAX_DURATION, OPENING_TIME
+
+
+def max_days_ahead():
+    return getattr(settings, 'RESERVATION_MAX_DAYS_AHEAD', 60)
+
+
+def max_booking_date():
+    """Последняя дата, на которую можно забронировать столик"""
+    return timezone.now().date() + timedelta(days=max_days_ahead())
+
+
+def date_error(value, allow_past=False):
+    """Сообщение об ошибке для даты бронирования или None"""
+    if not allow_past and value < timezone.now().date():
+        return 'Нельзя выбрать прошедшую дату'
+    if value > max_booking_date():
+        return f'Бронирование возможно не более чем на {max_days_ahead()} дней вперед'
+    return None
+
+
+def time_error(value, duration=None):
+    """Сообщение об ошибке для времени и продолжительности или None"""
+    if not OPENING_TIME <= value < CLOSING_TIME:
+        return (f'Бронирование начинается с {OPENING_TIME:%H:%M} '
+                f'и не позже {CLOSING_TIME:%H:%M}')
+    if duration is not None and not 1 <= duration <= MAX_DURATION:
+        return f'Продолжительность от 1 до {MAX_DURATION} часов'
+    return None
@@ -1,9 +1,29 @@
 from rest_framework import serializers
 
 from users.models import CustomUser
+from . import rules
 from .models import Reservation, Table
 
 
+class SparseFieldsetSerializerMixin:
+    """Сокращенный набор полей для ?fields= и ?expand=
+
+    fields - выводимые поля верхнего уровня. expand - связи из
+    Meta.expandable_fields, которые выводятся вложенными объектами;
+    остальные связи выводятся идентификаторами. None - без ограничений.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        if expand is not None:
+            for name in getattr(self.Meta, 'expandable_fields', ()):
+                if name in self.fields and name not in expand:
+                    self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True)
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Сериализатор для пользователя"""
 
@@ -13,7 +33,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class TableSerializer(serializers.ModelSerializer):
+class TableSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для столика"""
     reservation_count = serializers.IntegerField(read_only=True)
 
@@ -26,7 +46,7 @@ class TableSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class ReservationSerializer(serializers.ModelSerializer):
+class ReservationSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для бронирования"""
     user = UserSerializer(read_only=True)
     table = TableSerializer(read_only=True)
@@ -44,6 +64,21 @@ class ReservationSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+        expandable_fields = ['user', 'table']
+
+    def validate_date(self, value):
+        """Дату прошедших бронирований персонал может не менять, будущие ограничены"""
+        error = rules.date_error(value, allow_past=True)
+        if error:
+            raise serializers.ValidationError(error)
+        return value
+
+    def validate_time(self, value):
+        """Начало бронирования - в часы работы"""
+        error = rules.time_error(value)
+        if error:
+            raise serializers.ValidationError(error)
+        return value
 
     def validate(self, data):
         """Валидация данных бронирования"""
@@ -77,12 +112,54 @@ class ReservationCreateSerializer(serializers.ModelSerializer):
         model = Reservation
         fields = ['table', 'date', 'time', 'duration', 'guests', 'special_requests']
 
+    def validate_date(self, value):
+        """Валидация даты"""
+        error = rules.date_error(value)
+        if error:
+            raise serializers.ValidationError(error)
+        return value
+
+    def validate_time(self, value):
+        """Начало бронирования - в часы работы"""
+        error = rules.time_error(value)
+        if error:
+            raise serializers.ValidationError(error)
+        return value
+
     def create(self, validated_data):
         """Создание бронирования с текущим пользователем"""
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
 
+class ReservationBulkItemSerializer(serializers.Serializer):
+    """Позиция пакетного бронирования
+
+    Столик передается идентификатором: все столики пакета загружаются
+    одним запросом в ReservationService.create_reservations.
+    """
+    table = serializers.IntegerField(min_value=1)
+    date = serializers.DateField()
+    time = serializers.TimeField()
+    duration = serializers.IntegerField(min_value=1, max_value=6, default=2)
+    guests = serializers.IntegerField(min_value=1, max_value=12)
+    special_requests = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate_date(self, value):
+        """Валидация даты"""
+        error = rules.date_error(value)
+        if error:
+            raise serializers.ValidationError(error)
+        return value
+
+    def validate_time(self, value):
+        """Начало бронирования - в часы работы"""
+        error = rules.time_error(value)
+        if error:
+            raise serializers.ValidationError(error)
+        return value
+
+
 class TableAvailabilitySerializer(serializers.Serializer):
     """Сериализатор для проверки доступности столиков"""
     date = serializers.DateField()
@@ -97,7 +174,14 @@ class TableAvailabilitySerializer(serializers.Serializer):
 
     def validate_date(self, value):
         """Валидация даты"""
-        from django.utils import timezone
-        if value < timezone.now().date():
-            raise serializers.ValidationError("Нельзя выбрать прошедшую дату")
+        error = rules.date_error(value)
+        if error:
+            raise serializers.ValidationError(error)
+        return value
+
+    def validate_time(self, value):
+        """Начало бронирования - в часы работы"""
+        error = rules.time_error(value)
+        if error:
+            raise serializers.ValidationError(error)
         return value
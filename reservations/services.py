@@ -1,7 +1,67 @@
-from django.db import transaction
+from datetime import datetime, timedelta
 
+from django.db import IntegrityError, transaction
+
+from . import availability_cache, holds, live, versions
 from .models import Reservation, Table
-from .tasks import send_reservation_confirmation
+from .occupancy import BOOKABLE_SLOTS, interval_mask, slot_time
+from .outbox import enqueue_notifications
+
+# Ограничение-исключение PostgreSQL на пересечение активных бронирований
+# одного столика (см. миграцию 0003_reservation_period_exclusion). После
+# секционирования у каждой секции свое ограничение с этим префиксом.
+OVERLAP_CONSTRAINT = 'reservation_no_overlap'
+
+
+class TableUnavailableError(ValueError):
+    """Столик занят или не подходит для бронирования"""
+
+
+class BulkReservationError(ValueError):
+    """Часть позиций пакетного бронирования не прошла проверку
+
+    errors - список ошибок по позициям пакета в порядке запроса, для
+    прошедших проверку позиций - пустой словарь.
+    """
+
+    def __init__(self, errors):
+        super().__init__("Пакет бронирований не прошел проверку")
+        self.errors = errors
+
+
+def _seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _interval(start, duration):
+    """Интервал в секундах от начала дня, как в ReservationQuerySet.overlapping"""
+    begin = _seconds(start)
+    return begin, begin + duration * 3600
+
+
+def _after_bulk_create(reservations):
+    """Действия post_save для бронирований, вставленных bulk_create
+
+    bulk_create не посылает сигналов, поэтому кэш доступности, версии API
+    и поток доступности обновляются здесь - одним обработчиком после
+    фиксации на весь пакет.
+    """
+    dates = {reservation.date for reservation in reservations}
+    user_ids = {reservation.user_id for reservation in reservations}
+    events = [
+        live.reservation_event('occupied', reservation.date, reservation.table_id,
+                               reservation.time, reservation.duration)
+        for reservation in reservations
+        if reservation.status in Reservation.ACTIVE_STATUSES
+    ]
+
+    def after_commit():
+        for date in dates:
+            availability_cache.bump_date(date)
+        versions.bump_reservations(user_ids)
+        for event in events:
+            live.publish(event)
+    transaction.on_commit(after_commit)
 
 
 class ReservationService:
@@ -9,31 +69,179 @@ class ReservationService:
 
     @staticmethod
     @transaction.atomic
-    def create_reservation(user, table, date, time, duration, guests, special_requests=''):
-        """Создание бронирования с транзакцией"""
-        available_tables = Table.get_available_tables(date, time, duration, guests)
+    def create_reservation(user, table, date, time, duration, guests, special_requests='', hold_token=None):
+        """Создание бронирования с транзакцией
+
+        hold_token - удержание столика пользователем (reservations.holds):
+        чужие удержания интервала запрещают бронирование, собственное
+        снимается после фиксации. С удержанием интервал закрепляется за
+        токеном атомарно до вставки, и чужое удержание между проверкой и
+        вставкой не встанет; без удержания проверка только предварительная.
+        """
+        hold = holds.get_hold(hold_token)
+        if hold is None or hold['owner_id'] != user.id or hold['date'] != date:
+            hold_token = None
+        if hold_token:
+            if holds.lease(table.id, date, time, duration, user.id, token=hold_token) is None:
+                raise TableUnavailableError("Столик удерживается другим гостем")
+        elif holds.is_held(table.id, date, time, duration):
+            raise TableUnavailableError("Столик удерживается другим гостем")
+
+        available_tables = Table.objects.available_tables(date, time, duration, guests)
 
         if not available_tables.filter(id=table.id).exists():
-            raise ValueError("Столик недоступен для бронирования")
-
-        reservation = Reservation.objects.create(
-            user=user,
-            table=table,
-            date=date,
-            time=time,
-            duration=duration,
-            guests=guests,
-            special_requests=special_requests,
-            status='confirmed'
-        )
+            raise TableUnavailableError("Столик недоступен для бронирования")
 
-        send_reservation_confirmation.delay(reservation.id)
+        # Проверка выше не защищает от параллельных запросов, окончательное
+        # решение принимает ограничение-исключение в базе
+        try:
+            with transaction.atomic():
+                reservation = Reservation.objects.create(
+                    user=user,
+                    table=table,
+                    date=date,
+                    time=time,
+                    duration=duration,
+                    guests=guests,
+                    special_requests=special_requests,
+                    status='confirmed'
+                )
+        except IntegrityError as e:
+            if OVERLAP_CONSTRAINT in str(e):
+                raise TableUnavailableError("Столик недоступен для бронирования") from e
+            raise
+
+        enqueue_notifications([reservation.id])
+        if hold_token:
+            transaction.on_commit(lambda: holds.release_hold(hold_token, publish=False))
 
         return reservation
 
+    @staticmethod
+    @transaction.atomic
+    def create_reservations(user, items):
+        """Пакетное создание бронирований с одной проверкой доступности
+
+        items - словари с table (id), date, time, duration, guests и
+        special_requests. Столики загружаются одним запросом, занятость на
+        все даты пакета - другим; по этому снимку проверяются все позиции,
+        включая пересечения позиций пакета между собой и удержания других
+        гостей (собственные удержания пользователя не мешают). Если хотя бы
+        одна позиция не проходит, ничего не создается и выбрасывается
+        BulkReservationError. Иначе интервалы пакета закрепляются в удержаниях
+        до фиксации, бронирования вставляются одним bulk_create, а
+        подтверждения ставятся в очередь одной пачкой.
+        """
+        tables = Table.objects.in_bulk({item['table'] for item in items})
+        dates = {item['date'] for item in items}
+
+        busy = {}
+        rows = Reservation.objects.active().filter(date__in=dates, table_id__in=tables).order_by().values_list(
+            'date', 'table_id', 'time', 'duration'
+        )
+        for date, table_id, start, duration in rows:
+            end_time = (datetime.combine(date, start) + timedelta(hours=duration)).time()
+            busy.setdefault((date, table_id), []).append(
+                (*_interval(start, duration), f"Столик занят с {start} до {end_time}")
+            )
+        held = {date: holds.held_masks(date, list(tables), owner_id=user.id) for date in dates}
+
+        errors = []
+        reservations = []
+        for position, item in enumerate(items, start=1):
+            table = tables.get(item['table'])
+            error = ReservationService._check_item(item, table, busy, held)
+            errors.append(error)
+            if error:
+                continue
+            # Следующие позиции пакета видят эту как занятую
+            busy.setdefault((item['date'], table.id), []).append(
+                (*_interval(item['time'], item['duration']), f"Пересекается с позицией {position} пакета")
+            )
+            reservations.append(Reservation(
+                user=user,
+                table=table,
+                date=item['date'],
+                time=item['time'],
+                duration=item['duration'],
+                guests=item['guests'],
+                special_requests=item.get('special_requests', ''),
+                status='confirmed'
+            ))
+
+        if any(errors):
+            raise BulkReservationError(errors)
+
+        # Интервалы пакета закрепляются атомарно до вставки, как удержание в
+        # create_reservation: чужое удержание между проверкой и вставкой не встанет
+        dates = [reservation.date for reservation in reservations]
+        token = holds.lease_intervals([
+            (reservation.table_id, reservation.date, reservation.time, reservation.duration)
+            for reservation in reservations
+        ], user.id)
+        if token is None:
+            raise TableUnavailableError("Столик удерживается другим гостем")
+
+        try:
+            with transaction.atomic():
+                Reservation.objects.bulk_create(reservations)
+        except IntegrityError as e:
+            holds.release_intervals(token, dates)
+            if OVERLAP_CONSTRAINT in str(e):
+                raise TableUnavailableError("Столик недоступен для бронирования") from e
+            raise
+        transaction.on_commit(lambda: holds.release_intervals(token, dates))
+
+        enqueue_notifications([reservation.id for reservation in reservations])
+        _after_bulk_create(reservations)
+        return reservations
+
+    @staticmethod
+    def _check_item(item, table, busy, held):
+        """Ошибки позиции пакета по снимку занятости, пустой словарь - ошибок нет"""
+        if table is None:
+            return {'table': ["Столик не найден"]}
+        if not table.is_available:
+            return {'table': ["Столик недоступен"]}
+        if item['guests'] > table.capacity:
+            return {'guests': [f"Максимальная вместимость столика: {table.capacity}"]}
+
+        date, start, duration = item['date'], item['time'], item['duration']
+        begin, end = _interval(start, duration)
+        for other_begin, other_end, message in busy.get((date, table.id), ()):
+            if begin < other_end and end > other_begin:
+                return {'non_field_errors': [message]}
+        if held.get(date, {}).get(table.id, 0) & interval_mask(start, duration):
+            return {'non_field_errors': ["Столик удерживается другим гостем"]}
+        return {}
+
     @staticmethod
     def get_user_reservations_with_details(user):
         """Получение бронирований пользователя с детальной информацией"""
         return Reservation.objects.filter(user=user).select_related(
             'table'
         ).order_by('-date', '-time')
+
+    @staticmethod
+    def get_availability_grid(date, duration=2, guests=None, hold_token=None):
+        """Матрица доступности столик x слот на дату
+
+        Маски свободных слотов всех столиков берутся из кэша доступности (те
+        же записи, что читают проверки доступности) с учетом удержаний,
+        кроме удержания hold_token.
+        """
+        version = availability_cache.get_tables_version()
+        grid = availability_cache.get_free_slots(date, duration, guests or 1, hold_token=hold_token, version=version)
+        tables = availability_cache.get_tables(version)
+
+        return {
+            'slots': [slot_time(index) for index in range(BOOKABLE_SLOTS)],
+            'tables': [
+                {
+                    'table': tables[table_id],
+                    'available': [bool(mask >> index & 1) for index in range(BOOKABLE_SLOTS)],
+                }
+                for table_id, mask in grid.items()
+                if table_id in tables
+            ],
+        }
@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import availability_cache, live, versions
+from .models import Reservation, Table
+
+
+SLOT_FIELDS = ('date', 'table_id', 'time', 'duration', 'status')
+
+
+@receiver(pre_save, sender=Reservation)
+def remember_reservation_date(sender, instance, **kwargs):
+    """Запоминает прежние дату и интервал, чтобы сбросить доступность и на них
+
+    Прежние значения берутся из снимка загрузки (Reservation.from_db);
+    запрос к БД - только для экземпляра, собранного без загрузки.
+    """
+    instance._previous_date = None
+    instance._previous_slot = None
+    instance._previous_user_id = None
+    if not instance._state.adding and instance.pk:
+        fields = (*SLOT_FIELDS, 'user_id')
+        loaded = getattr(instance, '_loaded_values', {})
+        if all(field in loaded for field in fields):
+            previous = tuple(loaded[field] for field in fields)
+        else:
+            previous = Reservation.objects.filter(pk=instance.pk).values_list(*fields).first()
+        if previous:
+            instance._previous_date = previous[0]
+            instance._previous_slot = previous[:len(SLOT_FIELDS)]
+            instance._previous_user_id = previous[-1]
+
+
+@receiver(post_save, sender=Reservation)
+def invalidate_availability_on_save(sender, instance, **kwargs):
+    """Сбрасывает кэш доступности на дату бронирования после фиксации"""
+    dates = {instance.date, getattr(instance, '_previous_date', None)} - {None}
+
+    def bump():
+        for date in dates:
+            availability_cache.bump_date(date)
+    transaction.on_commit(bump)
+
+
+@receiver(post_save, sender=Reservation)
+def bump_api_versions_on_save(sender, instance, **kwargs):
+    """Меняет ETag списков бронирований владельца и персонала"""
+    user_ids = {instance.user_id, getattr(instance, '_previous_user_id', None)} - {None}
+    transaction.on_commit(lambda: versions.bump_reservations(user_ids))
+
+
+def _slot(reservation):
+    return tuple(getattr(reservation, field) for field in SLOT_FIELDS)
+
+
+def _slot_event(event_type, slot):
+    date, table_id, start, duration, status = slot
+    return live.reservation_event(event_type, date, table_id, start, duration)
+
+
+@receiver(post_save, sender=Reservation)
+def publish_availability_on_save(sender, instance, **kwargs):
+    """Публикует изменения занятости для потока доступности после фиксации"""
+    previous = getattr(instance, '_previous_slot', None)
+    current = _slot(instance)
+    if previous == current:
+        return
+
+    events = []
+    if previous and previous[4] in Reservation.ACTIVE_STATUSES:
+        events.append(_slot_event('released', previous))
+    if instance.status in Reservation.ACTIVE_STATUSES:
+        events.append(_slot_event('occupied', current))
+
+    def publish():
+        for event in events:
+            live.publish(event)
+    if events:
+        transaction.on_commit(publish)
+
+
+@receiver(post_delete, sender=Reservation)
+def invalidate_availability_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: availability_cache.bump_date(instance.date))
+
+
+@receiver(post_delete, sender=Reservation)
+def bump_api_versions_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: versions.bump_reservations([instance.user_id]))
+
+
+@receiver(post_delete, sender=Reservation)
+def publish_availability_on_delete(sender, instance, **kwargs):
+    if instance.status in Reservation.ACTIVE_STATUSES:
+        event = _slot_event('released', _slot(instance))
+        transaction.on_commit(lambda: live.publish(event))
+
+
+@receiver(post_save, sender=Table)
+@receiver(post_delete, sender=Table)
+def invalidate_availability_on_table_change(sender, **kwargs):
+    """Изменение любого столика сбрасывает весь кэш доступности"""
+    def bump():
+        availability_cache.bump_tables()
+        versions.bump(versions.TABLES)
+    transaction.on_commit(bump)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def bump_api_versions_on_user_change(sender, instance, created=False, update_fields=None, **kwargs):
+    """Данные пользователя выводятся в его бронированиях и в списке персонала
+
+    Новый пользователь еще без бронирований, вход в систему не в счет.
+    """
+    if created or (update_fields is not None and set(update_fields) == {'last_login'}):
+        return
+    transaction.on_commit(lambda: versions.bump_reservations([instance.pk]))
+
@@ -1,106 +1,228 @@
 from datetime import timedelta
+from pathlib import Path
 
-from celery import shared_task
+from celery import chord, shared_task
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
 from django.utils import timezone
 
+from .archive import archive_reservations
+from .cleanup import BatchDeleter, delete_reservations
+from . import partitions, versions
 from .models import Reservation
+from .outbox import build_confirmation_message, drain_outbox, enqueue_notifications
 
 
 @shared_task
 def send_reservation_confirmation(reservation_id):
     """Отправка подтверждения бронирования"""
     try:
-        reservation = Reservation.objects.get(id=reservation_id)
+        reservation = Reservation.objects.select_related('user', 'table').get(id=reservation_id)
+        build_confirmation_message(reservation).send(fail_silently=False)
+        return f'Email отправлен для бронирования {reservation_id}'
+    except Reservation.DoesNotExist:
+        return f'Бронирование {reservation_id} не найдено'
 
-        subject = f'Подтверждение бронирования #{reservation.id}'
-        message = f'''
-        Уважаемый(ая) {reservation.user.get_full_name() or reservation.user.username},
 
-        Ваше бронирование подтверждено:
+@shared_task
+def drain_notification_outbox(batch_size=None):
+    """Отправка очереди уведомлений пачками"""
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_OUTBOX_BATCH_SIZE', 100)
+    result = drain_outbox(batch_size)
+    # Пачка заполнена целиком: в очереди, вероятно, есть еще уведомления
+    if result['batch'] == batch_size:
+        drain_notification_outbox.delay(batch_size)
+    return result
+
+
+def build_reminder_message(reservation):
+    """Письмо-напоминание о бронировании"""
+    subject = f'Напоминание о бронировании #{reservation.id}'
+    message = f'''
+        Напоминаем о вашем бронировании на завтра:
         Дата: {reservation.date}
         Время: {reservation.time}
         Столик: {reservation.table.number}
-        Гостей: {reservation.guests}
-        Статус: {reservation.get_status_display()}
 
-        Спасибо за выбор нашего ресторана!
+        Ждем вас в нашем ресторане!
         '''
+    return EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [reservation.user.email])
 
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [reservation.user.email],
-            fail_silently=False,
-        )
 
-        return f'Email отправлен для бронирования {reservation_id}'
-    except Reservation.DoesNotExist:
-        return f'Бронирование {reservation_id} не найдено'
+@shared_task
+def send_reminder_chunk(reservation_ids):
+    """Отправка напоминаний для части бронирований через одно соединение"""
+    reservations = (
+        Reservation.objects
+        .filter(id__in=reservation_ids, status='confirmed')
+        .select_related('user', 'table')
+        .only('id', 'date', 'time', 'table__number', 'user__email')
+    )
+    messages = [build_reminder_message(reservation) for reservation in reservations]
+
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+        for message in messages:
+            # По одному письму, чтобы ошибка адреса не прерывала всю пачку
+            try:
+                sent += connection.send_messages([message]) or 0
+            except Exception:
+                failed += 1
+    except Exception:
+        failed = len(messages) - sent
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    return {'sent': sent, 'failed': failed}
+
+
+@shared_task
+def summarize_reminders(results):
+    """Итог рассылки напоминаний по всем частям"""
+    sent = sum(result['sent'] for result in results)
+    failed = sum(result['failed'] for result in results)
+    return f'Отправлено напоминаний: {sent}, ошибок: {failed}, частей: {len(results)}'
 
 
 @shared_task
-def send_reservation_reminder():
-    """Напоминание о бронировании за день"""
+def send_reservation_reminder(chunk_size=None):
+    """Напоминание о бронировании за день
+
+    id бронирований читаются потоком и делятся на части, каждая часть
+    отправляется отдельной задачей через одно SMTP-соединение, итог
+    собирается chord-ом.
+    """
+    chunk_size = chunk_size or getattr(settings, 'REMINDER_CHUNK_SIZE', 200)
     tomorrow = timezone.now().date() + timedelta(days=1)
-    reservations = Reservation.objects.filter(
-        date=tomorrow,
-        status='confirmed'
+    reservation_ids = (
+        Reservation.objects
+        .filter(date=tomorrow, status='confirmed')
+        .order_by('id')
+        .values_list('id', flat=True)
+        .iterator(chunk_size=chunk_size)
     )
 
-    for reservation in reservations:
-        subject = f'Напоминание о бронировании #{reservation.id}'
-        message = f'''
-        Напоминаем о вашем бронировании на завтра:
-        Дата: {reservation.date}
-        Время: {reservation.time}
-        Столик: {reservation.table.number}
+    chunks = []
+    chunk = []
+    for reservation_id in reservation_ids:
+        chunk.append(reservation_id)
+        if len(chunk) == chunk_size:
+            chunks.append(chunk)
+            chunk = []
+    if chunk:
+        chunks.append(chunk)
 
-        Ждем вас в нашем ресторане!
-        '''
+    if not chunks:
+        return 'Отправлено напоминаний: 0'
 
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [reservation.user.email],
-            fail_silently=True,
-        )
-
-    return f'Отправлено напоминаний: {reservations.count()}'
+    chord(send_reminder_chunk.s(ids) for ids in chunks)(summarize_reminders.s())
+    return f'Запланировано напоминаний: {sum(len(ids) for ids in chunks)}, частей: {len(chunks)}'
 
 
 @shared_task
 def auto_confirm_pending_reservations():
-    """Автоматическое подтверждение бронирований со статусом pending"""
-    try:
-        confirmed_count = Reservation.objects.filter(
-            status='pending',
-            date__gte=timezone.now().date()
-        ).update(status='confirmed')
-
-        confirmed_reservations = Reservation.objects.filter(
-            status='confirmed',
-            updated_at__gte=timezone.now() - timedelta(minutes=10)
-        )
+    """Автоматическое подтверждение бронирований со статусом pending
 
-        for reservation in confirmed_reservations:
-            send_reservation_confirmation.delay(reservation.id)
+    Подтверждения ставятся в очередь уведомлений в той же транзакции, что и
+    смена статуса, только для действительно подтвержденных бронирований.
+    """
+    try:
+        with transaction.atomic():
+            pending = dict(
+                Reservation.objects
+                .select_for_update()
+                .filter(status='pending', date__gte=timezone.now().date())
+                .values_list('id', 'user_id')
+            )
+            reservation_ids = list(pending)
+            confirmed_count = Reservation.objects.filter(
+                id__in=reservation_ids
+            ).update(status='confirmed', updated_at=timezone.now())
+            enqueue_notifications(reservation_ids)
+            # update() не посылает сигналов - версии списков API меняем сами
+            user_ids = set(pending.values())
+            transaction.on_commit(lambda: versions.bump_reservations(user_ids))
 
         return f'Автоматически подтверждено бронирований: {confirmed_count}'
     except Exception as e:
         return f'Ошибка при автоматическом подтверждении: {str(e)}'
 
 
-@shared_task
-def cleanup_old_reservations():
-    """Очистка старых завершенных бронирований"""
-    cutoff_date = timezone.now().date() - timedelta(days=365)  # 1 год назад
-    deleted_count = Reservation.objects.filter(
+@shared_task(bind=True)
+def cleanup_old_reservations(self, batch_size=None, rows_per_second=None, archive=None):
+    """Очистка старых завершенных бронирований без холодного архива
+
+    Удаляет строки старше CLEANUP_AFTER_DAYS (365 дней). По расписанию
+    работает архив (archive_old_reservations), а эта задача запускается
+    вручную, когда строки нужно удалить без выгрузки по месяцам. Удаляет пачками с
+    ограничением скорости (rows_per_second=0 - без ограничения) и продолжает
+    с сохраненной позиции после прерывания. Ход выполнения публикуется в
+    состоянии задачи PROGRESS.
+    """
+    cutoff_date = timezone.now().date() - timedelta(days=getattr(settings, 'CLEANUP_AFTER_DAYS', 365))
+    queryset = Reservation.objects.filter(
         date__lt=cutoff_date,
         status__in=['completed', 'cancelled']
-    ).delete()[0]
+    )
 
-    return f'Удалено старых бронирований: {deleted_count}'
+    if archive is None:
+        archive = getattr(settings, 'CLEANUP_ARCHIVE', False)
+    archive_path = None
+    if archive:
+        archive_path = (
+            Path(settings.RESERVATION_ARCHIVE_DIR) / 'deleted' / f'reservations-before-{cutoff_date}.csv.gz'
+        )
+
+    def report(progress):
+        if not self.request.is_eager and self.request.id:
+            self.update_state(state='PROGRESS', meta=progress)
+
+    if rows_per_second is None:
+        rows_per_second = getattr(settings, 'CLEANUP_ROWS_PER_SECOND', None)
+    deleter = BatchDeleter(
+        queryset,
+        name='cleanup_old_reservations',
+        batch_size=batch_size or getattr(settings, 'CLEANUP_BATCH_SIZE', 1000),
+        rows_per_second=rows_per_second,
+        archive_path=archive_path,
+        on_progress=report,
+        delete=delete_reservations,
+    )
+    result = deleter.run(criteria=cutoff_date.isoformat())
+    if archive_path and result['deleted']:
+        result['archive'] = str(archive_path)
+    return result
+
+
+@shared_task
+def archive_old_reservations():
+    """Перенос старых завершенных бронирований в холодный архив"""
+    cutoff_date = timezone.now().date() - timedelta(days=getattr(settings, 'ARCHIVE_AFTER_DAYS', 180))
+    archived = archive_reservations(cutoff_date)
+    return {'cutoff': cutoff_date.isoformat(), 'archived': sum(archived.values()), 'months': archived}
+
+
+@shared_task
+def maintain_reservation_partitions():
+    """Создание будущих и отсоединение старых секций бронирований
+
+    Старые секции, в которых остались неархивированные строки, не
+    отсоединяются и перечисляются в kept.
+    """
+    if not partitions.is_partitioned():
+        return 'Таблица бронирований не секционирована'
+
+    created = partitions.ensure_partitions(getattr(settings, 'PARTITION_MONTHS_AHEAD', 3))
+    detached, kept = [], []
+    retention = getattr(settings, 'PARTITION_RETENTION_MONTHS', None)
+    if retention:
+        detached, kept = partitions.detach_old_partitions(
+            retention, drop=getattr(settings, 'PARTITION_DROP_DETACHED', False)
+        )
+    return {'created': created, 'detached': detached, 'kept': kept}
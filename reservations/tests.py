@@ -1,3 +1,1306 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import tempfile
+from datetime import date, datetime, time, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.cache import local_cache
+
+from . import availability_cache, holds, live, partitions, rules, versions
+from .archive import ReservationArchive, archive_reservations
+from .cleanup import BatchDeleter
+from .forms import ReservationForm
+from .models import NotificationOutbox, Table, Reservation
+from .occupancy import BOOKABLE_SLOTS, slot_index, slot_time
+from .outbox import drain_outbox, enqueue_notifications
+from .services import ReservationService, TableUnavailableError
+from .tasks import (auto_confirm_pending_reservations, cleanup_old_reservations,
+                    maintain_reservation_partitions, send_reminder_chunk,
+                    send_reservation_reminder, summarize_reminders)
+
+User = get_user_model()
+
+
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        """Настройка тестовых данных"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.date = date.today() + timedelta(days=1)
+
+        self.table1 = Table.objects.create(number='T1', capacity=2)
+        self.table2 = Table.objects.create(number='T2', capacity=4)
+        self.table3 = Table.objects.create(number='T3', capacity=6)
+        self.closed_table = Table.objects.create(number='T4', capacity=6, is_available=False)
+
+        self.make_reservation(self.table1, time(19, 0), 2)
+        self.make_reservation(self.table2, time(12, 15), 1)
+        self.make_reservation(self.table2, time(22, 30), 3)
+        self.make_reservation(self.table3, time(14, 0), 2, status='cancelled')
+        self.make_reservation(self.table3, time(14, 0), 2, date=self.date + timedelta(days=1))
+
+    def make_reservation(self, table, start, duration, status='confirmed', date=None):
+        return Reservation.objects.create(
+            user=self.user,
+            table=table,
+            date=date or self.date,
+            time=start,
+            duration=duration,
+            guests=2,
+            status=status
+        )
+
+    def reference_available_ids(self, start, duration, guests):
+        """Прежний алгоритм: перебор столиков и бронирований в Python"""
+        start_time = datetime.combine(self.date, start)
+        end_time = start_time + timedelta(hours=duration)
+        result = set()
+        for table in Table.objects.filter(is_available=True, capacity__gte=guests):
+            conflict = False
+            for reservation in table.reservations.filter(date=self.date, status__in=['pending', 'confirmed']):
+                reservation_start = datetime.combine(self.date, reservation.time)
+                reservation_end = reservation_start + timedelta(hours=reservation.duration)
+                if start_time < reservation_end and end_time > reservation_start:
+                    conflict = True
+                    break
+            if not conflict:
+                result.add(table.id)
+        return result
+
+    def test_matches_reference_implementation(self):
+        """Результат совпадает с прежним построчным алгоритмом"""
+        for hour in range(10, 24):
+            for minute in (0, 15, 30, 45):
+                for duration in (1, 2, 3, 6):
+                    for guests in (1, 3, 5):
+                        start = time(hour, minute)
+                        tables = Table.objects.available_tables(self.date, start, duration, guests)
+                        self.assertEqual(
+                            set(tables.values_list('id', flat=True)),
+                            self.reference_available_ids(start, duration, guests),
+                            f'{start} {duration}ч {guests} гостей'
+                        )
+
+    def test_single_query(self):
+        """Доступность вычисляется одним запросом"""
+        with self.assertNumQueries(1):
+            list(Table.get_available_tables(self.date, time(19, 0), 2, 2))
+
+    def test_is_available_for_reservation_message(self):
+        """Сообщение о конфликте содержит интервал занятости"""
+        is_available, message = self.table1.is_available_for_reservation(self.date, time(20, 0), 2)
+        self.assertFalse(is_available)
+        self.assertEqual(message, 'Столик занят с 19:00:00 до 21:00:00')
+
+        is_available, message = self.table1.is_available_for_reservation(self.date, time(21, 0), 2)
+        self.assertTrue(is_available)
+
+
+class SlotMaskTests(TestCase):
+    def setUp(self):
+        """Настройка тестовых данных"""
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.date = date.today() + timedelta(days=1)
+        self.table = Table.objects.create(number='T1', capacity=4)
+        self.reservation = Reservation.objects.create(
+            user=self.user,
+            table=self.table,
+            date=self.date,
+            time=time(12, 15),
+            duration=2,
+            guests=2,
+            status='confirmed'
+        )
+
+    def is_free(self, start, duration):
+        mask = availability_cache.get_free_slots(self.date, duration, 1)[self.table.id]
+        return bool(mask >> slot_index(start) & 1)
+
+    def test_matches_database_check(self):
+        """Маски дают тот же ответ, что и проверка по базе, для начала слотов"""
+        for index in range(BOOKABLE_SLOTS):
+            start = slot_time(index)
+            for duration in (1, 2, 6):
+                expected, _ = self.table.is_available_for_reservation(self.date, start, duration)
+                self.assertEqual(self.is_free(start, duration), expected, f'{start} {duration}ч')
+
+    def test_save_uses_loaded_snapshot(self):
+        """Прежний интервал берется из снимка загрузки, без лишнего SELECT"""
+        reservation = Reservation.objects.get(pk=self.reservation.pk)
+        reservation.time = time(15, 0)
+        with self.assertNumQueries(1):
+            reservation.save()
+        self.assertEqual(reservation._previous_slot[2], time(12, 15))
+
+        reservation.time = time(17, 0)
+        reservation.save()
+        self.assertEqual(reservation._previous_slot[2], time(15, 0))
+
+    def test_follows_shared_date_version(self):
+        """Изменения из другого процесса видны по общей версии даты, без ожидания срока"""
+        self.assertFalse(self.is_free(time(13, 0), 1))
+
+        # Другой процесс меняет бронирование и сдвигает версию даты в общем кэше
+        Reservation.objects.filter(pk=self.reservation.pk).update(status='cancelled')
+        self.assertFalse(self.is_free(time(13, 0), 1))
+        availability_cache.bump_date(self.date)
+        self.assertTrue(self.is_free(time(13, 0), 1))
+
+
+class ReservationServiceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123',
+            email='test@example.com'
+        )
+        self.date = date.today() + timedelta(days=1)
+        self.table = Table.objects.create(number='T1', capacity=4)
+
+    def test_overlap_constraint_maps_to_unavailable(self):
+        """Нарушение ограничения-исключения превращается в ошибку доступности"""
+        error = IntegrityError('conflicting key value violates exclusion constraint "reservation_no_overlap"')
+        with mock.patch.object(Reservation.objects, 'create', side_effect=error):
+            with self.assertRaises(TableUnavailableError):
+                ReservationService.create_reservation(
+                    self.user, self.table, self.date, time(18, 0), 2, 2
+                )
+
+    def test_create_view_uses_service(self):
+        """Форма бронирования создает бронирование через сервис"""
+        self.client.login(username='testuser', password='testpass123')
+        data = {
+            'create_reservation': '1',
+            'table': self.table.id,
+            'date': self.date.isoformat(),
+            'time': '18:00',
+            'guests': '2',
+            'duration': '2',
+        }
+        response = self.client.post('/reservation/', data)
+        self.assertRedirects(response, '/reservation/list/', fetch_redirect_response=False)
+        self.assertEqual(Reservation.objects.filter(table=self.table).count(), 1)
+
+        response = self.client.post('/reservation/', data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Reservation.objects.filter(table=self.table).count(), 1)
+
+
+class ReminderTaskTests(TestCase):
+    def setUp(self):
+        self.date = timezone.now().date() + timedelta(days=1)
+        for i in range(5):
+            user = User.objects.create_user(username=f'guest{i}', password='testpass123', email=f'guest{i}@example.com')
+            table = Table.objects.create(number=f'T{i}', capacity=4)
+            Reservation.objects.create(
+                user=user, table=table, date=self.date, time=time(19, 0),
+                duration=2, guests=2, status='confirmed'
+            )
+        Reservation.objects.create(
+            user=user, table=table, date=self.date, time=time(12, 0),
+            duration=1, guests=2, status='cancelled'
+        )
+
+    def test_reminders_sent_in_chunks(self):
+        """Напоминания уходят частями, по одному запросу на часть"""
+        with self.assertNumQueries(4):
+            send_reservation_reminder(chunk_size=2)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            [f'guest{i}@example.com' for i in range(5)]
+        )
+
+    def test_chunk_counts_failures(self):
+        """Ошибка одного письма учитывается и не прерывает часть"""
+        from django.core.mail.backends.locmem import EmailBackend
+        send_messages = EmailBackend.send_messages
+
+        def flaky(backend, messages):
+            if messages[0].to == ['guest1@example.com']:
+                raise OSError('SMTP error')
+            return send_messages(backend, messages)
+
+        ids = list(Reservation.objects.filter(status='confirmed').values_list('id', flat=True))
+        with mock.patch.object(EmailBackend, 'send_messages', flaky):
+            result = send_reminder_chunk(ids)
+        self.assertEqual(result, {'sent': 4, 'failed': 1})
+        self.assertEqual(
+            summarize_reminders([result, {'sent': 1, 'failed': 0}]),
+            'Отправлено напоминаний: 5, ошибок: 1, частей: 2'
+        )
+
+
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass123', email='test@example.com'
+        )
+        self.date = timezone.now().date() + timedelta(days=1)
+        self.table = Table.objects.create(number='T1', capacity=4)
+
+    def test_create_sends_confirmation_once(self):
+        """Подтверждение при создании отправляется после коммита и только один раз"""
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation = ReservationService.create_reservation(
+                self.user, self.table, self.date, time(18, 0), 2, 2
+            )
+        self.assertEqual(len(mail.outbox), 1)
+        notification = NotificationOutbox.objects.get(reservation=reservation)
+        self.assertEqual(notification.status, 'sent')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue_notifications([reservation.id])
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_auto_confirm_enqueues_only_confirmed(self):
+        """Автоподтверждение не отправляет письма по уже подтвержденным бронированиям"""
+        Reservation.objects.create(
+            user=self.user, table=self.table, date=self.date, time=time(12, 0),
+            duration=1, guests=2, status='confirmed'
+        )
+        pending = Reservation.objects.create(
+            user=self.user, table=self.table, date=self.date, time=time(18, 0),
+            duration=2, guests=2, status='pending'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            auto_confirm_pending_reservations()
+        with self.captureOnCommitCallbacks(execute=True):
+            auto_confirm_pending_reservations()
+
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'confirmed')
+        self.assertEqual([message.to for message in mail.outbox], [['test@example.com']])
+        self.assertEqual(mail.outbox[0].subject, f'Подтверждение бронирования #{pending.id}')
+
+    @override_settings(NOTIFICATION_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failed_send_retried_then_marked_failed(self):
+        """Ошибка отправки оставляет уведомление в очереди до исчерпания попыток"""
+        reservation = Reservation.objects.create(
+            user=self.user, table=self.table, date=self.date, time=time(18, 0),
+            duration=2, guests=2, status='confirmed'
+        )
+        enqueue_notifications([reservation.id])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=OSError('SMTP error')):
+            self.assertEqual(drain_outbox(10), {'sent': 0, 'failed': 1, 'batch': 1})
+            self.assertEqual(drain_outbox(10), {'sent': 0, 'failed': 1, 'batch': 1})
+            self.assertEqual(drain_outbox(10), {'sent': 0, 'failed': 0, 'batch': 0})
+        notification = NotificationOutbox.objects.get()
+        self.assertEqual(notification.status, 'failed')
+        self.assertEqual(notification.last_error, 'SMTP error')
+
+    def test_bad_row_does_not_abort_batch(self):
+        """Ошибка построения письма помечает только свою строку"""
+        from .outbox import build_confirmation_message
+        broken, fine = [
+            Reservation.objects.create(user=self.user, table=self.table, date=self.date, time=start,
+                                       duration=1, guests=2, status='confirmed')
+            for start in (time(12, 0), time(18, 0))
+        ]
+        enqueue_notifications([broken.id, fine.id])
+
+        def build(reservation):
+            if reservation.pk == broken.pk:
+                raise ValueError('broken row')
+            return build_confirmation_message(reservation)
+
+        with mock.patch.dict('reservations.outbox.MESSAGE_BUILDERS', {NotificationOutbox.CONFIRMATION: build}):
+            self.assertEqual(drain_outbox(10), {'sent': 1, 'failed': 1, 'batch': 2})
+        self.assertEqual(NotificationOutbox.objects.get(reservation=broken).last_error, 'broken row')
+        self.assertEqual(NotificationOutbox.objects.get(reservation=fine).status, 'sent')
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class CleanupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.table = Table.objects.create(number='T1', capacity=4)
+        old_date = timezone.now().date() - timedelta(days=400)
+        partitions.ensure_date_range(old_date - timedelta(days=5), timezone.now().date())
+        self.old_ids = []
+        for i in range(5):
+            reservation = Reservation.objects.create(
+                user=self.user, table=self.table, date=old_date - timedelta(days=i),
+                time=time(18, 0), duration=2, guests=2, status='completed'
+            )
+            self.old_ids.append(reservation.id)
+        self.recent = Reservation.objects.create(
+            user=self.user, table=self.table, date=timezone.now().date() - timedelta(days=10),
+            time=time(18, 0), duration=2, guests=2, status='completed'
+        )
+
+    def test_deletes_in_batches_and_archives(self):
+        """Старые бронирования удаляются пачками и сохраняются в архив"""
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(RESERVATION_ARCHIVE_DIR=directory), \
+                mock.patch('reservations.cleanup.timer.sleep') as sleep:
+            result = cleanup_old_reservations.delay(batch_size=2, rows_per_second=1, archive=True).get()
+            with gzip.open(result['archive'], 'rt', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+
+        self.assertEqual(result['deleted'], 5)
+        self.assertEqual(result['batches'], 3)
+        self.assertTrue(sleep.called)
+        self.assertEqual(sorted(int(row['id']) for row in rows), self.old_ids)
+        self.assertEqual(list(Reservation.objects.values_list('id', flat=True)), [self.recent.id])
+
+    def test_fast_delete_without_row_signals(self):
+        """Пачка удаляется без обработчиков на строку; rows_per_second=0 снимает ограничение"""
+        enqueue_notifications([self.old_ids[0]])
+        with mock.patch('reservations.cleanup.timer.sleep') as sleep, \
+                mock.patch.object(versions, 'bump_reservations') as bump_reservations, \
+                mock.patch.object(availability_cache, 'bump_date') as bump_date, \
+                mock.patch.object(live, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                result = cleanup_old_reservations.delay(batch_size=10, rows_per_second=0).get()
+
+        self.assertEqual(result['deleted'], 5)
+        sleep.assert_not_called()
+        bump_reservations.assert_called_once_with({self.user.id})
+        self.assertEqual(bump_date.call_count, 5)
+        publish.assert_not_called()
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_cutoff_follows_cleanup_setting(self):
+        """Срок очистки - CLEANUP_AFTER_DAYS, а не срок архива"""
+        middle = Reservation.objects.create(
+            user=self.user, table=self.table, date=timezone.now().date() - timedelta(days=200),
+            time=time(18, 0), duration=2, guests=2, status='completed'
+        )
+        cleanup_old_reservations.delay(rows_per_second=0).get()
+        self.assertTrue(Reservation.objects.filter(id=middle.id).exists())
+
+        with override_settings(CLEANUP_AFTER_DAYS=100):
+            cleanup_old_reservations.delay(rows_per_second=0).get()
+        self.assertEqual(list(Reservation.objects.values_list('id', flat=True)), [self.recent.id])
+
+    def test_resumes_from_checkpoint(self):
+        """Прерванная очистка продолжается с сохраненного id"""
+        queryset = Reservation.objects.filter(status='completed', date__lt=timezone.now().date() - timedelta(days=365))
+        deleter = BatchDeleter(queryset, name='test', batch_size=2)
+        deleter.save_checkpoint('cutoff', self.old_ids[1])
+
+        result = deleter.run(criteria='cutoff')
+        self.assertEqual(result['resumed_from'], self.old_ids[1])
+        self.assertEqual(result['deleted'], 3)
+        self.assertEqual(set(queryset.values_list('id', flat=True)), set(self.old_ids[:2]))
+        self.assertIsNone(cache.get(deleter.checkpoint_key))
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.staff = User.objects.create_user(username='manager', password='testpass123', is_staff=True)
+        self.table = Table.objects.create(number='T1', capacity=4)
+        partitions.ensure_date_range(date(2023, 1, 1), date(2023, 2, 28))
+        for day, status, guests in [(date(2023, 1, 10), 'completed', 2), (date(2023, 1, 20), 'cancelled', 3),
+                                    (date(2023, 2, 5), 'completed', 4), (date(2023, 2, 6), 'confirmed', 2)]:
+            Reservation.objects.create(
+                user=self.user, table=self.table, date=day, time=time(18, 0),
+                duration=2, guests=guests, status=status
+            )
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_archive_by_month(self):
+        """Бронирования выгружаются по месяцам и удаляются из таблицы"""
+        archived = archive_reservations(date(2023, 3, 1), self.directory.name)
+
+        self.assertEqual(archived, {'2023-01': 2, '2023-02': 1})
+        self.assertEqual(list(Reservation.objects.values_list('status', flat=True)), ['confirmed'])
+
+        archive = ReservationArchive(self.directory.name)
+        self.assertEqual(archive.months(), [(2023, 1), (2023, 2)])
+        rows = list(archive.read(date(2023, 1, 15), date(2023, 2, 28)))
+        self.assertEqual([(row['date'], row['status']) for row in rows],
+                         [(date(2023, 1, 20), 'cancelled'), (date(2023, 2, 5), 'completed')])
+        self.assertEqual(rows[0]['table_number'], 'T1')
+        self.assertEqual(rows[0]['username'], 'testuser')
+
+    def test_staff_report_api(self):
+        """Отчет по архиву доступен только персоналу"""
+        with override_settings(RESERVATION_ARCHIVE_DIR=self.directory.name):
+            archive_reservations(date(2023, 3, 1))
+            client = APIClient()
+            client.force_authenticate(self.user)
+            self.assertEqual(client.get('/api/v1/reservations/archive/').status_code, 403)
+
+            client.force_authenticate(self.staff)
+            response = client.get('/api/v1/reservations/archive/', {'date_from': '2023-01-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['months'], [
+            {'month': '2023-01', 'reservations': 2, 'guests': 5, 'by_status': {'completed': 1, 'cancelled': 1}},
+            {'month': '2023-02', 'reservations': 1, 'guests': 4, 'by_status': {'completed': 1}},
+        ])
+
+
+class PartitionTests(TestCase):
+    def test_partition_names(self):
+        """Имена и границы помесячных секций"""
+        month = date(2024, 12, 1)
+        self.assertEqual(partitions.partition_name(month), 'reservations_reservation_p2024_12')
+        self.assertEqual(partitions.partition_month('reservations_reservation_p2024_12'), month)
+        self.assertIsNone(partitions.partition_month('reservations_reservation_default'))
+        self.assertEqual(partitions.add_months(month, 1), date(2025, 1, 1))
+        self.assertEqual(partitions.add_months(month, -12), date(2023, 12, 1))
+
+        create, exclude = partitions.partition_sql(month)
+        self.assertIn("FROM ('2024-12-01') TO ('2025-01-01')", create)
+        self.assertIn('reservation_no_overlap_2024_12', exclude)
+
+    def test_maintenance_skipped_without_partitioning(self):
+        """Без секционирования (SQLite) задача ничего не делает"""
+        if connection.vendor == 'postgresql':
+            self.skipTest('таблица секционирована')
+        self.assertEqual(maintain_reservation_partitions(), 'Таблица бронирований не секционирована')
+
+    def test_booking_date_is_capped(self):
+        """Дальше RESERVATION_MAX_DAYS_AHEAD дней бронировать нельзя - ни в API, ни в форме"""
+        user = User.objects.create_user(username='guest', password='testpass123')
+        table = Table.objects.create(number='T1', capacity=4)
+        client = APIClient()
+        client.force_authenticate(user)
+        too_far = rules.max_booking_date() + timedelta(days=1)
+
+        data = {'table': table.id, 'date': too_far.isoformat(), 'time': '18:00', 'duration': 2, 'guests': 2}
+        response = client.post('/api/v1/reservations/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date', response.data)
+        response = client.post('/api/v1/reservations/bulk/', [data], format='json')
+        self.assertIn('date', response.data[0])
+
+        form = ReservationForm({'date': too_far, 'time': '18:00', 'guests': 2, 'duration': 2},
+                               time_slots=['18:00'])
+        self.assertIn('date', form.errors)
+        self.assertEqual(form.fields['date'].widget.attrs['max'], rules.max_booking_date().isoformat())
+
+        data['date'] = rules.max_booking_date().isoformat()
+        self.assertEqual(client.post('/api/v1/reservations/', data, format='json').status_code, 201)
+
+    def test_bookings_stay_within_business_day(self):
+        """Начало вне часов работы отклоняется API и ограничением в базе"""
+        user = User.objects.create_user(username='guest', password='testpass123')
+        table = Table.objects.create(number='T1', capacity=4)
+        client = APIClient()
+        client.force_authenticate(user)
+        day = timezone.now().date() + timedelta(days=1)
+
+        data = {'table': table.id, 'date': day.isoformat(), 'time': '01:00', 'duration': 2, 'guests': 2}
+        response = client.post('/api/v1/reservations/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('time', response.data)
+
+        # Самое позднее бронирование дня заканчивается до открытия следующего
+        Reservation.objects.create(user=user, table=table, date=day, time=time(22, 30), duration=6, guests=2)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Reservation.objects.create(user=user, table=table, date=day + timedelta(days=1),
+                                       time=time(1, 0), duration=2, guests=2)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'секционирование есть только в PostgreSQL')
+class PostgresPartitionTests(TestCase):
+    """Запуск: TEST_POSTGRES=True DB_NAME=... DB_USER=... python manage.py test reservations"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='guest', password='testpass123')
+        self.table = Table.objects.create(number='T1', capacity=4)
+
+    def partition_of(self, reservation):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT tableoid::regclass::text FROM {partitions.TABLE} WHERE id = %s',
+                           [reservation.id])
+            return cursor.fetchone()[0]
+
+    def test_partitions_cover_bookable_dates(self):
+        """Секции после миграции покрывают все даты, разрешенные для бронирования"""
+        self.assertTrue(partitions.is_partitioned())
+        last = rules.max_booking_date()
+        reservation = ReservationService.create_reservation(self.user, self.table, last, time(18, 0), 2, 2)
+        self.assertEqual(self.partition_of(reservation), partitions.partition_name(partitions.month_start(last)))
+
+        with self.assertRaises(TableUnavailableError):
+            ReservationService.create_reservation(self.user, self.table, last, time(19, 0), 2, 2)
+
+    def test_history_partitions(self):
+        """Для истории секции создаются заранее, в том числе задачей обслуживания"""
+        old_date = date(2023, 1, 10)
+        self.assertIn(partitions.partition_name(date(2023, 1, 1)),
+                      partitions.ensure_date_range(old_date, old_date))
+        self.assertEqual(partitions.ensure_date_range(old_date, old_date), [])
+        reservation = Reservation.objects.create(user=self.user, table=self.table, date=old_date,
+                                                 time=time(18, 0), duration=2, guests=2, status='completed')
+        self.assertEqual(self.partition_of(reservation), 'reservations_reservation_p2023_01')
+
+        far_month = partitions.add_months(partitions.month_start(date.today()), 15)
+        self.assertEqual(partitions.ensure_partitions(15)[-1], partitions.partition_name(far_month))
+
+    def test_partition_with_rows_is_kept(self):
+        """Секция с неархивированными строками не отсоединяется"""
+        old_date = date(2023, 1, 10)
+        partitions.ensure_date_range(old_date, old_date)
+        for status in ['confirmed', 'completed']:
+            Reservation.objects.create(user=self.user, table=self.table, date=old_date,
+                                       time=time(18, 0), duration=2, guests=2, status=status)
+        archive_reservations(date(2023, 2, 1), directory=tempfile.mkdtemp())
+
+        detached, kept = partitions.detach_old_partitions(24, drop=True, today=date(2025, 6, 1))
+        self.assertEqual(detached, [])
+        self.assertEqual(kept, ['reservations_reservation_p2023_01'])
+        self.assertIn(date(2023, 1, 1), partitions.existing_partitions())
+        self.assertEqual(Reservation.objects.filter(date=old_date).get().status, 'confirmed')
+
+
+class AvailabilityCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.date = timezone.now().date() + timedelta(days=1)
+        self.table1 = Table.objects.create(number='T1', capacity=2)
+        self.table2 = Table.objects.create(number='T2', capacity=4, table_type='vip')
+
+    def numbers(self, tables):
+        return [table.number for table in tables]
+
+    def test_cached_lookup_without_queries(self):
+        """Повторная проверка доступности не обращается к БД"""
+        tables = availability_cache.available_tables(self.date, time(19, 0), 2, 2)
+        self.assertEqual(self.numbers(tables), ['T1', 'T2'])
+        with self.assertNumQueries(0):
+            tables = availability_cache.available_tables(self.date, time(19, 30), 2, 2)
+        self.assertEqual(self.numbers(tables), ['T1', 'T2'])
+        self.assertIsNone(availability_cache.available_tables(self.date, time(19, 15), 2, 2))
+
+    def test_invalidated_by_reservation(self):
+        """Бронирование на дату сбрасывает кэш только этой даты"""
+        other_date = self.date + timedelta(days=1)
+        availability_cache.available_tables(self.date, time(19, 0), 2, 2)
+        availability_cache.available_tables(other_date, time(19, 0), 2, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation = Reservation.objects.create(
+                user=self.user, table=self.table1, date=self.date, time=time(18, 0),
+                duration=2, guests=2, status='confirmed'
+            )
+        self.assertEqual(self.numbers(availability_cache.available_tables(self.date, time(19, 0), 2, 2)), ['T2'])
+        with self.assertNumQueries(0):
+            availability_cache.available_tables(other_date, time(19, 0), 2, 2)
+
+        # Перенос бронирования освобождает столик на прежнюю дату
+        reservation.date = other_date
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation.save()
+        self.assertEqual(self.numbers(availability_cache.available_tables(self.date, time(19, 0), 2, 2)), ['T1', 'T2'])
+        self.assertEqual(self.numbers(availability_cache.available_tables(other_date, time(19, 0), 2, 2)), ['T2'])
+
+    def test_invalidated_by_table_change(self):
+        """Изменение столика сбрасывает кэш и влияет на фильтр по типу"""
+        self.assertEqual(
+            self.numbers(availability_cache.available_tables(self.date, time(19, 0), 2, 2, 'vip')), ['T2']
+        )
+        self.table2.is_available = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.table2.save()
+        self.assertEqual(availability_cache.available_tables(self.date, time(19, 0), 2, 2, 'vip'), [])
+
+    async def atables_at_seven(self):
+        return self.numbers(await availability_cache.aavailable_tables(self.date, time(19, 0), 2, 2))
+
+    def test_table_change_in_other_process(self):
+        """Столик, измененный другим процессом, виден сразу: локальная запись сверяется с версией"""
+        from asgiref.sync import async_to_sync
+        from core.cache import bump_version
+        self.assertEqual(self.numbers(availability_cache.available_tables(self.date, time(19, 0), 2, 2)), ['T1', 'T2'])
+        self.assertEqual(async_to_sync(self.atables_at_seven)(), ['T1', 'T2'])
+
+        # Другой процесс добавляет столик: версия в общем кэше растет, а
+        # локальная запись этого процесса остается
+        Table.objects.bulk_create([Table(number='T3', capacity=4)])
+        with mock.patch.object(local_cache, 'delete'):
+            bump_version(Table)
+        self.assertEqual(self.numbers(availability_cache.available_tables(self.date, time(19, 0), 2, 2)),
+                         ['T1', 'T2', 'T3'])
+        self.assertEqual(async_to_sync(self.atables_at_seven)(), ['T1', 'T2', 'T3'])
+
+
+class ReservationListTests(TestCase):
+    def test_list_split_by_status(self):
+        """Список разделяет активные и архивные бронирования"""
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        table = Table.objects.create(number='T1', capacity=4)
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        Reservation.objects.create(user=user, table=table, date=tomorrow, time=time(18, 0),
+                                   duration=2, guests=2, status='confirmed')
+        Reservation.objects.create(user=user, table=table, date=tomorrow, time=time(12, 0),
+                                   duration=2, guests=2, status='cancelled')
+
+        self.assertEqual(self.client.get('/reservation/list/').status_code, 302)
+
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get('/reservation/list/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r.time for r in response.context['active_reservations']], [time(18, 0)])
+        self.assertEqual([r.status for r in response.context['archived_reservations']], ['cancelled'])
+
+
+class AvailabilityStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.table = Table.objects.create(number='T1', capacity=4)
+        self.date = timezone.now().date() + timedelta(days=1)
+
+    def test_save_paths_publish_deltas(self):
+        """Создание, перенос и отмена бронирования публикуют события после фиксации"""
+        with mock.patch.object(live, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                reservation = Reservation.objects.create(
+                    user=self.user, table=self.table, date=self.date, time=time(18, 0),
+                    duration=2, guests=2, status='confirmed'
+                )
+            self.assertEqual([c.args[0]['type'] for c in publish.call_args_list], ['occupied'])
+            self.assertEqual(publish.call_args.args[0]['start'], '18:00')
+
+            publish.reset_mock()
+            reservation.special_requests = 'У окна'
+            with self.captureOnCommitCallbacks(execute=True):
+                reservation.save()
+            publish.assert_not_called()
+
+            reservation.time = time(20, 0)
+            with self.captureOnCommitCallbacks(execute=True):
+                reservation.save()
+            self.assertEqual(
+                [(c.args[0]['type'], c.args[0]['start']) for c in publish.call_args_list],
+                [('released', '18:00'), ('occupied', '20:00')]
+            )
+
+            publish.reset_mock()
+            reservation.status = 'cancelled'
+            with self.captureOnCommitCallbacks(execute=True):
+                reservation.save()
+            self.assertEqual([c.args[0]['type'] for c in publish.call_args_list], ['released'])
+
+    async def test_stream_delivers_events(self):
+        """Подписчик получает события своей даты и пустые сообщения при простое"""
+        stream = live.stream(self.date, heartbeat=0.05)
+        self.assertEqual(await anext(stream), 'retry: 3000\n\n')
+
+        other = live.reservation_event('occupied', self.date + timedelta(days=1), 1, time(18, 0), 2)
+        event = live.reservation_event('occupied', self.date, self.table.id, time(19, 0), 2)
+        live.publish(other)
+        live.publish(event)
+        message = await anext(stream)
+        self.assertTrue(message.startswith('event: availability\ndata: '))
+        self.assertIn('"start": "19:00"', message)
+        self.assertEqual(await anext(stream), ': ping\n\n')
+
+        await stream.aclose()
+        self.assertNotIn(live.channel(self.date), live._subscribers)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379/1',
+    }})
+    async def test_one_redis_subscription_per_process(self):
+        """Все потоки процесса делят одно подключение pub/sub, каналы подписаны, пока есть слушатели"""
+        import asyncio
+
+        class PubSub:
+            def __init__(self):
+                self.channels = set()
+                self.messages = asyncio.Queue()
+                self.closed = False
+
+            async def subscribe(self, name):
+                self.channels.add(name)
+
+            async def unsubscribe(self, name):
+                self.channels.discard(name)
+
+            async def get_message(self, ignore_subscribe_messages, timeout):
+                return await self.messages.get()
+
+            async def aclose(self):
+                self.closed = True
+
+        pubsub = PubSub()
+        client = mock.Mock(pubsub=mock.Mock(return_value=pubsub))
+        other_date = self.date + timedelta(days=1)
+        with mock.patch('core.async_cache.client', return_value=client):
+            streams = [live.stream(self.date, heartbeat=5), live.stream(self.date, heartbeat=5),
+                       live.stream(other_date, heartbeat=5)]
+            for stream in streams:
+                await anext(stream)
+            client.pubsub.assert_called_once()
+            self.assertEqual(pubsub.channels, {live.channel(self.date), live.channel(other_date)})
+
+            event = live.reservation_event('occupied', self.date, self.table.id, time(19, 0), 2)
+            pubsub.messages.put_nowait({'type': 'message', 'channel': live.channel(self.date).encode(),
+                                        'data': json.dumps(event).encode()})
+            for stream in streams[:2]:
+                self.assertIn('"start": "19:00"', await anext(stream))
+
+            await streams[2].aclose()
+            self.assertEqual(pubsub.channels, {live.channel(self.date)})
+            for stream in streams[:2]:
+                await stream.aclose()
+            self.assertTrue(pubsub.closed)
+            self.assertFalse(live._subscribers)
+
+    async def test_stream_view(self):
+        response = await self.async_client.get('/api/availability-stream/?date=bad')
+        self.assertEqual(response.status_code, 400)
+
+        response = await self.async_client.get(f'/api/availability-stream/?date={self.date.isoformat()}')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertTrue(response.is_async)
+
+
+class SlotHoldTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.other = User.objects.create_user(username='otheruser', password='testpass123')
+        self.date = timezone.now().date() + timedelta(days=1)
+        self.table1 = Table.objects.create(number='T1', capacity=2)
+        self.table2 = Table.objects.create(number='T2', capacity=4)
+
+    def numbers(self, tables):
+        return [table.number for table in tables]
+
+    def test_hold_blocks_others(self):
+        """Удержание занимает слоты для всех, кроме владельца, и снимается"""
+        hold = holds.place_hold(self.table1.id, self.date, time(19, 0), 2, self.user.id)
+        self.assertIsNotNone(hold)
+        # Пересекающийся интервал удержать нельзя, соседний - можно
+        self.assertIsNone(holds.place_hold(self.table1.id, self.date, time(20, 30), 2, self.other.id))
+        self.assertIsNotNone(holds.place_hold(self.table1.id, self.date, time(21, 0), 2, self.other.id))
+
+        self.assertEqual(self.numbers(availability_cache.available_tables(self.date, time(18, 0), 2, 2)), ['T2'])
+        self.assertEqual(
+            self.numbers(availability_cache.available_tables(self.date, time(19, 0), 2, 2, hold_token=hold['token'])),
+            ['T1', 'T2']
+        )
+        self.assertEqual(self.numbers(availability_cache.available_tables(self.date, time(17, 0), 2, 2)), ['T1', 'T2'])
+
+        holds.release_hold(hold['token'])
+        self.assertIsNone(holds.get_hold(hold['token']))
+        self.assertEqual(self.numbers(availability_cache.available_tables(self.date, time(18, 0), 2, 2)), ['T1', 'T2'])
+
+    def test_off_slot_checks_respect_holds(self):
+        """Время не с начала слота проверяется по БД с учетом удержаний"""
+        from core.utils import find_available_tables
+        hold = holds.place_hold(self.table1.id, self.date, time(19, 0), 2, self.user.id)
+        self.assertIsNone(availability_cache.available_tables(self.date, time(19, 15), 2, 2))
+        self.assertEqual(self.numbers(availability_cache.free_tables(self.date, time(19, 15), 2, 2)), ['T2'])
+        self.assertEqual(
+            self.numbers(availability_cache.free_tables(self.date, time(19, 15), 2, 2, hold_token=hold['token'])),
+            ['T1', 'T2']
+        )
+        self.assertEqual([item['table'].number for item in find_available_tables(self.date, time(18, 45), 1, 2)],
+                         ['T2'])
+
+        client = APIClient()
+        client.force_authenticate(self.other)
+        response = client.post('/api/v1/tables/check_availability/', {
+            'date': self.date.isoformat(), 'time': '19:15', 'duration': 2, 'guests': 2,
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([table['number'] for table in response.data['available_tables']], ['T2'])
+
+    def test_hold_converts_into_reservation(self):
+        """Бронирование по своему удержанию снимает его, чужое удержание запрещает бронирование"""
+        hold = holds.place_hold(self.table1.id, self.date, time(19, 0), 2, self.user.id)
+
+        with self.assertRaises(TableUnavailableError):
+            ReservationService.create_reservation(self.other, self.table1, self.date, time(19, 0), 2, 2)
+        # Чужой токен не дает права на удержание
+        with self.assertRaises(TableUnavailableError):
+            ReservationService.create_reservation(
+                self.other, self.table1, self.date, time(19, 0), 2, 2, hold_token=hold['token']
+            )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation = ReservationService.create_reservation(
+                self.user, self.table1, self.date, time(19, 0), 2, 2, hold_token=hold['token']
+            )
+        self.assertEqual(reservation.table, self.table1)
+        self.assertIsNone(holds.get_hold(hold['token']))
+        self.assertFalse(holds.is_held(self.table1.id, self.date, time(19, 0), 2))
+
+    def test_hold_view(self):
+        self.client.login(username='testuser', password='testpass123')
+        data = {'table': self.table1.id, 'date': self.date.isoformat(), 'time': '19:00', 'duration': 2}
+        response = self.client.post('/reservation/hold/', data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+        first_token = self.client.session['reservation_hold']
+
+        # Выбор другого столика снимает прежнее удержание
+        response = self.client.post('/reservation/hold/', {**data, 'table': self.table2.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(holds.get_hold(first_token))
+
+        self.client.login(username='otheruser', password='testpass123')
+        response = self.client.post('/reservation/hold/', {**data, 'table': self.table2.id})
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response.json()['success'])
+
+        # Прошедшая дата, время вне часов работы и лишние гости не удерживаются
+        yesterday = (timezone.now().date() - timedelta(days=1)).isoformat()
+        for invalid in ({'date': yesterday}, {'time': '04:00'}, {'guests': 3}):
+            response = self.client.post('/reservation/hold/', {**data, **invalid})
+            self.assertEqual(response.status_code, 400, invalid)
+        self.assertNotIn('reservation_hold', self.client.session)
+
+    def test_date_holds_read_in_one_request(self):
+        """Удержания даты читаются одним обращением к кэшу при любом числе столиков"""
+        holds.place_hold(self.table1.id, self.date, time(19, 0), 2, self.user.id)
+        with mock.patch.object(cache, 'get', wraps=cache.get) as get, \
+                mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+            masks = holds.held_masks(self.date, [self.table1.id, self.table2.id])
+        self.assertEqual(get.call_count, 1)
+        get_many.assert_not_called()
+        self.assertEqual(list(masks), [self.table1.id])
+
+    def test_own_hold_is_leased_before_insert(self):
+        """Свое удержание переносится на интервал бронирования и не дает встать чужому"""
+        hold = holds.place_hold(self.table1.id, self.date, time(19, 0), 2, self.user.id)
+        with self.captureOnCommitCallbacks() as callbacks:
+            ReservationService.create_reservation(
+                self.user, self.table1, self.date, time(19, 0), 3, 2, hold_token=hold['token']
+            )
+            # До фиксации интервал, включая продление, закреплен за бронирующим
+            self.assertIsNone(holds.place_hold(self.table1.id, self.date, time(21, 0), 1, self.other.id))
+        with mock.patch.object(live, 'publish') as publish:
+            for callback in callbacks:
+                callback()
+        self.assertFalse(holds.is_held(self.table1.id, self.date, time(19, 0), 3))
+        self.assertEqual([call.args[0]['type'] for call in publish.call_args_list], ['occupied'])
+
+    def test_holds_published_to_stream(self):
+        with mock.patch.object(live, 'publish') as publish:
+            hold = holds.place_hold(self.table1.id, self.date, time(19, 0), 2, self.user.id)
+            holds.release_hold(hold['token'])
+        held, unheld = [call.args[0] for call in publish.call_args_list]
+        self.assertEqual((held['type'], held['table_id'], held['start']), ('held', self.table1.id, '19:00'))
+        self.assertEqual(held['expires_in'], settings.RESERVATION_HOLD_TTL)
+        self.assertEqual(unheld['type'], 'unheld')
+
+
+class ReservationPaginationTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        tables = [Table.objects.create(number=f'T{i}', capacity=4) for i in range(3)]
+        start = timezone.now().date() + timedelta(days=1)
+        reservations = []
+        for day in range(5):
+            for hour in (12, 18):
+                for table in tables:
+                    reservations.append(Reservation(
+                        user=self.user, table=table, date=start + timedelta(days=day),
+                        time=time(hour, 0), duration=2, guests=2, status='confirmed'
+                    ))
+        Reservation.objects.bulk_create(reservations)
+        self.expected = list(Reservation.objects.order_by('-date', '-time', '-id').values_list('id', flat=True))
+        self.client = APIClient()
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_pages_follow_keyset_order(self):
+        """Страницы идут по (date, time, id) без пропусков и повторов, назад тоже"""
+        self.client.force_authenticate(self.staff)
+        self.assertEqual(self.walk('/api/v1/reservations/?page_size=7'), self.expected)
+
+        first = self.client.get('/api/v1/reservations/?page_size=7').data
+        second = self.client.get(first['next']).data
+        self.assertEqual([item['id'] for item in self.client.get(second['previous']).data['results']],
+                         self.expected[:7])
+
+        # Глубокая страница стоит столько же запросов, сколько первая
+        with self.assertNumQueries(1):
+            self.client.get(second['next'])
+
+        # Позиция p=abc не разбирается на (date, time, id)
+        self.assertEqual(self.client.get('/api/v1/reservations/?cursor=cD1hYmM=').status_code, 404)
+
+    def test_page_size_limits(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(len(self.client.get('/api/v1/reservations/').data['results']), 20)
+        self.assertEqual(len(self.client.get('/api/v1/reservations/?page_size=1000').data['results']), 30)
+        self.assertEqual(self.walk('/api/v1/reservations/?ordering=date'), sorted(
+            self.expected, key=lambda pk: Reservation.objects.values_list('date', 'id').get(pk=pk)
+        ))
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.table = Table.objects.create(number='T1', capacity=4, description='У окна')
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        for hour in (12, 15, 18):
+            Reservation.objects.create(user=self.user, table=self.table, date=tomorrow, time=time(hour, 0),
+                                       duration=2, guests=2, status='confirmed')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_fields_and_expand(self):
+        """Неподвыбранные поля не выводятся, нераскрытые связи выводятся идентификаторами"""
+        response = self.client.get('/api/v1/reservations/?fields=id,status,table&expand=')
+        item = response.data['results'][0]
+        self.assertEqual(set(item), {'id', 'status', 'table'})
+        self.assertEqual(item['table'], self.table.id)
+
+        item = self.client.get('/api/v1/reservations/?fields=id,table&expand=table').data['results'][0]
+        self.assertEqual(item['table']['number'], 'T1')
+
+        # Без параметров ответ прежний
+        item = self.client.get('/api/v1/reservations/').data['results'][0]
+        self.assertEqual(item['user']['username'], 'testuser')
+        self.assertIn('special_requests', item)
+
+        self.assertEqual(
+            self.client.get('/api/v1/tables/?fields=id,number').data,
+            [{'id': self.table.id, 'number': 'T1'}]
+        )
+
+    def test_queryset_matches_fields(self):
+        """Выбираются только нужные столбцы и таблицы"""
+        view = self.client.get('/api/v1/reservations/?fields=id,status&expand=').renderer_context['view']
+        queryset = view.get_queryset()
+        self.assertFalse(queryset.query.select_related)
+        self.assertEqual(queryset.query.deferred_loading, ({'id', 'status', 'date', 'time', 'created_at'}, False))
+
+        with self.assertNumQueries(1):
+            self.client.get('/api/v1/reservations/?fields=id,user,table&expand=table')
+
+
+class FastListTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True,
+                                              first_name='Анна', phone='+79990000000')
+        self.table = Table.objects.create(number='T1', capacity=4, table_type='vip', description='У окна')
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        for hour in (12, 15, 18):
+            Reservation.objects.create(user=self.staff, table=self.table, date=tomorrow, time=time(hour, 0),
+                                       duration=2, guests=2, status='confirmed', special_requests='Торт ')
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_same_output_as_serializers(self):
+        """Быстрый путь дает тот же JSON, что ModelSerializer и JSONRenderer"""
+        from rest_framework.renderers import JSONRenderer
+        from .api.renderers import ORJSONRenderer
+        from .serializers import ReservationSerializer, TableSerializer
+
+        reservations = Reservation.objects.order_by('-date', '-time', '-id')
+        for url, expected in (
+            ('/api/v1/reservations/', ReservationSerializer(reservations, many=True).data),
+            ('/api/v1/reservations/upcoming/', ReservationSerializer(reservations, many=True).data),
+            ('/api/v1/reservations/?fields=id,table,created_at&expand=',
+             ReservationSerializer(reservations, many=True, fields={'id', 'table', 'created_at'}, expand=set()).data),
+        ):
+            with mock.patch('rest_framework.serializers.ModelSerializer.to_representation') as to_representation:
+                response = self.client.get(url)
+            to_representation.assert_not_called()
+            self.assertEqual(response.content, JSONRenderer().render({
+                'next': None, 'previous': None, 'results': expected,
+            }))
+
+        self.assertEqual(
+            self.client.get('/api/v1/tables/').content,
+            JSONRenderer().render(TableSerializer(Table.objects.all(), many=True).data)
+        )
+        data = {'results': ReservationSerializer(reservations, many=True).data}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='guest', password='testpass123')
+        self.other = User.objects.create_user(username='other', password='testpass123')
+        self.table = Table.objects.create(number='T1', capacity=4, table_type='standard')
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+        self.reservation = Reservation.objects.create(user=self.user, table=self.table, date=self.tomorrow,
+                                                      time=time(12, 0), duration=2, guests=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_not_modified_without_queries(self):
+        for url in ('/api/v1/tables/', '/api/v1/reservations/upcoming/', '/api/v1/reservations/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Authorization', response['Vary'])
+            self.assertIn('Cookie', response['Vary'])
+            self.assertNotIn('Last-Modified', response)
+
+            with self.assertNumQueries(0):
+                not_modified = self.revalidate(url, response)
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertEqual(not_modified['ETag'], response['ETag'])
+            self.assertIn('Authorization', not_modified['Vary'])
+
+    def test_writes_change_etag(self):
+        url = '/api/v1/reservations/upcoming/'
+        response = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reservation.status = 'cancelled'
+            self.reservation.save()
+        changed = self.revalidate(url, response)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.data['results'], [])
+
+        tables = self.client.get('/api/v1/tables/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Table.objects.create(number='T2', capacity=2, table_type='standard')
+        self.assertEqual(self.revalidate('/api/v1/tables/', tables).status_code, 200)
+
+    def test_if_modified_since_alone_is_not_trusted(self):
+        """Без ETag клиент всегда получает актуальный ответ"""
+        url = '/api/v1/reservations/upcoming/'
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reservation.status = 'cancelled'
+            self.reservation.save()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+    def test_etag_per_user_and_query(self):
+        url = '/api/v1/reservations/'
+        response = self.client.get(url)
+
+        # Бронирование другого гостя не меняет список этого пользователя
+        with self.captureOnCommitCallbacks(execute=True):
+            Reservation.objects.create(user=self.other, table=self.table, date=self.tomorrow,
+                                       time=time(18, 0), duration=2, guests=2)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.assertEqual(self.revalidate(url + '?fields=id', response).status_code, 200)
+
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_user_change_scoped_to_owner(self):
+        """Регистрация и правка чужого профиля не сбрасывают ETag; правка своего - сбрасывает"""
+        url = '/api/v1/reservations/'
+        response = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(username='newcomer', password='testpass123')
+            self.other.first_name = 'Иван'
+            self.other.save()
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Петр'
+            self.user.save()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_bulk_confirm_changes_etag(self):
+        url = '/api/v1/reservations/'
+        response = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            auto_confirm_pending_reservations()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+
+class BulkReservationTests(TestCase):
+    url = '/api/v1/reservations/bulk/'
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create_user(username='corp', password='testpass123', email='corp@example.com')
+        self.tables = [Table.objects.create(number=f'T{number}', capacity=4) for number in range(1, 4)]
+        self.date = timezone.now().date() + timedelta(days=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def item(self, table, start='18:00', **extra):
+        return {'table': table.id, 'date': self.date.isoformat(), 'time': start,
+                'duration': 2, 'guests': 4, **extra}
+
+    def test_creates_batch_with_one_snapshot(self):
+        data = [self.item(table) for table in self.tables]
+        with mock.patch('reservations.outbox._schedule_drain') as schedule_drain:
+            # Столики, занятость, вставка и очередь уведомлений (плюс точки
+            # сохранения транзакций) - независимо от размера пакета
+            with self.assertNumQueries(8):
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual([item['table']['number'] for item in response.data], ['T1', 'T2', 'T3'])
+        self.assertEqual(Reservation.objects.filter(status='confirmed').count(), 3)
+        self.assertEqual(NotificationOutbox.objects.count(), 3)
+        schedule_drain.assert_called_once()
+
+        # Созданные пакетом бронирования видны в кэше доступности
+        self.assertEqual(availability_cache.available_tables(self.date, time(18, 0), 2, 2), [])
+
+    def test_per_item_errors_create_nothing(self):
+        Reservation.objects.create(user=self.user, table=self.tables[1], date=self.date, time=time(17, 0),
+                                   duration=2, guests=2, status='confirmed')
+        data = [
+            self.item(self.tables[0]),
+            self.item(self.tables[0], start='19:00'),
+            self.item(self.tables[1]),
+            self.item(self.tables[2], guests=6),
+            {'table': 999, 'date': self.date.isoformat(), 'time': '12:00', 'guests': 2},
+        ]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, [
+            {},
+            {'non_field_errors': ['Пересекается с позицией 1 пакета']},
+            {'non_field_errors': ['Столик занят с 17:00:00 до 19:00:00']},
+            {'guests': ['Максимальная вместимость столика: 4']},
+            {'table': ['Столик не найден']},
+        ])
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_validation_errors(self):
+        yesterday = (timezone.now().date() - timedelta(days=1)).isoformat()
+        response = self.client.post(self.url, [self.item(self.tables[0], date=yesterday)], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date', response.data[0])
+
+        self.assertEqual(self.client.post(self.url, [], format='json').status_code, 400)
+        with override_settings(RESERVATION_BULK_MAX_SIZE=2):
+            response = self.client.post(self.url, [self.item(table) for table in self.tables], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_respects_other_holds(self):
+        holds.place_hold(self.tables[0].id, self.date, time(18, 0), 2, owner_id=0)
+        response = self.client.post(self.url, [self.item(self.tables[0])], format='json')
+        self.assertEqual(response.data, [{'non_field_errors': ['Столик удерживается другим гостем']}])
+
+    def test_own_hold_does_not_block_batch(self):
+        holds.place_hold(self.tables[0].id, self.date, time(18, 0), 2, owner_id=self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, [self.item(self.tables[0])], format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        # Собственное удержание пакет не перезаписывает и не снимает
+        self.assertTrue(holds.is_held(self.tables[0].id, self.date, time(18, 0), 2))
+
+    def test_batch_is_leased_before_insert(self):
+        """Интервалы пакета закреплены до фиксации и освобождаются после нее"""
+        items = [
+            {'table': self.tables[0].id, 'date': self.date, 'time': time(18, 0), 'duration': 2, 'guests': 2},
+            {'table': self.tables[1].id, 'date': self.date + timedelta(days=1), 'time': time(19, 0),
+             'duration': 2, 'guests': 2},
+        ]
+        with self.captureOnCommitCallbacks() as callbacks:
+            ReservationService.create_reservations(self.user, items)
+            self.assertIsNone(holds.place_hold(self.tables[0].id, self.date, time(19, 0), 1, owner_id=0))
+            self.assertIsNone(holds.place_hold(
+                self.tables[1].id, self.date + timedelta(days=1), time(19, 0), 1, owner_id=0
+            ))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(holds.is_held(self.tables[0].id, self.date, time(18, 0), 2))
+        self.assertFalse(holds.is_held(self.tables[1].id, self.date + timedelta(days=1), time(19, 0), 2))
+
+    def test_hold_placed_after_check_blocks_batch(self):
+        """Чужое удержание между проверкой и вставкой отменяет весь пакет"""
+        items = [{'table': self.tables[0].id, 'date': self.date, 'time': time(18, 0), 'duration': 2, 'guests': 2}]
+        held_masks = holds.held_masks
+
+        def hold_after_check(*args, **kwargs):
+            masks = held_masks(*args, **kwargs)
+            holds.place_hold(self.tables[0].id, self.date, time(19, 0), 1, owner_id=0)
+            return masks
+
+        with mock.patch.object(holds, 'held_masks', side_effect=hold_after_check):
+            with self.assertRaises(TableUnavailableError):
+                ReservationService.create_reservations(self.user, items)
+        self.assertFalse(Reservation.objects.exists())
+
+
+class ReservationMigrationTests(TestCase):
+    @skipUnless(connection.vendor != 'postgresql', 'в PostgreSQL ограничение не даст создать пересечения')
+    def test_overlap_check_lists_conflicts(self):
+        """Перед ограничением-исключением миграция называет пересекающиеся бронирования"""
+        from importlib import import_module
+        from django.apps import apps
+        migration = import_module('reservations.migrations.0003_reservation_period_exclusion')
+
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        table1 = Table.objects.create(number='T1', capacity=4)
+        table2 = Table.objects.create(number='T2', capacity=4)
+        day = timezone.now().date() + timedelta(days=1)
+
+        def reserve(table, start, duration, status='confirmed'):
+            return Reservation.objects.create(user=user, table=table, date=day, time=start,
+                                              duration=duration, guests=2, status=status)
+
+        long = reserve(table1, time(12, 0), 6)
+        inner = reserve(table1, time(13, 0), 1)
+        reserve(table1, time(18, 0), 2)
+        reserve(table1, time(14, 0), 2, status='cancelled')
+        reserve(table2, time(13, 0), 2)
+        late = reserve(table1, time(16, 30), 1)
+
+        self.assertEqual(migration.find_overlaps(Reservation), [(long.id, inner.id), (long.id, late.id)])
+
+        schema_editor = mock.Mock()
+        schema_editor.connection.vendor = 'postgresql'
+        with self.assertRaisesMessage(ValueError, f'{long.id}/{inner.id}, {long.id}/{late.id}'):
+            migration.check_overlaps(apps, schema_editor)
+        schema_editor.connection.vendor = 'sqlite'
+        migration.check_overlaps(apps, schema_editor)
+
+    @skipUnless(connection.vendor == 'sqlite', 'ограничение снимается только в SQLite (PRAGMA)')
+    def test_opening_hours_check_lists_invalid_rows(self):
+        """Перед ограничением часов работы миграция называет неподходящие бронирования"""
+        from importlib import import_module
+        from django.apps import apps
+        migration = import_module('reservations.migrations.0008_reservation_opening_hours')
+
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        table = Table.objects.create(number='T1', capacity=4)
+        day = timezone.now().date() + timedelta(days=1)
+        reservation = Reservation.objects.create(user=user, table=table, date=day, time=time(11, 0),
+                                                 duration=6, guests=2, status='confirmed')
+        migration.check_opening_hours(apps, None)
+
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA ignore_check_constraints = ON')
+            try:
+                Reservation.objects.filter(id=reservation.id).update(time=time(10, 0))
+            finally:
+                cursor.execute('PRAGMA ignore_check_constraints = OFF')
+        with self.assertRaisesMessage(ValueError, f': 1 (id: {reservation.id})'):
+            migration.check_opening_hours(apps, None)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
@@ -6,7 +7,9 @@ app_name = 'reservations'
 
 urlpatterns = [
     path('', views.reservation_create, name='reservation_create'),
-    path('list/', views.reservation_list, name='reservation_list'),
+    path('hold/', views.reservation_hold, name='reservation_hold'),
+    path('list/', views.areservation_list if settings.ASYNC_VIEWS else views.reservation_list,
+         name='reservation_list'),
     path('detail/<int:pk>/', views.reservation_detail, name='reservation_detail'),
     path('cancel/<int:pk>/', views.reservation_cancel, name='reservation_cancel'),
     path('management/', views.reservation_management, name='reservation_management'),
@@ -0,0 +1,55 @@
+"""Версии коллекций API для условных GET
+
+У каждой коллекции ('tables', 'reservations' и бронирования
+отдельного пользователя) есть счетчик в кэше, который увеличивается после
+фиксации записи (см. reservations.signals). ETag ответа строится из версий
+всех коллекций, от которых он зависит, поэтому проверка If-None-Match стоит одного
+запроса get_many к кэшу и не трогает БД.
+"""
+import time as timer
+
+from django.core.cache import cache
+
+TABLES = 'tables'
+RESERVATIONS = 'reservations'
+
+
+def user_reservations(user_id):
+    """Коллекция бронирований одного пользователя"""
+    return f'reservations:user:{user_id}'
+
+
+def _version_key(scope):
+    return f'api_version:{scope}'
+
+
+def bump(*scopes):
+    """Отмечает изменение коллекций"""
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(timer.time() * 1000), None)
+
+
+def bump_reservations(user_ids):
+    """Изменение бронирований перечисленных пользователей"""
+    bump(RESERVATIONS, *{user_reservations(user_id) for user_id in user_ids})
+
+
+def get_versions(scopes):
+    """Версии коллекций
+
+    Отсутствующие ключи создаются с версией по текущему времени, чтобы после
+    вытеснения не совпасть со старой.
+    """
+    keys = [_version_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+
+    initial = int(timer.time() * 1000)
+    for key in keys:
+        if key not in values:
+            cache.add(key, initial, None)
+            values[key] = cache.get(key, initial)
+    return [values[key] for key in keys]
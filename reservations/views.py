@@ -1,15 +1,23 @@
+import time as timer
 from datetime import datetime, timedelta
 
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
+from django.db import IntegrityError, transaction
 from django.db.models import Q
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
 
+from . import availability_cache, holds, rules
 from .forms import ReservationForm, TableSelectionForm
 from .models import Reservation, Table
-from .services import ReservationService
-from .tasks import send_reservation_confirmation
+from .outbox import enqueue_notifications
+from .services import ReservationService, TableUnavailableError
+
+# Токен удержания столика пользователем (reservations.holds)
+HOLD_SESSION_KEY = 'reservation_hold'
 
 
 @login_required
@@ -46,14 +54,14 @@ def reservation_create(request):
                     if date_obj < timezone.now().date():
                         messages.error(request, 'Нельзя забронировать столик на прошедшую дату')
                     else:
-                        available_tables = Table.get_available_tables(
-                            date=date_obj,
-                            time=time_obj,
-                            duration=int(duration),
-                            guests=int(guests)
+                        hold_token = request.session.get(HOLD_SESSION_KEY)
+                        available_tables = availability_cache.free_tables(
+                            date_obj, time_obj, int(duration), int(guests), hold_token=hold_token
                         )
 
-                        table_form = TableSelectionForm(available_tables=available_tables)
+                        table_form = TableSelectionForm(available_tables=Table.objects.filter(
+                            id__in=[table.id for table in available_tables]
+                        ))
 
                         context.update({
                             'reservation_form': reservation_form,
@@ -97,17 +105,11 @@ def reservation_create(request):
                     time_obj = datetime.strptime(time, '%H:%M').time()
                     date_obj = datetime.strptime(date, '%Y-%m-%d').date()
 
-                    available_tables = Table.get_available_tables(
-                        date=date_obj,
-                        time=time_obj,
-                        duration=int(duration),
-                        guests=int(guests)
-                    )
-
-                    if not available_tables.filter(id=table.id).exists():
-                        messages.error(request, 'Выбранный столик больше не доступен')
+                    error = rules.date_error(date_obj) or rules.time_error(time_obj, int(duration))
+                    if error:
+                        messages.error(request, error)
                     else:
-                        reservation = Reservation.objects.create(
+                        reservation = ReservationService.create_reservation(
                             user=request.user,
                             table=table,
                             date=date_obj,
@@ -115,13 +117,15 @@ def reservation_create(request):
                             duration=int(duration),
                             guests=int(guests),
                             special_requests=special_requests,
-                            status='confirmed'
+                            hold_token=request.session.get(HOLD_SESSION_KEY)
                         )
+                        request.session.pop(HOLD_SESSION_KEY, None)
 
-                        send_reservation_confirmation.delay(reservation.id)
                         messages.success(request, f'Бронирование #{reservation.id} успешно создано!')
                         return redirect('reservations:reservation_list')
 
+                except TableUnavailableError:
+                    messages.error(request, 'Выбранный столик больше не доступен')
                 except Table.DoesNotExist:
                     messages.error(request, 'Выбранный столик не существует')
                 except Exception as e:
@@ -140,6 +144,53 @@ def reservation_create(request):
     return render(request, 'reservations/reservation_create.html', context)
 
 
+@login_required
+def reservation_hold(request):
+    """Временно удерживает выбранный столик на время оформления (AJAX)
+
+    Предыдущее удержание пользователя снимается. Пока удержание действует,
+    другие гости не видят столик свободным на этот интервал.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request'}, status=405)
+
+    try:
+        table = Table.objects.get(id=request.POST.get('table'))
+        hold_date = datetime.strptime(request.POST.get('date', ''), '%Y-%m-%d').date()
+        hold_time = datetime.strptime(request.POST.get('time', ''), '%H:%M').time()
+        duration = int(request.POST.get('duration', 2))
+        guests = int(request.POST.get('guests', 1))
+    except (Table.DoesNotExist, ValueError):
+        return JsonResponse({'success': False, 'message': 'Неверные параметры'}, status=400)
+
+    error = rules.date_error(hold_date) or rules.time_error(hold_time, duration)
+    if error is None and guests > table.capacity:
+        error = f"Максимальная вместимость столика: {table.capacity}"
+    if error:
+        return JsonResponse({'success': False, 'message': error}, status=400)
+
+    previous_token = request.session.pop(HOLD_SESSION_KEY, None)
+    if previous_token:
+        holds.release_hold(previous_token)
+
+    is_available, message = table.is_available_for_reservation(hold_date, hold_time, duration)
+    hold = None
+    if is_available:
+        hold = holds.place_hold(table.id, hold_date, hold_time, duration, request.user.id)
+    if hold is None:
+        return JsonResponse({
+            'success': False,
+            'message': message if not is_available else 'Столик удерживается другим гостем',
+        }, status=409)
+
+    request.session[HOLD_SESSION_KEY] = hold['token']
+    return JsonResponse({
+        'success': True,
+        'table_id': table.id,
+        'expires_in': int(hold['expires_at'] - timer.time()),
+    })
+
+
 def generate_time_slots():
     """Генерирует список временных слотов"""
     times = []
@@ -149,25 +200,43 @@ def generate_time_slots():
     return times
 
 
-@login_required
-def reservation_list(request):
-    """Список бронирований пользователя"""
-    user_reservations = ReservationService.get_user_reservations_with_details(request.user)
+def _split_reservations(reservations):
+    """Активные и архивные бронирования для reservation_list"""
     active_reservations = []
     archived_reservations = []
-
-    for reservation in user_reservations:
+    for reservation in reservations:
         if reservation.status in ['pending', 'confirmed'] and not reservation.is_past_due():
             active_reservations.append(reservation)
         else:
             archived_reservations.append(reservation)
-
-    context = {
+    return {
         'active_reservations': active_reservations,
         'archived_reservations': archived_reservations,
     }
 
-    return render(request, 'reservations/reservation_list.html', context)
+
+@login_required
+def reservation_list(request):
+    """Список бронирований пользователя"""
+    reservations = ReservationService.get_user_reservations_with_details(request.user)
+    return render(request, 'reservations/reservation_list.html', _split_reservations(reservations))
+
+
+@login_required
+async def areservation_list(request):
+    """Асинхронный вариант reservation_list для ASGI (web-asgi)
+
+    Бронирования читаются через async ORM, шаблон рендерится в потоке, так
+    как обращается к сессии и сообщениям.
+    """
+    user = await request.auser()
+    reservations = [
+        reservation
+        async for reservation in ReservationService.get_user_reservations_with_details(user)
+    ]
+    return await sync_to_async(render)(
+        request, 'reservations/reservation_list.html', _split_reservations(reservations)
+    )
 
 
 @login_required
@@ -248,9 +317,15 @@ def reservation_change_status(request, pk):
         new_status = request.POST.get('status')
         if new_status in dict(Reservation.STATUS_CHOICES).keys():
             reservation.status = new_status
-            reservation.save()
-
-            messages.success(request, f'Статус бронирования изменен на {reservation.get_status_display()}')
+            try:
+                with transaction.atomic():
+                    reservation.save()
+                    if new_status == 'confirmed':
+                        enqueue_notifications([reservation.id])
+            except IntegrityError:
+                messages.error(request, 'Столик уже занят другим бронированием на это время')
+            else:
+                messages.success(request, f'Статус бронирования изменен на {reservation.get_status_display()}')
 
     return redirect('reservations:reservation_management')
 
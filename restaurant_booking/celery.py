@@ -14,14 +14,22 @@ app.conf.beat_schedule = {
         'task': 'reservations.tasks.send_reservation_reminder',
         'schedule': crontab(hour=9, minute=0),  # Каждый день в 9:00
     },
-    'cleanup-old-reservations': {
-        'task': 'reservations.tasks.cleanup_old_reservations',
-        'schedule': crontab(hour=0, minute=0, day_of_month='1'),  # Первое число каждого месяца
+    'archive-old-reservations': {
+        'task': 'reservations.tasks.archive_old_reservations',
+        'schedule': crontab(hour=3, minute=0),  # Каждую ночь в 3:00
+    },
+    'maintain-reservation-partitions': {
+        'task': 'reservations.tasks.maintain_reservation_partitions',
+        'schedule': crontab(hour=2, minute=0),  # Каждую ночь в 2:00
     },
     'auto-confirm-reservations': {
-        'task': 'reservations.tasks.auto_confirm_reservations',
+        'task': 'reservations.tasks.auto_confirm_pending_reservations',
         'schedule': crontab(minute='*/30'),  # Каждые 30 минут
     },
+    'drain-notification-outbox': {
+        'task': 'reservations.tasks.drain_notification_outbox',
+        'schedule': crontab(minute='*'),  # Страховка, если задача после коммита потерялась
+    },
 }
 
 
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -88,6 +89,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'restaurant_booking.wsgi.application'
+# Асинхронные варианты API доступности и списка бронирований: включается
+# только в ASGI-сервисе (web-asgi), куда nginx направляет эти адреса; под
+# gunicorn остаются синхронные представления
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False').lower() == 'true'
 
 
 DATABASES = {
@@ -101,7 +106,11 @@ DATABASES = {
     }
 }
 
-if 'test' in sys.argv or 'test_coverage' in sys.argv:
+# Тесты идут на SQLite; TEST_POSTGRES=True оставляет PostgreSQL из DB_* для
+# проверок, которые есть только в нем (секции, ограничение-исключение)
+TEST_POSTGRES = os.getenv('TEST_POSTGRES', 'False').lower() == 'true'
+
+if ('test' in sys.argv or 'test_coverage' in sys.argv) and not TEST_POSTGRES:
     DATABASES['default'] = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',
@@ -160,6 +169,11 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
+    # Тот же JSON, что у JSONRenderer, но через orjson, если он установлен
+    'DEFAULT_RENDERER_CLASSES': [
+        'reservations.api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 SIMPLE_JWT = {
@@ -176,15 +190,52 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
+# Количество напоминаний, отправляемых одной задачей через одно соединение
+REMINDER_CHUNK_SIZE = 200
+
+# Очередь уведомлений: размер пачки и число попыток отправки
+NOTIFICATION_OUTBOX_BATCH_SIZE = 100
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = 5
+
+# Ручная очистка старых бронирований (cleanup_old_reservations): через
+# сколько дней удалять, размер пачки, строк в секунду (0 - без ограничения)
+# и сохранение удаляемых строк в CSV
+CLEANUP_AFTER_DAYS = int(os.getenv('CLEANUP_AFTER_DAYS', 365))
+CLEANUP_BATCH_SIZE = 1000
+CLEANUP_ROWS_PER_SECOND = int(os.getenv('CLEANUP_ROWS_PER_SECOND', 5000))
+CLEANUP_ARCHIVE = os.getenv('CLEANUP_ARCHIVE', 'False').lower() == 'true'
+RESERVATION_ARCHIVE_DIR = os.getenv('RESERVATION_ARCHIVE_DIR', BASE_DIR / 'archive')
+# Через сколько дней завершенные бронирования переносятся в архив (по
+# расписанию)
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 180))
+
+# Секции таблицы бронирований (PostgreSQL): на сколько месяцев вперед
+# создавать секции и через сколько месяцев отсоединять старые (только
+# опустевшие после архивации)
+PARTITION_MONTHS_AHEAD = 3
+PARTITION_RETENTION_MONTHS = int(os.getenv('PARTITION_RETENTION_MONTHS', 24))
+PARTITION_DROP_DETACHED = os.getenv('PARTITION_DROP_DETACHED', 'False').lower() == 'true'
+
+if 'test' in sys.argv or 'test_coverage' in sys.argv:
+    CELERY_TASK_ALWAYS_EAGER = True
+
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 CELERY_BEAT_SCHEDULE = {
     'send-reservation-reminders': {
         'task': 'reservations.tasks.send_reservation_reminder',
         'schedule': timedelta(hours=24),
     },
-    'cleanup-old-reservations': {
-        'task': 'reservations.tasks.cleanup_old_reservations',
-        'schedule': timedelta(days=30),
+    'drain-notification-outbox': {
+        'task': 'reservations.tasks.drain_notification_outbox',
+        'schedule': timedelta(minutes=1),
+    },
+    'archive-old-reservations': {
+        'task': 'reservations.tasks.archive_old_reservations',
+        'schedule': timedelta(days=1),
+    },
+    'maintain-reservation-partitions': {
+        'task': 'reservations.tasks.maintain_reservation_partitions',
+        'schedule': timedelta(days=1),
     },
 }
 
@@ -201,7 +252,28 @@ CACHES = {
     }
 }
 
+if 'test' in sys.argv or 'test_coverage' in sys.argv:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 CACHE_ENABLE = os.getenv('CACHE_ENABLE', 'True').lower() == 'true'
+CONTENT_CACHE_TIMEOUT = 60 * 60  # Кэш публичных страниц, сбрасывается при изменении контента
+LOCAL_CACHE_TTL = 30  # Локальный кэш процесса для данных, нужных на каждой странице
+AVAILABILITY_CACHE_TIMEOUT = 10 * 60  # Кэш доступности столиков, версионируется по дате
+RESERVATION_HOLD_TTL = 5 * 60  # Секунд удержания выбранного столика на время оформления
+# Дальше какой даты можно бронировать; должно быть меньше горизонта секций
+# PARTITION_MONTHS_AHEAD (не меньше 89 дней), иначе вставка не найдет секцию
+RESERVATION_MAX_DAYS_AHEAD = 60
+RESERVATION_BULK_MAX_SIZE = 100  # Наибольшее число бронирований в одном пакетном запросе API
+AVAILABILITY_STREAM_HEARTBEAT = 15  # Секунд между пустыми сообщениями в потоке доступности
+
+# Статистика SQL-запросов по представлениям (core.middleware.QueryInstrumentationMiddleware)
+QUERY_INSTRUMENTATION = os.getenv('QUERY_INSTRUMENTATION', 'False').lower() == 'true'
+QUERY_INSTRUMENTATION_WINDOW = 500  # Последних запросов на представление
+QUERY_INSTRUMENTATION_FLUSH_INTERVAL = 10  # Секунд между сбросами в кэш
 
 # Настройки аутентификации
 LOGIN_URL = '/users/login/'
@@ -5,14 +5,74 @@ document.addEventListener('DOMContentLoaded', function() {
     const tableInput = document.getElementById('selected-table');
     const bookButton = document.getElementById('book-button');
     const checkButton = document.querySelector('button[name="check_availability"]');
+    const reservationForm = document.getElementById('reservation-form');
+    const tablesGrid = document.getElementById('tables-grid');
+    const notice = document.getElementById('availability-notice');
+
+    const showNotice = text => {
+        if (notice) {
+            notice.textContent = text;
+            notice.classList.remove('d-none');
+        }
+    };
+
+    const setTaken = (card, taken, label) => {
+        const status = card.querySelector('.table-status');
+        card.classList.toggle('taken', taken);
+        if (status) {
+            status.classList.toggle('status-available', !taken);
+            status.classList.toggle('status-unavailable', taken);
+            status.innerHTML = taken
+                ? '<i class="bi bi-x-circle me-1"></i> ' + (label || 'Только что забронирован')
+                : '<i class="bi bi-check-circle me-1"></i> Доступен';
+        }
+    };
+
+    // Выбранный столик удерживается за пользователем на время оформления,
+    // чтобы его не заняли между проверкой доступности и бронированием
+    const holdTable = card => {
+        if (!tablesGrid || !tablesGrid.dataset.holdUrl || !reservationForm) {
+            return;
+        }
+        const data = new FormData();
+        data.append('csrfmiddlewaretoken', reservationForm.querySelector('[name="csrfmiddlewaretoken"]').value);
+        data.append('table', card.getAttribute('data-table-id'));
+        data.append('date', tablesGrid.dataset.date);
+        data.append('time', tablesGrid.dataset.time);
+        data.append('duration', tablesGrid.dataset.duration || 2);
+        data.append('guests', tablesGrid.dataset.guests || 1);
+
+        fetch(tablesGrid.dataset.holdUrl, {method: 'POST', body: data, credentials: 'same-origin'})
+            .then(response => response.json())
+            .then(result => {
+                if (result.success) {
+                    const minutes = Math.max(1, Math.round(result.expires_in / 60));
+                    showNotice('Столик закреплен за вами на ' + minutes + ' мин. Завершите бронирование');
+                    return;
+                }
+                setTaken(card, true);
+                if (tableInput && tableInput.value === card.getAttribute('data-table-id')) {
+                    card.classList.remove('selected');
+                    tableInput.value = '';
+                }
+                showNotice(result.message || 'Столик недоступен, выберите другой');
+            })
+            .catch(() => {
+                // Без удержания бронирование все равно проверяется на сервере
+            });
+    };
 
     // 1. Обработка выбора столика
     if (tableCards.length > 0 && tableInput) {
         tableCards.forEach(card => {
             card.addEventListener('click', function() {
+                if (this.classList.contains('taken')) {
+                    return;
+                }
                 tableCards.forEach(c => c.classList.remove('selected'));
                 this.classList.add('selected');
                 tableInput.value = this.getAttribute('data-table-id');
+                holdTable(this);
             });
         });
 
@@ -47,4 +107,123 @@ document.addEventListener('DOMContentLoaded', function() {
             }, 100);
         });
     }
-});
\ No newline at end of file
+
+    // 4. Свободное время из сетки доступности дня: один запрос к
+    // /api/availability-grid/ на дату, продолжительность и число гостей
+    // вместо проверки каждого времени
+    const timeSelect = reservationForm && reservationForm.querySelector('select[name="time"]');
+    if (timeSelect && reservationForm.dataset.gridUrl) {
+        const field = name => reservationForm.querySelector('[name="' + name + '"]');
+
+        const updateTimes = () => {
+            if (!field('date').value) {
+                return;
+            }
+            const params = new URLSearchParams({
+                date: field('date').value,
+                duration: field('duration').value,
+                guests: field('guests').value,
+            });
+            fetch(reservationForm.dataset.gridUrl + '?' + params, {
+                headers: {'X-Requested-With': 'XMLHttpRequest'},
+                credentials: 'same-origin',
+            })
+                .then(response => response.json())
+                .then(grid => {
+                    if (!grid.success) {
+                        return;
+                    }
+                    const free = new Set(grid.slots.filter(
+                        (slot, index) => grid.tables.some(table => table.available[index])
+                    ));
+                    Array.from(timeSelect.options).forEach(option => {
+                        if (!option.value) {
+                            return;
+                        }
+                        option.disabled = !free.has(option.value);
+                        option.textContent = option.disabled
+                            ? option.value + ' - нет свободных столиков'
+                            : option.value;
+                    });
+                    if (timeSelect.selectedOptions.length && timeSelect.selectedOptions[0].disabled) {
+                        timeSelect.value = '';
+                    }
+                })
+                .catch(() => {
+                    // Без сетки время проверяется кнопкой "Проверить доступность"
+                });
+        };
+
+        ['date', 'duration', 'guests'].forEach(name => field(name).addEventListener('change', updateTimes));
+        updateTimes();
+    }
+
+    // 5. Изменения доступности в реальном времени (Server-Sent Events)
+    // Вместо периодических запросов к /api/check-availability/ держим одно
+    // соединение и отмечаем столики, которые заняли или освободили другие гости
+    if (tablesGrid && tablesGrid.dataset.date && window.EventSource) {
+        const toMinutes = value => {
+            const [hours, minutes] = value.split(':').map(Number);
+            return hours * 60 + minutes;
+        };
+        const chosenStart = toMinutes(tablesGrid.dataset.time);
+        const chosenEnd = chosenStart + Number(tablesGrid.dataset.duration || 2) * 60;
+
+        const overlaps = event => {
+            const start = toMinutes(event.start);
+            return start < chosenEnd && start + event.duration * 60 > chosenStart;
+        };
+
+        const source = new EventSource(
+            tablesGrid.dataset.streamUrl + '?date=' + encodeURIComponent(tablesGrid.dataset.date)
+        );
+
+        source.addEventListener('availability', function(message) {
+            const event = JSON.parse(message.data);
+            if (!overlaps(event)) {
+                return;
+            }
+            const card = tablesGrid.querySelector('.table-card[data-table-id="' + event.table_id + '"]');
+
+            if (event.type === 'held') {
+                // Свое удержание приходит для выбранного столика
+                if (card && !card.classList.contains('selected')) {
+                    const heldUntil = String(Date.now() + event.expires_in * 1000);
+                    card.dataset.heldUntil = heldUntil;
+                    setTaken(card, true, 'Выбран другим гостем');
+                    setTimeout(() => {
+                        if (card.dataset.heldUntil === heldUntil) {
+                            delete card.dataset.heldUntil;
+                            setTaken(card, false);
+                        }
+                    }, event.expires_in * 1000);
+                }
+            } else if (event.type === 'unheld') {
+                if (card && card.dataset.heldUntil) {
+                    delete card.dataset.heldUntil;
+                    setTaken(card, false);
+                }
+            } else if (event.type === 'occupied' && card) {
+                delete card.dataset.heldUntil;
+                setTaken(card, true);
+                if (tableInput && tableInput.value === String(event.table_id)) {
+                    card.classList.remove('selected');
+                    tableInput.value = '';
+                    const next = tablesGrid.querySelector('.table-card:not(.taken)');
+                    if (next) {
+                        next.click();
+                        showNotice('Выбранный столик только что забронировали, мы выбрали другой свободный столик');
+                    } else {
+                        showNotice('Все подходящие столики на это время только что забронировали');
+                    }
+                }
+            } else if (event.type === 'released' && card) {
+                // Столики, которых нет на странице (другой вместимости или
+                // недоступные), не показываются
+                setTaken(card, false);
+            }
+        });
+
+        window.addEventListener('beforeunload', () => source.close());
+    }
+});